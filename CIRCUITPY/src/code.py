@@ -32,6 +32,9 @@ else:
 line4.text = "Sync Time"
 ret = hva_wifi.synctime()
 if ret:
+    # Offset between the monotonic clock and UTC, for sub-second cycle times
+    utc_ns, monotonic_ns = ret
+    utc_offset_ns = utc_ns - monotonic_ns
     line5.text = "Done"
     time.sleep(1.0)
 else:
@@ -55,22 +58,32 @@ def show_current_time(time_tuple, line1):
 # -----------------------------------------------------------------------------
 #
 # -----------------------------------------------------------------------------
-def current_cycle(time_tuple) -> tuple[int, int]:
+def utc_now_ns():
+    """Get the UTC time in nanoseconds since the epoch.
+
+    The monotonic clock is corrected with the offset measured at the NTP sync,
+    the same way as the cycle_clock of the desktop version.
+    Integers are used, as a CircuitPython float cannot hold the epoch time
+    with sub-second resolution.
+    """
+
+    return time.monotonic_ns() + utc_offset_ns
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def current_cycle(t_ns) -> tuple[int, float]:
     """Calculate the current cycle and seconds in that cycle.
 
-    :returns: tuple of cycle number and seconds in that cycle
+    :param t_ns: UTC time in nanoseconds since the epoch
+    :returns: tuple of cycle number and (fractional) seconds in that cycle
 
     Note: A cycle lasts 3 mintues (180 seconds)
     """
 
-    # curtime = time.gmtime()
-    seconds_since_midnight = (
-        # hours * 3600 + minutes * 60 + seconds
-        # curtime.tm_hour * 3600 + curtime.tm_min * 60 + curtime.tm_sec
-        time_tuple.tm_hour * 3600 + time_tuple.tm_min * 60 + time_tuple.tm_sec
-    )
-    cycle = math.floor(seconds_since_midnight / 180)
-    seconds_in_cycle = seconds_since_midnight - (180 * cycle)
+    ms_since_midnight = (t_ns // 1_000_000) % 86_400_000
+    cycle = ms_since_midnight // 180_000
+    seconds_in_cycle = (ms_since_midnight - (180_000 * cycle)) / 1000
 
     return cycle, seconds_in_cycle
 
@@ -125,16 +138,28 @@ beacons = {
 # for nr, info in beacons.items():
 #     print(nr, info)
 
+# Beacon bands in transmission order, and the display line for each band
+band_labels = ("14.100", "18.110", "21.150", "24.930", "28.200")
+band_lines = (line2, line3, line4, line5, line6)
+
+# Precompute which beacon is transmitting per slot and band:
+# beacon_table[slot][band_index] = beacon number
+beacon_table = tuple(
+    tuple((slot - band_index) % 18 for band_index in range(len(band_labels)))
+    for slot in range(18)
+)
+
 previous_slot = 0
 
 # -----------------------------------------------------------------------------
 # Main loop
 # -----------------------------------------------------------------------------
 while True:
-    time_tuple = time.localtime()  # time in seconds since Epoch as 8-tuple
+    t_ns = utc_now_ns()
+    time_tuple = time.localtime(t_ns // 1_000_000_000)  # time as 8-tuple
     # print(f"{time_tuple=}")
     show_current_time(time_tuple, line1)
-    cycle, secs_in_cycle = current_cycle(time_tuple)
+    cycle, secs_in_cycle = current_cycle(t_ns)
     slot = math.floor(secs_in_cycle / 10)
     # print(f"{cycle=} {secs_in_cycle=} {slot=}")
 
@@ -145,32 +170,8 @@ while True:
     else:
         hva_led.set_led_off()
 
-    # Show transmitting beacons
-    # Compensate for the wrap-around through the list.
-    # It is an ugly solution, but it works.
-    n = slot
-    if n < 0:
-        n += 18
-    line2.text = f"14.100:{beacons[n]}"
-
-    n = slot - 1
-    if n < 0:
-        n += 18
-    line3.text = f"18.110:{beacons[n]}"
-
-    n = slot - 2
-    if n < 0:
-        n += 18
-    line4.text = f"21.150:{beacons[n]}"
-
-    n = slot - 3
-    if n < 0:
-        n += 18
-    line5.text = f"24.930:{beacons[n]}"
-
-    n = slot - 4
-    if n < 0:
-        n += 18
-    line6.text = f"28.200:{beacons[n]}"
+    # Show transmitting beacons, one table lookup per band
+    for line, freq, n in zip(band_lines, band_labels, beacon_table[slot]):
+        line.text = f"{freq}:{beacons[n]}"
 
     time.sleep(0.25)
@@ -27,17 +27,25 @@ def connect():
 
 
 def synctime():
+    """Set the RTC from NTP.
+
+    Returns the NTP time in nanoseconds and the time.monotonic_ns() value at
+    that moment, so the caller can keep a sub-second clock. None on failure.
+    """
     try:
         t = time.localtime()
         print("time before sync", t)
         pool = adafruit_connection_manager.get_radio_socketpool(wifi.radio)
         ntp = adafruit_ntp.NTP(pool, tz_offset=0, cache_seconds=3600)
-        print(f"{ntp.utc_ns=}")
+        utc_ns = ntp.utc_ns
+        monotonic_ns = time.monotonic_ns()
+        print(f"{utc_ns=}")
         print(f"{ntp.datetime=}")
         # NOTE: This changes the system time so make sure you aren't assuming that time
         # doesn't jump.
         rtc.RTC().datetime = ntp.datetime
         t = time.localtime()
         print("time after sync", t)
+        return utc_ns, monotonic_ns
     except OSError:
-        pass
+        return None
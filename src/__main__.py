@@ -2,12 +2,36 @@
 
 import click
 
+# Local imports
+import appearances
+import archive
+import cat_tools
+import follow
+import multi_rig
+import query
+import rollup
+import scanner
+import show_beacons
+import sqlite_store
 
-@click.command()
+
+@click.group()
 @click.version_option()
 def main() -> None:
     """Ham Ibp Monitor."""
 
 
+main.add_command(show_beacons.show)
+main.add_command(appearances.next_transmissions)
+main.add_command(scanner.scan)
+main.add_command(follow.follow)
+main.add_command(multi_rig.multi_rig)
+main.add_command(cat_tools.cat_group)
+main.add_command(archive.archive_log)
+main.add_command(query.query_archive)
+main.add_command(sqlite_store.show_levels)
+main.add_command(rollup.show_rollup)
+
+
 if __name__ == "__main__":
     main(prog_name="ham-ibp-monitor")  # pragma: no cover
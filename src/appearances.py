@@ -0,0 +1,240 @@
+"""Predict when beacons will transmit on which band.
+
+The schedule repeats every 180 seconds, so the transmissions of any selection
+of beacons and bands within a cycle are a handful of fixed offsets.
+A time window is then the outer sum of the cycle start times and these offsets,
+which is calculated in bulk with numpy, one day of cycles at a time.
+"""
+
+# pylint: disable=logging-fstring-interpolation
+
+# Global imports
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Iterable, Iterator
+
+# 3rd party imports
+import click
+import numpy as np
+
+# Local imports
+import beacons
+import cycle_calculator
+import cycle_clock
+import param
+
+# Number of cycles calculated at once by the generator (one day)
+CYCLES_PER_CHUNK: int = 86400 // cycle_calculator.CYCLE_SECONDS
+
+Appearance = tuple[float, int, beacons.Beacon]  # (utc_start, band, beacon)
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def beacon_numbers(callsigns: Iterable[str] | None = None) -> list[int]:
+    """Convert callsigns to beacon numbers
+
+    :param callsigns: Callsigns to look up (case insensitive). All beacons if None.
+    :returns: Sorted list of beacon numbers
+    :raises ValueError: If a callsign is not a known beacon
+    """
+
+    if not callsigns:
+        return list(range(cycle_calculator.NR_OF_SLOTS))
+
+    by_callsign = {b.callsign.upper(): n for n, b in beacons.load_beacons().items()}
+    numbers = set()
+    for callsign in callsigns:
+        n = by_callsign.get(callsign.strip().upper())
+        if n is None:
+            raise ValueError(f"Unknown beacon {callsign}")
+        numbers.add(n)
+    return sorted(numbers)
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def band_indices(bands: Iterable[int | float | str] | None = None) -> list[int]:
+    """Convert bands or frequencies to indices in cycle_calculator.BANDS
+
+    :param bands: Bands or frequencies, like 14, 20, "21.150" or "10m". All if None.
+    :returns: Sorted list of band indices
+    :raises ValueError: If a band is not a beacon band
+    """
+
+    if not bands:
+        return list(range(len(cycle_calculator.BANDS)))
+
+    indices = set()
+    for band in bands:
+        index = cycle_calculator.band_index(band)
+        if index < 0:
+            raise ValueError(f"Invalid band {band}")
+        indices.add(index)
+    return sorted(indices)
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def cycle_offsets(
+    beacon_nrs: Iterable[int], indices: Iterable[int]
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Get the start offsets in the cycle of the selected transmissions
+
+    :param beacon_nrs: Beacon numbers to include
+    :param indices: Band indices to include
+    :returns: tuple of arrays (offset in seconds, band index, beacon number), sorted on offset
+
+    >>> offsets, bands, nrs = cycle_offsets([5], [0, 2])
+    >>> offsets.tolist(), bands.tolist(), nrs.tolist()
+    ([50, 70], [0, 2], [5, 5])
+    """
+
+    pairs = np.array([(n, i) for n in beacon_nrs for i in indices], dtype=np.int64)
+    if not len(pairs):
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    nrs, bands = pairs[:, 0], pairs[:, 1]
+    offsets = ((nrs + bands) % cycle_calculator.NR_OF_SLOTS) * (
+        cycle_calculator.SLOT_SECONDS
+    )
+    order = np.argsort(offsets, kind="stable")
+    return offsets[order], bands[order], nrs[order]
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def appearance_table(
+    start: float,
+    end: float,
+    callsigns: Iterable[str] | None = None,
+    bands: Iterable[int | float | str] | None = None,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Calculate all transmissions in a time window in one go
+
+    :param start: UTC start of the window in seconds since the epoch (inclusive)
+    :param end: UTC end of the window in seconds since the epoch (exclusive)
+    :param callsigns: Callsigns to include. All beacons if None.
+    :param bands: Bands to include. All bands if None.
+    :returns: tuple of arrays (utc_start, band index, beacon number), sorted on time
+    """
+
+    offsets, band_idx, nrs = cycle_offsets(beacon_numbers(callsigns), band_indices(bands))
+    period = cycle_calculator.CYCLE_SECONDS
+    first_cycle = int(start // period)
+    nr_of_cycles = max(int(-(-end // period)) - first_cycle, 0)
+
+    cycle_starts = (first_cycle + np.arange(nr_of_cycles, dtype=np.int64)) * period
+    times = (cycle_starts[:, None] + offsets[None, :]).ravel()
+    keep = (times >= start) & (times < end)
+    return (
+        times[keep],
+        np.tile(band_idx, nr_of_cycles)[keep],
+        np.tile(nrs, nr_of_cycles)[keep],
+    )
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def upcoming(
+    callsigns: Iterable[str] | None = None,
+    bands: Iterable[int | float | str] | None = None,
+    start: float | None = None,
+    end: float | None = None,
+    count: int = 0,
+) -> Iterator[Appearance]:
+    """Generate the upcoming transmissions of the selected beacons and bands
+
+    :param callsigns: Callsigns to include. All beacons if None.
+    :param bands: Bands to include. All bands if None.
+    :param start: UTC time in seconds since the epoch to start at. Now if not given.
+    :param end: UTC time to stop at. Endless if not given.
+    :param count: Maximum number of transmissions to generate. 0 means no limit.
+    :returns: Iterator of (utc_start, band in MHz, Beacon) tuples, in time order
+    :raises ValueError: If the beacon information (beacons.ini) could not be loaded
+    """
+
+    dict_of_beacons = beacons.load_beacons()
+    if not dict_of_beacons:
+        raise ValueError("No beacon information, beacons.ini could not be loaded")
+    if start is None:
+        start = cycle_clock.get_clock().now()
+
+    n = 0
+    chunk_start = start
+    chunk_seconds = CYCLES_PER_CHUNK * cycle_calculator.CYCLE_SECONDS
+    while end is None or chunk_start < end:
+        chunk_end = chunk_start + chunk_seconds
+        if end is not None:
+            chunk_end = min(chunk_end, end)
+        times, band_idx, nrs = appearance_table(chunk_start, chunk_end, callsigns, bands)
+        for t, i, nr in zip(times.tolist(), band_idx.tolist(), nrs.tolist()):
+            yield float(t), cycle_calculator.BANDS[i], dict_of_beacons[nr]
+            n += 1
+            if count and n >= count:
+                return
+        if not len(times) and end is None:
+            return  # Nothing selected, avoid an endless loop
+        chunk_start = chunk_end
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def parse_utc(s: str) -> float:
+    """Parse an ISO 8601 date/time string, assumed to be UTC if no zone is given
+
+    :param s: The string, for example "2025-03-01T06:00"
+    :returns: Seconds since the epoch
+
+    >>> parse_utc("1970-01-02T00:00")
+    86400.0
+    """
+
+    dt = datetime.fromisoformat(s)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+@click.command(name="next")
+@click.option("--call", "calls", multiple=True, help="Beacon callsign (repeatable)")
+@click.option("--band", "bands", multiple=True, help="Band or frequency (repeatable)")
+@click.option("--count", default=10, show_default=True, help="Number of transmissions")
+@click.option("--start", default="", help="UTC start time (ISO 8601), default now")
+@click.option("--hours", default=0.0, help="Length of the time window in hours")
+def next_transmissions(calls, bands, count, start, hours) -> None:  # type: ignore
+    """Show the next transmissions of beacons on bands"""
+
+    t_start = parse_utc(start) if start else None
+    t_end = None
+    if hours:
+        t_end = (t_start if t_start is not None else cycle_clock.get_clock().now()) + hours * 3600
+
+    try:
+        for t, band, beacon in upcoming(calls, bands, t_start, t_end, count):
+            utc = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(t))
+            print(
+                f"{utc} UTC  {param.beacon_frequency[band]:.3f} MHz  "
+                f"{beacon.callsign:7} {beacon.city}, {beacon.dx_entity}"
+            )
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+# pylint: disable=no-value-for-parameter
+if __name__ == "__main__":
+    next_transmissions()
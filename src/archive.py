@@ -0,0 +1,438 @@
+"""Compressed archive of observations in time-ordered, indexed chunks.
+
+roll() moves the new records of an observation_log into the archive. The
+records are sorted by band and time and cut into chunks, so each chunk holds
+the records of one band in time order. Within a chunk the columns are
+stored separately: the timestamps and integer values as zigzag varints of
+their differences, the band index and meter type as bytes. The whole chunk is
+then compressed with zlib. The slot and beacon are not stored, they follow from
+the time and band with the NCDXF schedule.
+
+File format (little endian)::
+
+    header:  8s magic b"IBPARC1\\n"
+    chunk:   CHUNK header, zlib compressed data
+    ...
+    index:   the CHUNK headers of all chunks
+    trailer: int64 offset of the index, uint32 number of chunks,
+             int64 creation time of the rolled log, int64 number of log records rolled,
+             8s magic
+
+Each CHUNK header has the time range and bitmaps of the bands and beacons in
+the chunk, so a query reads the index from the end of the file and only
+decompresses the chunks which can hold matching records (see Archive.select).
+
+The file is only appended to: a roll writes its chunks after the previous
+trailer, followed by the complete new index and trailer. If a roll is
+interrupted, the last complete trailer is found back (see find_end) and the
+partly written roll is dropped; the log position in that trailer makes the next
+roll archive the same records again.
+"""
+
+# pylint: disable=logging-fstring-interpolation
+
+# Global imports
+import logging
+import mmap
+import os
+import struct
+import zlib
+from pathlib import Path
+from typing import Any, BinaryIO
+
+# 3rd party imports
+import click
+import numpy as np
+
+# Local imports
+import observation_log
+
+MAGIC: bytes = b"IBPARC1\n"
+TRAILER = struct.Struct("<qIqq8s")
+PAYLOAD = struct.Struct("<II")  # Bytes of the timestamps, bytes of the values
+CHUNK = np.dtype(
+    [
+        ("offset", "<i8"),  # File offset of the chunk header
+        ("length", "<u4"),  # Bytes of compressed data after the header
+        ("count", "<u4"),  # Number of records
+        ("min_t", "<i8"),  # Lowest UTC in nanoseconds
+        ("max_t", "<i8"),  # Highest UTC in nanoseconds
+        ("bands", "u1"),  # Bit per band index present
+        ("flags", "u1"),  # INTEGER_VALUES
+        ("reserved", "<u2"),
+        ("beacons", "<u4"),  # Bit per beacon number present
+    ]
+)
+INTEGER_VALUES: int = 1  # The values are stored as varints instead of float32
+CHUNK_RECORDS: int = 1 << 16
+COMPRESSION_LEVEL: int = 6
+MAX_VARINT_BYTES: int = 10
+MAX_INTEGER_VALUE: float = 2.0**53  # Larger values are stored as float32 (differences fit int64)
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def encode_varints(values: Any) -> bytes:
+    """Encode signed integers as zigzag LEB128 varints
+
+    :param values: Array-like of int64
+    :returns: The encoded bytes
+
+    >>> encode_varints([0, -1, 1, 63, -64, 64, 300]).hex()
+    '0001027e7f8001d804'
+    """
+
+    values = np.asarray(values, dtype=np.int64)
+    zigzag = ((values << 1) ^ (values >> 63)).view(np.uint64)
+    shifts = np.arange(MAX_VARINT_BYTES, dtype=np.uint64) * np.uint64(7)
+    groups = zigzag[:, None] >> shifts
+    lengths = 1 + np.count_nonzero(groups[:, 1:], axis=1)
+
+    positions = np.arange(MAX_VARINT_BYTES)
+    out = (groups & np.uint64(0x7F)).astype(np.uint8)
+    out[positions < (lengths - 1)[:, None]] |= 0x80
+    return out[positions < lengths[:, None]].tobytes()
+
+
+def decode_varints(data: bytes) -> np.ndarray:
+    """Decode zigzag LEB128 varints
+
+    :param data: The encoded bytes
+    :returns: Array of int64
+
+    >>> decode_varints(bytes.fromhex('0001027e7f8001d804')).tolist()
+    [0, -1, 1, 63, -64, 64, 300]
+    """
+
+    encoded = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(encoded < 0x80)
+    if not len(ends):
+        return np.zeros(0, dtype=np.int64)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    lengths = ends - starts + 1
+
+    # One pass per byte position, up to the longest varint
+    groups = (encoded & 0x7F).astype(np.uint64)
+    zigzag = groups[starts]
+    for position in range(1, int(lengths.max())):
+        longer = np.flatnonzero(lengths > position)
+        zigzag[longer] |= groups[starts[longer] + position] << np.uint64(7 * position)
+    return ((zigzag >> np.uint64(1)) ^ (np.uint64(0) - (zigzag & np.uint64(1)))).view(np.int64)
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def encode_chunk(records: np.ndarray) -> tuple[np.ndarray, bytes]:
+    """Encode and compress records
+
+    :param records: Array of observation_log.RECORD, sorted by time
+    :returns: tuple of the CHUNK header (offset 0) and the compressed data
+
+    The values are stored as integers only if they all are finite whole numbers
+    below MAX_INTEGER_VALUE, otherwise as float32.
+
+    >>> records = observation_log.make_records([0, 10], [float("inf"), 3.0], 0)
+    >>> header, data = encode_chunk(records)
+    >>> int(header["flags"][0]), decode_chunk(header[0], data)["value"].tolist()
+    (0, [inf, 3.0])
+    """
+
+    value = records["value"]
+    integers = (
+        np.isfinite(value).all()
+        and np.array_equal(value, np.rint(value))
+        and (not len(value) or np.abs(value).max() < MAX_INTEGER_VALUE)
+    )
+    flags = INTEGER_VALUES if integers else 0
+    if flags & INTEGER_VALUES:
+        values = encode_varints(np.diff(value.astype(np.int64), prepend=0))
+    else:
+        values = value.astype("<f4").tobytes()
+    times = encode_varints(np.diff(records["t_ns"], prepend=0))
+    payload = b"".join(
+        (
+            PAYLOAD.pack(len(times), len(values)),
+            times,
+            records["band"].tobytes(),
+            records["meter_type"].tobytes(),
+            values,
+        )
+    )
+    data = zlib.compress(payload, COMPRESSION_LEVEL)
+
+    bands = np.unique(records["band"][records["band"] >= 0]).astype(np.int64)
+    beacons = np.unique(records["beacon"][records["beacon"] >= 0]).astype(np.int64)
+    header = np.zeros(1, dtype=CHUNK)
+    header["length"] = len(data)
+    header["count"] = len(records)
+    header["min_t"] = records["t_ns"].min()
+    header["max_t"] = records["t_ns"].max()
+    header["bands"] = np.bitwise_or.reduce(1 << bands) if len(bands) else 0
+    header["flags"] = flags
+    header["beacons"] = np.bitwise_or.reduce(1 << beacons) if len(beacons) else 0
+    return header, data
+
+
+def decode_chunk(header: np.void | np.ndarray, data: bytes) -> np.ndarray:
+    """Decompress and decode records
+
+    :param header: The CHUNK header
+    :param data: The compressed data
+    :returns: Array of observation_log.RECORD
+    """
+
+    payload = zlib.decompress(data)
+    count = int(header["count"])
+    times_size, values_size = PAYLOAD.unpack_from(payload)
+    offset = PAYLOAD.size
+    t_ns = np.cumsum(decode_varints(payload[offset : offset + times_size]))
+    offset += times_size
+    band = np.frombuffer(payload, np.int8, count, offset)
+    meter_type = np.frombuffer(payload, np.uint8, count, offset + count)
+    values = payload[offset + 2 * count : offset + 2 * count + values_size]
+    if int(header["flags"]) & INTEGER_VALUES:
+        value = np.cumsum(decode_varints(values))
+    else:
+        value = np.frombuffer(values, "<f4", count)
+    return observation_log.make_records(t_ns, value, band, meter_type)
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def find_end(file: BinaryIO) -> int:
+    """Find the end of the last complete trailer, after an interrupted roll
+
+    :param file: The archive file, opened for reading
+    :returns: Offset just after the last trailer which closes its index, 0 if there is none
+    """
+
+    file.seek(0, 2)
+    if file.tell() < len(MAGIC) + TRAILER.size:
+        return 0
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        end = len(data)
+        while (found := data.rfind(MAGIC, len(MAGIC), end)) >= 0:
+            trailer_end = found + len(MAGIC)
+            if trailer_end >= len(MAGIC) + TRAILER.size:
+                index_offset, nr_of_chunks, *_ = TRAILER.unpack_from(
+                    data, trailer_end - TRAILER.size
+                )
+                if (
+                    index_offset >= len(MAGIC)
+                    and index_offset + nr_of_chunks * CHUNK.itemsize + TRAILER.size == trailer_end
+                ):
+                    return trailer_end
+            end = trailer_end - 1
+    return 0
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class Archive:
+    """Read access to an archive, through its chunk index."""
+
+    def __init__(self, filename: str | Path) -> None:
+        """Open the archive and read its index
+
+        :param filename: The archive file
+        :raises ValueError: If the file is not an archive
+        """
+
+        self.filename = Path(filename)
+        self.file: BinaryIO = open(self.filename, "rb")  # pylint: disable=consider-using-with
+        self.end = self.file.seek(0, 2)  # End of the last complete roll
+        if self.end < len(MAGIC) + TRAILER.size or self.read_trailer()[-1] != MAGIC:
+            self.end = find_end(self.file)
+            if not self.end:
+                self.file.close()
+                raise ValueError(f"{filename} is not an archive")
+            logging.warning(f"{filename} ends with an incomplete roll, which is ignored")
+        index_offset, nr_of_chunks, self.log_created_ns, self.log_position, _magic = (
+            self.read_trailer()
+        )
+        self.file.seek(index_offset)
+        self.index = np.frombuffer(self.file.read(nr_of_chunks * CHUNK.itemsize), CHUNK)
+
+        # Chunks of successive rolls may overlap a little in time. These are monotonic
+        # bounds, to bisect on: the highest max_t so far, the lowest min_t from here on.
+        self.max_t_so_far = np.maximum.accumulate(self.index["max_t"])
+        self.min_t_from_here = np.minimum.accumulate(self.index["min_t"][::-1])[::-1]
+
+    def read_trailer(self) -> tuple:
+        """Read the trailer which ends at self.end
+
+        :returns: The TRAILER fields
+        """
+
+        self.file.seek(self.end - TRAILER.size)
+        return TRAILER.unpack(self.file.read(TRAILER.size))
+
+    def __len__(self) -> int:
+        """Number of records in the archive"""
+
+        return int(self.index["count"].sum())
+
+    def select(
+        self, start_ns: int, end_ns: int, bands: int = 0, beacons: int = 0
+    ) -> np.ndarray:
+        """Find the chunks which can hold matching records
+
+        :param start_ns: Lowest UTC in nanoseconds
+        :param end_ns: Highest UTC in nanoseconds (inclusive)
+        :param bands: Bit per band index, 0 = all bands
+        :param beacons: Bit per beacon number, 0 = all beacons
+        :returns: Chunk numbers, in time order
+        """
+
+        first = int(np.searchsorted(self.max_t_so_far, start_ns, "left"))
+        last = int(np.searchsorted(self.min_t_from_here, end_ns, "right"))
+        chunks = self.index[first:last]
+        match = (chunks["max_t"] >= start_ns) & (chunks["min_t"] <= end_ns)
+        if bands:
+            match &= (chunks["bands"] & bands) != 0
+        if beacons:
+            match &= (chunks["beacons"] & beacons) != 0
+        return first + np.flatnonzero(match)
+
+    def read_chunk(self, nr: int) -> np.ndarray:
+        """Read and decode one chunk
+
+        :param nr: Chunk number
+        :returns: Array of observation_log.RECORD
+        """
+
+        header = self.index[nr]
+        self.file.seek(int(header["offset"]) + CHUNK.itemsize)
+        return decode_chunk(header, self.file.read(int(header["length"])))
+
+    def close(self) -> None:
+        """Close the file"""
+
+        self.file.close()
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class ArchiveWriter:
+    """Append chunks to a new or existing archive, without overwriting anything."""
+
+    def __init__(self, filename: str | Path) -> None:
+        """Open the archive for appending, or create it
+
+        :param filename: The archive file
+        :raises ValueError: If the file exists and is not an archive
+        """
+
+        self.filename = Path(filename)
+        self.chunks: list[np.ndarray] = []
+        self.log_created_ns: int = 0
+        self.log_position: int = 0
+        if self.filename.exists():
+            existing = Archive(self.filename)
+            self.chunks.append(existing.index.copy())
+            self.log_created_ns, self.log_position = existing.log_created_ns, existing.log_position
+            existing.close()
+            self.file: BinaryIO = open(self.filename, "r+b")  # pylint: disable=consider-using-with
+            self.file.seek(existing.end)
+            self.file.truncate()  # Drop an incomplete roll, if any
+        else:
+            # Start with an empty index, so the file is an archive from the beginning
+            self.file = open(self.filename, "w+b")  # pylint: disable=consider-using-with
+            self.file.write(MAGIC + TRAILER.pack(len(MAGIC), 0, 0, 0, MAGIC))
+            self.sync()
+
+    def append(self, records: np.ndarray, chunk_records: int = CHUNK_RECORDS) -> None:
+        """Write records as chunks, a separate series of chunks per band
+
+        Each band gets its own chunks, so the band bitmaps in the index prune most of
+        the chunks of a query for one band, also when the log holds several rigs.
+
+        :param records: Array of observation_log.RECORD
+        :param chunk_records: Maximum number of records per chunk
+        """
+
+        records = records[np.lexsort((records["t_ns"], records["band"]))]
+        boundaries = np.flatnonzero(np.diff(records["band"])) + 1
+        encoded = []
+        for band_records in np.split(records, boundaries):
+            for start in range(0, len(band_records), chunk_records):
+                encoded.append(encode_chunk(band_records[start : start + chunk_records]))
+
+        encoded.sort(key=lambda chunk: int(chunk[0]["min_t"][0]))  # Keep the index in time order
+        for header, data in encoded:
+            header["offset"] = self.file.tell()
+            self.file.write(header.tobytes() + data)
+            self.chunks.append(header)
+
+    def sync(self) -> None:
+        """Write everything to disk"""
+
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        """Write the new index and then the trailer, and close the file"""
+
+        index = np.concatenate(self.chunks) if self.chunks else np.zeros(0, dtype=CHUNK)
+        index_offset = self.file.tell()
+        self.file.write(index.tobytes())
+        self.sync()  # The trailer may only reach the disk after what it points to
+        self.file.write(
+            TRAILER.pack(index_offset, len(index), self.log_created_ns, self.log_position, MAGIC)
+        )
+        self.sync()
+        self.file.close()
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def roll(
+    log_filename: str | Path, archive_filename: str | Path, chunk_records: int = CHUNK_RECORDS
+) -> int:
+    """Move the records of an observation log which are not archived yet into an archive
+
+    :param log_filename: The observation log, may still be written to
+    :param archive_filename: The archive, created if it does not exist
+    :param chunk_records: Maximum number of records per chunk
+    :returns: Number of records archived
+    """
+
+    reader = observation_log.ObservationReader(log_filename)
+    writer = ArchiveWriter(archive_filename)
+    if writer.log_created_ns != reader.created_ns:
+        if writer.log_created_ns:
+            logging.info(f"{log_filename} is a new log, archiving it from the start")
+        writer.log_created_ns, writer.log_position = reader.created_ns, 0
+
+    records = reader.records(writer.log_position)
+    writer.append(records, chunk_records)
+    writer.log_position += len(records)
+    writer.close()
+    reader.close()
+    return len(records)
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+@click.command(name="archive")
+@click.argument("log_file", type=click.Path(exists=True))
+@click.argument("archive_file", type=click.Path())
+@click.option("--chunk", default=CHUNK_RECORDS, help="Maximum number of records per chunk")
+def archive_log(log_file: str, archive_file: str, chunk: int) -> None:
+    """Move the new records of an observation log into an archive"""
+
+    count = roll(log_file, archive_file, chunk)
+    archive = Archive(archive_file)
+    size = archive.filename.stat().st_size
+    print(
+        f"Archived {count} records. {archive_file}: {len(archive)} records in "
+        f"{len(archive.index)} chunks, {size / max(len(archive), 1):.2f} bytes per record"
+    )
+    archive.close()
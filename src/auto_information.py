@@ -0,0 +1,200 @@
+"""Auto information (AI1) streaming: react to changes made on the transceiver.
+
+With auto information on, the FTdx10 sends FA/FB/MD/IF frames by itself when the
+operator turns the VFO knob or changes the mode. The AutoInformation subscriber
+turns AI on, decodes these pushed frames into typed events, keeps its own
+transceiver.RigState up to date and publishes the events to callbacks and to an
+async iterator. No polling is needed to notice manual retuning.
+
+The pushed frames arrive through an AsyncCat driver, which owns the CAT port.
+The state is therefore kept apart from transceiver.rig_state, which belongs to
+the blocking cat session; monitor_engine.async_cat_tuner uses it instead.
+"""
+
+# pylint: disable=logging-fstring-interpolation
+
+# Global imports
+import asyncio
+import logging
+import math
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable
+
+# Local imports
+import cat_async
+import cycle_clock
+import param
+import transceiver
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+@dataclass
+class FrequencyEvent:
+    """The frequency of a VFO changed."""
+
+    t_ns: int  # UTC time of reception (cycle_clock), in nanoseconds
+    vfo: str  # "A" or "B"
+    frequency: int  # Hz
+
+
+@dataclass
+class ModeEvent:
+    """The mode of a band changed."""
+
+    t_ns: int
+    band: str  # "0" = main band, "1" = sub band
+    mode: str  # Mode string like 'CW-U'
+
+
+@dataclass
+class InformationEvent:
+    """A complete IF information frame was pushed."""
+
+    t_ns: int
+    frequency: int  # VFO A in Hz
+    mode: str  # Mode string like 'CW-U'
+    clarifier: str  # Clarifier offset, like '+0000'
+    rx_clarifier: bool
+
+
+Event = FrequencyEvent | ModeEvent | InformationEvent
+EventCallback = Callable[[Event], None]
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def decode_frame(frame: str, t_ns: int = 0) -> Event | None:
+    """Decode a pushed CAT frame into an event
+
+    :param frame: The frame, including the ';'
+    :param t_ns: Time of reception in nanoseconds
+    :returns: The event, None if the frame is not a (valid) FA/FB/MD/IF frame
+
+    >>> decode_frame("FA021150000;")
+    FrequencyEvent(t_ns=0, vfo='A', frequency=21150000)
+    >>> decode_frame("MD03;")
+    ModeEvent(t_ns=0, band='0', mode='CW-U')
+    >>> decode_frame("IF001014100000+000000300000;")
+    InformationEvent(t_ns=0, frequency=14100000, mode='CW-U', clarifier='+0000', rx_clarifier=False)
+    >>> decode_frame("SM0123;") is None
+    True
+    """
+
+    prefix, body = frame[:2], frame[2:].rstrip(";")
+    try:
+        if prefix in ("FA", "FB") and len(body) == 9:
+            return FrequencyEvent(t_ns, prefix[1], int(body))
+        if prefix == "MD" and len(body) == 2:
+            return ModeEvent(t_ns, body[0], param.mode_dict.get(body[1], "Unknown"))
+        if prefix == "IF" and len(body) >= 20:
+            return InformationEvent(
+                t_ns,
+                frequency=int(body[3:12]),
+                mode=param.mode_dict.get(body[19], "Unknown"),
+                clarifier=body[12:17],
+                rx_clarifier=body[17] == "1",
+            )
+    except ValueError:
+        logging.warning(f"Invalid auto information frame {frame}")
+    return None
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def apply_to_state(state: transceiver.RigState, event: Event, frame: str) -> None:
+    """Update the transceiver state with a pushed change
+
+    :param state: The state to update
+    :param event: The decoded event
+    :param frame: The frame the event was decoded from
+
+    >>> state = transceiver.RigState()
+    >>> apply_to_state(state, decode_frame("FA021150000;"), "FA021150000;")
+    >>> state.frequency
+    21150000
+    """
+
+    if isinstance(event, InformationEvent):
+        state.load(frame)
+    elif isinstance(event, FrequencyEvent) and event.vfo == "A":
+        state.frequency = event.frequency
+    elif isinstance(event, ModeEvent) and event.band == "0":
+        state.mode = frame[3]
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class AutoInformation:
+    """Subscriber for the auto information frames of one AsyncCat driver."""
+
+    def __init__(self, driver: cat_async.AsyncCat, queue_size: int = 100) -> None:
+        """Initialize the subscriber
+
+        :param driver: The started AsyncCat driver
+        :param queue_size: Maximum number of events buffered for events()
+        """
+
+        self.driver = driver
+        self.callbacks: list[EventCallback] = []
+        self.queue: asyncio.Queue[Event] = asyncio.Queue(maxsize=queue_size)
+        self.dropped: int = 0  # Events lost because the queue was full
+        # Kept up to date by the pushed frames, so it does not expire
+        self.rig_state = transceiver.RigState(ttl=math.inf)
+        driver.add_listener(self.on_frame)
+
+    def subscribe(self, callback: EventCallback) -> None:
+        """Register a callback for each event
+
+        :param callback: Function called with the event
+        """
+
+        self.callbacks.append(callback)
+
+    async def start(self) -> None:
+        """Turn auto information on and read the current state once"""
+
+        await self.driver.send("AI1;")
+        reply = await self.driver.query_one("IF;")
+        self.rig_state.load(reply)
+
+    async def stop(self) -> None:
+        """Turn auto information off"""
+
+        await self.driver.send("AI0;")
+        self.rig_state.invalidate()
+
+    def on_frame(self, frame: str) -> None:
+        """Listener for the frames nobody was waiting for
+
+        :param frame: The received frame
+        """
+
+        event = decode_frame(frame, cycle_clock.get_clock().now_ns())
+        if event is None:
+            return
+
+        apply_to_state(self.rig_state, event, frame)
+        for callback in self.callbacks:
+            try:
+                callback(event)
+            except Exception:  # pylint: disable=broad-exception-caught
+                logging.exception(f"Auto information callback {callback} failed")
+
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def events(self) -> AsyncIterator[Event]:
+        """Iterate over the events as they arrive
+
+        :returns: Async iterator of events
+        """
+
+        while True:
+            yield await self.queue.get()
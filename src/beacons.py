@@ -10,6 +10,7 @@ import logging
 from pathlib import Path
 
 # Local imports
+from config_folder import find_config_folder  # pylint: disable=unused-import  # Moved, kept for callers
 from lib.helper import debug, clear_debug_window
 
 
@@ -30,28 +31,6 @@ class Beacon:
 dict_of_beacons: dict[int, Beacon] = {}
 
 
-# ------------------------------------------------------------------------
-#
-# ------------------------------------------------------------------------
-def find_config_folder(foldername: str = "config") -> Path | None:
-    """Find the folder named 'config', searching up and down the current folder"""
-
-    current_dir = Path.cwd()
-
-    # Search upwards (parent directories)
-    for parent in current_dir.parents:
-        config_path = parent / foldername
-        if config_path.is_dir():
-            return config_path
-
-    # Search downwards (subdirectories)
-    for child in current_dir.glob(f"**/foldername"):
-        if child.is_dir():
-            return child
-
-    return None  # Return None if the 'config' folder is not found
-
-
 # ------------------------------------------------------------------------
 #
 # ------------------------------------------------------------------------
@@ -133,6 +112,28 @@ def get_dict_of_beacons(configfile: Path) -> dict[int, Beacon]:
     return beacon_dict
 
 
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def load_beacons(filename: str = "beacons.ini") -> dict[int, Beacon]:
+    """Load the beacons into dict_of_beacons, if not done already
+
+    :param filename: Name of the ini file with the beacon information
+    :return: dict_of_beacons (empty if the ini file could not be found)
+    """
+
+    global dict_of_beacons  # pylint: disable=global-statement
+
+    if not dict_of_beacons:
+        beacons_ini = find_ini_file(filename)
+        if beacons_ini is None:
+            logging.error(f"Could not find a file named {filename}")
+            return {}
+        dict_of_beacons = get_dict_of_beacons(beacons_ini)
+
+    return dict_of_beacons
+
+
 # -----------------------------------------------------------------------------
 #
 # -----------------------------------------------------------------------------
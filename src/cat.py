@@ -2,18 +2,39 @@
 
 # pylint: disable=invalid-name, logging-fstring-interpolation
 
+import collections
+import itertools
+import json
+import os
 import sys
+import threading
+import time
 import logging
+from pathlib import Path
 
 # 3rd party imports
 import serial  # type: ignore
 from serial.tools.list_ports import comports  # type: ignore
 
 # local imports
+import cat_stats
 import param
 
 logging.basicConfig(level=logging.INFO)
 
+# The FTdx10 has a Silicon Labs CP2105 dual UART, the CAT port is the Enhanced port
+CP2105_VID: int = 0x10C4
+CP2105_PID: int = 0xEA70
+CAT_PORT_DESCRIPTION = "Silicon Labs Dual CP2105 USB to UART Bridge: Enhanced COM Port"
+
+CAT_PORT_CACHE = (
+    Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+    / "ham-ibp-monitor"
+    / "cat_port.json"
+)
+
+UNSOLICITED_FRAMES: int = 100  # Number of unsolicited frames a CatSession keeps
+
 
 # ----------------------------------------------------------------------------
 #
@@ -36,34 +57,145 @@ def show_serial_ports() -> None:
 # ----------------------------------------------------------------------------
 #
 # ----------------------------------------------------------------------------
-def get_cat_port() -> str:
+def get_cat_port(use_cache: bool = True) -> str:
     """Get the serial port which acts as the CAT port
 
-    :return: port as string, for example 'COM6:'
+    :param use_cache: Try the port found last time first (see CAT_PORT_CACHE)
+    :return: port as string, for example 'COM6:'. Empty if not found.
+
+    Enumerating the serial ports is slow, so the result is cached on disk
+    together with the USB identity (VID, PID and serial number) of the device.
     """
 
-    for _n, (port, desc, _hwid) in enumerate(sorted(comports()), 1):
-        if "Silicon Labs Dual CP2105 USB to UART Bridge: Enhanced COM Port" in desc:
-            return str(port)
+    if use_cache:
+        cached = load_cached_port()
+        if cached and cached_port_valid(cached):
+            logging.debug(f"Using cached CAT port {cached['device']}")
+            return str(cached["device"])
+
+    for info in sorted(comports()):
+        if is_cat_port(info):
+            save_cached_port(info)
+            return str(info.device)
 
     # Default: return nothing
     return ""
 
 
+# ----------------------------------------------------------------------------
+#
+# ----------------------------------------------------------------------------
+def is_cat_port(info) -> bool:  # type: ignore
+    """Check if a port found by comports() is the CAT port of the transceiver
+
+    :param info: ListPortInfo of the port
+    :return: True if it is the Enhanced COM port of the CP2105
+    """
+
+    if CAT_PORT_DESCRIPTION in (info.description or ""):
+        return True
+    if (info.vid, info.pid) != (CP2105_VID, CP2105_PID):
+        return False
+    names = f"{info.description} {getattr(info, 'interface', '')}"
+    # Linux reports the first interface of the CP2105 as location '...:1.0'
+    return "Enhanced" in names or str(info.location or "").endswith(".0")
+
+
+# ----------------------------------------------------------------------------
+#
+# ----------------------------------------------------------------------------
+def load_cached_port() -> dict | None:
+    """Load the cached CAT port
+
+    :return: dict with device, vid, pid and serial_number, None if there is no cache
+    """
+
+    try:
+        return json.loads(CAT_PORT_CACHE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+# ----------------------------------------------------------------------------
+#
+# ----------------------------------------------------------------------------
+def save_cached_port(info) -> None:  # type: ignore
+    """Save the CAT port found by comports() in the cache
+
+    :param info: ListPortInfo of the port
+    """
+
+    cached = {
+        "device": info.device,
+        "vid": info.vid,
+        "pid": info.pid,
+        "serial_number": info.serial_number,
+    }
+    try:
+        CAT_PORT_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        CAT_PORT_CACHE.write_text(json.dumps(cached), encoding="utf-8")
+    except OSError as e:
+        logging.debug(f"Could not cache the CAT port: {e}")
+
+
+# ----------------------------------------------------------------------------
+#
+# ----------------------------------------------------------------------------
+def cached_port_valid(cached: dict) -> bool:
+    """Check if the cached port is still the same device
+
+    :param cached: The cached port, see load_cached_port()
+    :return: True if the port is there with the cached USB identity
+
+    On Linux the USB identity of just this device is read from sysfs, without
+    enumerating all ports. On other platforms the port is looked up in comports(),
+    so a port name reused by another USB-serial device is not taken for the radio.
+    """
+
+    device = str(cached.get("device", ""))
+    if not device:
+        return False
+    identity = (cached.get("vid"), cached.get("pid"), cached.get("serial_number"))
+
+    if device.startswith("/dev/") and os.path.exists(f"/sys/class/tty/{Path(device).name}"):
+        from serial.tools.list_ports_linux import SysFS  # type: ignore  # pylint: disable=import-outside-toplevel
+
+        info = SysFS(device)
+        return (info.vid, info.pid, info.serial_number) == identity
+
+    for info in comports():
+        if info.device == device:
+            return (info.vid, info.pid, info.serial_number) == identity
+    return False
+
+
 # -----------------------------------------------------------------------------
 #
 # -----------------------------------------------------------------------------
-def open_cat_port(cat_port: str = "") -> serial.Serial:
+def open_cat_port(
+    cat_port: str = "", baudrate: int = 38400, reconnect: bool = False
+) -> serial.Serial:
     """Open the serial CAT port
 
-    :param cat_port: If given, use this port (for example 'COM6:')
+    :param cat_port: If given, use this port (for example 'COM6:', '/dev/ttyUSB0',
+                     the pty of the ftdx10_emulator, or a pyserial URL)
                      If no port is given, determine it now.
+    :param baudrate: Baud rate of the CAT port
+    :param reconnect: Return a ReconnectingPort, which survives the device disappearing
 
     :return: instance of the opened serial port.
     """
 
     logging.debug("Trying to open CAT port")
 
+    if reconnect:
+        try:
+            return ReconnectingPort(cat_port, baudrate)
+        except serial.SerialException as e:
+            print(f"Error: {e}")
+            sys.exit(-1)
+
+    found = bool(cat_port)
     if not cat_port:
         cat_port = get_cat_port()
         if not cat_port:
@@ -71,11 +203,423 @@ def open_cat_port(cat_port: str = "") -> serial.Serial:
             sys.exit(-1)
 
     logging.debug(f"{cat_port=}")
-    port = serial.Serial(cat_port, baudrate=38400, timeout=0.1)
+    try:
+        port = serial.serial_for_url(cat_port, baudrate=baudrate, timeout=0.1)
+    except serial.SerialException:
+        if found:
+            raise
+        # The cached port may be stale: search again
+        cat_port = get_cat_port(use_cache=False)
+        if not cat_port:
+            print("Error: Could not find a CAT port to open")
+            sys.exit(-1)
+        port = serial.serial_for_url(cat_port, baudrate=baudrate, timeout=0.1)
     logging.debug(f"{port=}")
     return port
 
 
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class ReconnectingPort:
+    """Serial port wrapper which reopens the CAT port when the device disappears.
+
+    On a read or write error the port is closed, the CAT port is resolved again
+    (the device may come back under another name) and reopened, with an
+    exponential backoff between the attempts. Data in transit is lost: a read
+    returns b"" and a write is retried once on the new port.
+    """
+
+    def __init__(
+        self,
+        cat_port: str = "",
+        baudrate: int = 38400,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        attempts: int = 3,
+    ) -> None:
+        """Open the port
+
+        :param cat_port: Fixed port to use. Resolved with get_cat_port() if empty.
+        :param baudrate: Baud rate of the CAT port
+        :param backoff: First wait time between reconnect attempts in seconds
+        :param max_backoff: Maximum wait time between reconnect attempts in seconds
+        :param attempts: Number of attempts to open the port the first time
+        :raises serial.SerialException: If the port could not be opened at all
+        """
+
+        self.cat_port = cat_port
+        self.baudrate = baudrate
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.reconnects: int = 0
+        self.port: serial.Serial | None = None
+        self.connect(use_cache=True, attempts=attempts)
+
+    def connect(self, use_cache: bool = False, attempts: int = 0) -> None:
+        """Resolve and open the port, retrying with backoff
+
+        :param use_cache: Allow the cached port for the first attempt
+        :param attempts: Give up after this many attempts. 0 means retry until it succeeds.
+        :raises serial.SerialException: If all attempts failed
+        """
+
+        delay = self.backoff
+        for attempt in itertools.count(1):
+            device = self.cat_port or get_cat_port(use_cache=use_cache)
+            use_cache = False
+            if device:
+                try:
+                    self.port = serial.serial_for_url(
+                        device, baudrate=self.baudrate, timeout=0.1
+                    )
+                    logging.info(f"CAT port {device} opened")
+                    return
+                except serial.SerialException as e:
+                    logging.warning(f"Could not open CAT port {device}: {e}")
+            else:
+                logging.warning("Could not find a CAT port")
+            if attempt == attempts:
+                raise serial.SerialException(f"Could not open a CAT port in {attempts} attempts")
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_backoff)
+
+    def reconnect(self, error: Exception) -> None:
+        """Close the failed port and connect again
+
+        :param error: The error which occurred
+        """
+
+        logging.error(f"CAT port failed: {error}. Reconnecting")
+        try:
+            if self.port is not None:
+                self.port.close()
+        except (serial.SerialException, OSError):
+            pass
+        self.reconnects += 1
+        self.connect()
+
+    @property
+    def in_waiting(self) -> int:
+        """Number of bytes in the receive buffer"""
+
+        try:
+            return self.port.in_waiting
+        except (serial.SerialException, OSError) as e:
+            self.reconnect(e)
+            return 0
+
+    @property
+    def timeout(self) -> float | None:
+        """Read timeout of the port"""
+
+        return self.port.timeout
+
+    def read(self, size: int = 1) -> bytes:
+        """Read from the port
+
+        :param size: Maximum number of bytes
+        :return: The data, b"" after a timeout or a reconnect
+        """
+
+        try:
+            return self.port.read(size)
+        except (serial.SerialException, OSError) as e:
+            self.reconnect(e)
+            return b""
+
+    def write(self, data: bytes) -> int | None:
+        """Write to the port, once more after a reconnect
+
+        :param data: The data
+        :return: Number of bytes written
+        """
+
+        try:
+            return self.port.write(data)
+        except (serial.SerialException, OSError) as e:
+            self.reconnect(e)
+            return self.port.write(data)
+
+    def close(self) -> None:
+        """Close the port"""
+
+        if self.port is not None:
+            self.port.close()
+
+
+# Number of parameter characters of the read (query) form of each command.
+# A command with exactly this many characters between the prefix and the ';'
+# is a query and gets a reply. Longer commands are set commands, which the
+# FTdx10 does not answer (except with '?;' in case of an error).
+QUERY_PARAMETER_LENGTH: dict[str, int] = {
+    "AG": 1,  # AF gain
+    "AI": 0,  # Auto information
+    "CF": 3,  # Clarifier
+    "FA": 0,  # Frequency VFO A
+    "FB": 0,  # Frequency VFO B
+    "ID": 0,  # Identification
+    "IF": 0,  # Information
+    "MD": 1,  # Operating mode
+    "PS": 0,  # Power switch
+    "RG": 1,  # RF gain
+    "RM": 1,  # Read meter
+    "SM": 1,  # S-meter
+    "VS": 0,  # VFO select
+}
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def to_command(cmd: str | bytes) -> str:
+    """Convert a command to a string with the ';' terminator
+
+    :param cmd: The command (string or bytes)
+    :returns: The terminated command string
+
+    >>> to_command("FA")
+    'FA;'
+    >>> to_command(b"MD03;")
+    'MD03;'
+    """
+
+    if isinstance(cmd, bytes):
+        cmd = cmd.decode("utf-8")
+    if not cmd.endswith(";"):
+        cmd += ";"
+    return cmd
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def expects_reply(cmd: str) -> bool:
+    """Determine if the transceiver will answer the given command
+
+    :param cmd: The terminated command string
+    :returns: True if a reply is expected
+
+    >>> expects_reply("FA;")
+    True
+    >>> expects_reply("FA014100000;")
+    False
+    >>> expects_reply("SM0;")
+    True
+    >>> expects_reply("CF001+0000;")
+    False
+    >>> expects_reply("XY;")             # Unknown commands may have a reply
+    True
+    """
+
+    prefix = cmd[:2].upper()
+    parameters = cmd[2:].rstrip(";")
+    length = QUERY_PARAMETER_LENGTH.get(prefix)
+    if length is None:
+        return True
+    return len(parameters) == length
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class CatSession:
+    """Persistent CAT session, which sends commands in batches.
+
+    All queued commands are concatenated and sent in a single write.
+    Only the commands which produce a reply (see QUERY_PARAMETER_LENGTH) are
+    waited for, and the reply stream is parsed incrementally, frame by frame.
+    One exchange at a time: the session can be shared between threads.
+    """
+
+    def __init__(self, port: serial.Serial | None = None, timeout: float = 0.1) -> None:
+        """Initialize the session
+
+        :param port: The opened CAT port. Opened here if not given.
+        :param timeout: Give up waiting if no data arrives for this many seconds
+        """
+
+        self.port = port if port is not None else open_cat_port()
+        self.timeout = timeout
+        self.queued: list[str] = []
+        self.buffer = b""
+        self.errors: int = 0  # Number of '?;' replies
+        # Frames not belonging to any query, the most recent UNSOLICITED_FRAMES
+        self.unsolicited: collections.deque[str] = collections.deque(maxlen=UNSOLICITED_FRAMES)
+        self.lock = threading.RLock()
+        self.stats = cat_stats.CatStats()
+
+    def queue(self, cmd: str | bytes) -> None:
+        """Queue a command, to be sent with the next flush()
+
+        :param cmd: The command (string or bytes)
+        """
+
+        self.queued.append(to_command(cmd))
+
+    def flush(self) -> list[str]:
+        """Send all queued commands in one write and collect the replies
+
+        :returns: The reply of each queued command, "" for commands without a reply,
+            '?;' for a command the transceiver rejected
+        """
+
+        with self.lock:
+            commands, self.queued = self.queued, []
+            if not commands:
+                return []
+            return self.exchange(commands)
+
+    def exchange(self, commands: list[str]) -> list[str]:
+        """Write the commands and wait for the replies. Call with the lock held.
+
+        :param commands: The terminated commands
+        :returns: The reply of each command, "" for commands without a reply,
+            '?;' for a command the transceiver rejected
+        """
+
+        # Anything which arrived since the last exchange is not a reply to these commands
+        self.poll()
+
+        data = "".join(commands)
+        logging.debug(f"CAT write {data}")
+        self.port.write(data.encode("utf-8"))
+        t_write = time.perf_counter_ns()
+        self.stats.exchanges += 1
+        self.stats.bytes_out += len(data)
+
+        replies = [""] * len(commands)
+        unprocessed = list(range(len(commands)))  # All commands, set commands too
+        queries = [i for i, cmd in enumerate(commands) if expects_reply(cmd)]
+        pending = queries
+        deadline = time.perf_counter() + self.timeout
+        while pending and time.perf_counter() < deadline:
+            for frame in self.receive(block=True):
+                if self.assign(frame, commands, replies, unprocessed):
+                    deadline = time.perf_counter() + self.timeout
+                    if frame != "?;":
+                        self.stats.record_reply(frame[:2], time.perf_counter_ns() - t_write)
+            pending = [i for i in queries if i in unprocessed]
+
+        if pending:
+            logging.debug(f"No reply to {[commands[i] for i in pending]}")
+            for i in pending:
+                self.stats.record_timeout(commands[i][:2].upper())
+            if self.buffer:
+                self.stats.partial_frames += 1
+        return replies
+
+    def execute(self, *cmds: str | bytes) -> list[str]:
+        """Send the given commands in one write
+
+        :param cmds: The commands to send
+        :returns: The reply of each command, "" for commands without a reply,
+            '?;' for a command the transceiver rejected
+        """
+
+        with self.lock:
+            for cmd in cmds:
+                self.queue(cmd)
+            return self.flush()
+
+    def poll(self) -> None:
+        """Handle the frames which arrived outside an exchange, without waiting
+
+        Set commands are not waited for, so a '?;' outside an exchange rejects a
+        set command sent earlier. It is counted in errors, other frames go to unsolicited.
+        """
+
+        with self.lock:
+            for frame in self.receive(block=False):
+                logging.debug(f"CAT read {frame}")
+                if frame == "?;":
+                    self.errors += 1
+                    logging.warning("Transceiver rejected a CAT set command")
+                else:
+                    self.unsolicited.append(frame)
+
+    def receive(self, block: bool = True) -> list[str]:
+        """Read the available data and split off the complete frames
+
+        :param block: If True, wait up to the port timeout for at least one byte
+        :returns: List of complete frames (including the ';')
+        """
+
+        waiting = self.port.in_waiting
+        if waiting or block:
+            data = self.port.read(max(waiting, 1))
+            self.stats.bytes_in += len(data)
+            self.buffer += data
+
+        frames = []
+        while b";" in self.buffer:
+            frame, self.buffer = self.buffer.split(b";", 1)
+            frames.append(frame.decode("utf-8", errors="replace") + ";")
+        return frames
+
+    def assign(
+        self, frame: str, commands: list[str], replies: list[str], unprocessed: list[int]
+    ) -> bool:
+        """Assign a received frame to the first unprocessed query with the same prefix
+
+        :param frame: The received frame
+        :param commands: The sent commands, set commands included
+        :param replies: Replies per command, updated here
+        :param unprocessed: Indices of the commands not known to be processed, in the
+            order they were sent, updated here
+        :returns: True if the frame was a reply or an error report
+
+        The transceiver handles the commands in order. It answers a query with its
+        reply and a rejected command (set or query) with '?;'. An accepted set
+        command gets no answer, so a reply shows that all commands before its query
+        were processed, and a '?;' is taken to belong to the oldest unprocessed
+        command. A query is therefore never marked as rejected while set commands
+        sent ahead of it are unconfirmed.
+        """
+
+        logging.debug(f"CAT read {frame}")
+        if frame == "?;":
+            self.errors += 1
+            if unprocessed:
+                rejected = unprocessed.pop(0)
+                replies[rejected] = frame
+                logging.warning(f"Transceiver rejected CAT command {commands[rejected]}")
+            else:
+                logging.warning("Transceiver reported an invalid CAT command")
+            return True
+
+        for n, i in enumerate(unprocessed):
+            if expects_reply(commands[i]) and commands[i][:2].upper() == frame[:2]:
+                replies[i] = frame
+                del unprocessed[: n + 1]
+                return True
+
+        self.unsolicited.append(frame)
+        return False
+
+
+session: CatSession | None = None
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def get_session() -> CatSession:
+    """Get the CAT session on param.port. The port is opened if necessary,
+    as a ReconnectingPort.
+
+    :returns: The shared CatSession
+    """
+
+    global session  # pylint: disable=global-statement
+
+    if not param.port:
+        param.port = open_cat_port(reconnect=True)
+    if session is None or session.port is not param.port:
+        session = CatSession(param.port)
+    return session
+
+
 # -----------------------------------------------------------------------------
 #
 # -----------------------------------------------------------------------------
@@ -85,38 +629,20 @@ def write(cmd: str | bytes) -> str:
     :param cmd: The command (string or bytearray) to send
     :returns: Response (if any)
 
-    If a string is given, then it will be converted to a bytearray.
     If the terminator ';' was not present, it will be added here.
-    If no CAT port was opened, it will be opened here
+    If no CAT port was opened, it will be opened here.
+    Only commands which have a reply are waited for.
 
     """
 
-    b = cmd
-    if isinstance(cmd, str):
-        # Add the termination character if neccessary
-        if not cmd.endswith(";"):
-            cmd += ";"
-        b = cmd.encode("utf-8")
-    elif isinstance(cmd, bytes):
-        # Add the termination character if neccessary
-        if not cmd.endswith(b";"):
-            cmd += b";"
-    else:
+    if not isinstance(cmd, (str, bytes)):
         logging.error("Invalid cmd format. Must be str or bytes")
+        return ""
 
-    if not param.port:
-        param.port = open_cat_port()
-
-    param.port.write(b)
-
-    # Check if there is a response. If so, log it
-    response = param.port.read_until(expected=";")
+    response = get_session().execute(cmd)[0]
     if response:
         logging.debug(f"{response=}")
-        ret: str = response.decode("utf-8")
-        return ret
-
-    return ""  # Default is an empty string
+    return response
 
 
 # -----------------------------------------------------------------------------
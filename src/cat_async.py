@@ -0,0 +1,245 @@
+"""Asyncio CAT driver with demultiplexing of the replies by command prefix.
+
+The blocking cat module serializes everything behind the port timeout.
+This driver keeps one reader thread on the serial port, which hands the received
+bytes to a single reader task in the event loop. The reader task splits the
+stream on ';' and routes each reply to the future waiting for that prefix
+('SM', 'RM', 'IF', 'FA', ...). Several coroutines can therefore have requests
+in flight against one radio without waiting for each other.
+
+Frames nobody waits for (for example auto information updates) are passed to
+the registered listeners.
+
+The transceiver handles the commands in order and answers a rejected command
+with '?;'. The driver keeps all written commands in order, set commands too, and
+fails the future of the query a '?;' belongs to with a ValueError.
+"""
+
+# pylint: disable=logging-fstring-interpolation
+
+# Global imports
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+# 3rd party imports
+import serial  # type: ignore
+
+# Local imports
+import cat
+
+FrameListener = Callable[[str], None]
+
+ANSWER_TIME: float = 1.0  # A set command without '?;' for this long was accepted
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class AsyncCat:
+    """Asyncio driver for one CAT port."""
+
+    def __init__(self, port: serial.Serial | None = None) -> None:
+        """Initialize the driver
+
+        :param port: The opened CAT port. Opened in start() if not given.
+        """
+
+        self.port = port
+        self.waiters: dict[str, deque[asyncio.Future]] = {}
+        # The written commands not known to be processed, in order:
+        # (time.monotonic() of the write, future of a query or None for a set command)
+        self.outstanding: deque[tuple[float, asyncio.Future | None]] = deque()
+        self.listeners: list[FrameListener] = []
+        self.errors: int = 0  # Number of '?;' replies
+
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.received: asyncio.Queue[bytes] | None = None
+        self.write_lock: asyncio.Lock | None = None
+        self.reader_task: asyncio.Task | None = None
+        self.reader_thread: threading.Thread | None = None
+        self.running = False
+        self.buffer = b""
+
+    async def start(self) -> None:
+        """Start the reader thread and the reader task"""
+
+        if self.port is None:
+            self.port = await asyncio.to_thread(cat.open_cat_port)
+
+        self.loop = asyncio.get_running_loop()
+        self.received = asyncio.Queue()
+        self.write_lock = asyncio.Lock()
+        self.running = True
+        self.reader_thread = threading.Thread(
+            target=self.read_port, name="cat-reader", daemon=True
+        )
+        self.reader_thread.start()
+        self.reader_task = asyncio.create_task(self.read_frames())
+
+    async def stop(self) -> None:
+        """Stop the reader thread and the reader task, and cancel all waiters"""
+
+        self.running = False
+        if self.reader_task:
+            self.reader_task.cancel()
+        if self.reader_thread:
+            await asyncio.to_thread(self.reader_thread.join)
+        for waiters in self.waiters.values():
+            for future in waiters:
+                future.cancel()
+        self.waiters.clear()
+        self.outstanding.clear()
+
+    async def __aenter__(self) -> "AsyncCat":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *_args: object) -> None:
+        await self.stop()
+
+    def add_listener(self, listener: FrameListener) -> None:
+        """Register a function to be called for each frame nobody waits for
+
+        :param listener: Function called with the frame (including ';')
+        """
+
+        self.listeners.append(listener)
+
+    def read_port(self) -> None:
+        """Thread: read the serial port and pass the data to the event loop"""
+
+        while self.running:
+            try:
+                data = self.port.read(max(self.port.in_waiting, 1))
+            except serial.SerialException as e:
+                logging.error(f"CAT port read failed: {e}")
+                break
+            if data:
+                self.loop.call_soon_threadsafe(self.received.put_nowait, data)
+
+    async def read_frames(self) -> None:
+        """Task: split the received data into frames and dispatch them"""
+
+        while True:
+            self.buffer += await self.received.get()
+            while b";" in self.buffer:
+                frame, self.buffer = self.buffer.split(b";", 1)
+                self.dispatch(frame.decode("utf-8", errors="replace") + ";")
+
+    def dispatch(self, frame: str) -> None:
+        """Route a frame to the oldest future waiting for its prefix
+
+        :param frame: The received frame
+        """
+
+        logging.debug(f"CAT read {frame}")
+        if frame == "?;":
+            self.errors += 1
+            self.reject()
+            return
+
+        waiters = self.waiters.get(frame[:2])
+        while waiters:
+            future = waiters.popleft()
+            if not future.done():
+                future.set_result(frame)
+                # The commands written before this query have been processed
+                while self.outstanding and self.outstanding.popleft()[1] is not future:
+                    pass
+                return
+
+        for listener in self.listeners:
+            try:
+                listener(frame)
+            except Exception:  # pylint: disable=broad-exception-caught
+                logging.exception(f"CAT frame listener {listener} failed")
+
+    def reject(self) -> None:
+        """Handle a '?;': fail the oldest command which is not known to be processed"""
+
+        accepted = time.monotonic() - ANSWER_TIME
+        while self.outstanding:
+            t_write, future = self.outstanding.popleft()
+            if future is None:
+                if t_write < accepted:
+                    continue  # An older set command, which got no '?;' in time
+                logging.warning("Transceiver rejected a CAT set command")
+                return
+            if not future.done():  # Skip queries which timed out
+                future.set_exception(ValueError("Transceiver rejected the CAT command"))
+                logging.warning("Transceiver rejected a CAT query")
+                return
+        logging.warning("Transceiver reported an invalid CAT command")
+
+    async def write(
+        self, data: str, sent: list[tuple[str, asyncio.Future | None]] | None = None
+    ) -> None:
+        """Write data to the port, without blocking the event loop
+
+        :param data: One or more terminated commands
+        :param sent: (command, future for the reply or None) of each command in data.
+            Registered in the order of writing, so the replies find their future.
+        """
+
+        logging.debug(f"CAT write {data}")
+        async with self.write_lock:
+            t_write = time.monotonic()
+            for cmd, future in sent or []:
+                if future is not None:
+                    self.waiters.setdefault(cmd[:2].upper(), deque()).append(future)
+                self.outstanding.append((t_write, future))
+            await asyncio.to_thread(self.port.write, data.encode("utf-8"))
+
+    async def send(self, *cmds: str | bytes) -> None:
+        """Send one or more set commands in a single write, without waiting
+
+        :param cmds: The commands to send
+        """
+
+        commands = [cat.to_command(cmd) for cmd in cmds]
+        await self.write("".join(commands), [(cmd, None) for cmd in commands])
+
+    async def query(self, *cmds: str | bytes, timeout: float = 1.0) -> list[str]:
+        """Send commands in a single write and wait for the replies
+
+        :param cmds: The commands to send
+        :param timeout: Maximum time to wait for the replies in seconds
+        :returns: The reply of each command, "" for no reply or a timeout,
+            '?;' for a query the transceiver rejected
+        """
+
+        commands = [cat.to_command(cmd) for cmd in cmds]
+        futures: list[asyncio.Future | None] = [
+            self.loop.create_future() if cat.expects_reply(cmd) else None for cmd in commands
+        ]
+        await self.write("".join(commands), list(zip(commands, futures)))
+
+        pending = [f for f in futures if f is not None]
+        if pending:
+            _done, not_done = await asyncio.wait(pending, timeout=timeout)
+            for future in not_done:
+                future.cancel()  # Skipped by dispatch() from now on
+
+        replies = []
+        for future in futures:
+            if future is None or future.cancelled():
+                replies.append("")
+            elif future.exception() is not None:
+                replies.append("?;")
+            else:
+                replies.append(future.result())
+        return replies
+
+    async def query_one(self, cmd: str | bytes, timeout: float = 1.0) -> str:
+        """Send one command and wait for its reply
+
+        :param cmd: The command to send
+        :param timeout: Maximum time to wait for the reply in seconds
+        :returns: The reply, "" for no reply or a timeout, '?;' if it was rejected
+        """
+
+        return (await self.query(cmd, timeout=timeout))[0]
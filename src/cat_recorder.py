@@ -0,0 +1,293 @@
+"""Record the CAT traffic to a compact binary file, and replay it as a fake port.
+
+RecordingPort wraps an opened CAT port and logs every write and every
+non-empty read with its direction and time.perf_counter_ns() timestamp.
+tap() puts it under an existing CatSession.
+
+File format (little endian)::
+
+    header: 8s magic b"CATREC1\\n", uint32 baud rate, int64 perf_counter_ns at the start
+    record: int64 ns since the start, uint8 direction, uint16 length, data
+
+ReplayPort reads such a recording and behaves like the recorded transceiver:
+each recorded reply becomes readable once the host has sent the request it
+followed, after the recorded delay, at 1x or accelerated speed. Writes are
+accepted and compared with the recorded writes.
+"""
+
+# pylint: disable=logging-fstring-interpolation
+
+# Global imports
+import logging
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, BinaryIO, Iterator
+
+# 3rd party imports
+import click
+
+# Local imports
+import cat
+import param
+
+MAGIC: bytes = b"CATREC1\n"
+HEADER = struct.Struct("<8sIq")
+RECORD = struct.Struct("<qBH")
+
+WRITE: int = 0  # Host to transceiver
+READ: int = 1  # Transceiver to host
+DIRECTION_NAMES = {WRITE: "->", READ: "<-"}
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class RecordingPort:
+    """Serial port wrapper which records all traffic."""
+
+    def __init__(self, port: Any, filename: str | Path, baudrate: int = 38400) -> None:
+        """Start recording
+
+        :param port: The opened CAT port (serial.Serial or cat.ReconnectingPort)
+        :param filename: The file to write the recording to
+        :param baudrate: Baud rate of the port, stored in the header
+        """
+
+        self.port = port
+        self.lock = threading.Lock()
+        self.file: BinaryIO = open(filename, "wb")  # pylint: disable=consider-using-with
+        self.start_ns = time.perf_counter_ns()
+        self.file.write(HEADER.pack(MAGIC, baudrate, self.start_ns))
+
+    def record(self, direction: int, data: bytes) -> None:
+        """Append a record
+
+        :param direction: WRITE or READ
+        :param data: The bytes which went over the wire
+        """
+
+        t_ns = time.perf_counter_ns() - self.start_ns
+        with self.lock:
+            for offset in range(0, len(data), 0xFFFF):
+                chunk = data[offset : offset + 0xFFFF]
+                self.file.write(RECORD.pack(t_ns, direction, len(chunk)) + chunk)
+
+    @property
+    def in_waiting(self) -> int:
+        """Number of bytes in the receive buffer"""
+
+        return self.port.in_waiting
+
+    @property
+    def timeout(self) -> float | None:
+        """Read timeout of the port"""
+
+        return self.port.timeout
+
+    def read(self, size: int = 1) -> bytes:
+        """Read from the port and record the data
+
+        :param size: Maximum number of bytes
+        :return: The data
+        """
+
+        data = self.port.read(size)
+        if data:
+            self.record(READ, data)
+        return data
+
+    def write(self, data: bytes) -> int | None:
+        """Record the data and write it to the port
+
+        :param data: The data
+        :return: Number of bytes written
+        """
+
+        self.record(WRITE, data)
+        return self.port.write(data)
+
+    def close(self) -> None:
+        """Close the recording and the port"""
+
+        with self.lock:
+            self.file.close()
+        self.port.close()
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def tap(session: cat.CatSession, filename: str | Path) -> RecordingPort:
+    """Record the traffic of a CAT session from now on
+
+    :param session: The CAT session, for example cat.get_session()
+    :param filename: The file to write the recording to
+    :returns: The RecordingPort, close it to finish the recording
+    """
+
+    with session.lock:
+        baudrate = getattr(session.port, "baudrate", 38400)
+        recording = RecordingPort(session.port, filename, baudrate)
+        if param.port is session.port:
+            # The shared session: cat.get_session() keeps it only while it is on param.port
+            param.port = recording
+        session.port = recording
+    return recording
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def read_recording(filename: str | Path) -> Iterator[tuple[int, int, bytes]]:
+    """Read the records of a recording
+
+    :param filename: The recording
+    :returns: Generator of (ns since the start, direction, data)
+    :raises ValueError: If the file is not a CAT recording
+    """
+
+    with open(filename, "rb") as f:
+        magic, _baudrate, _start_ns = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{filename} is not a CAT recording")
+        while header := f.read(RECORD.size):
+            if len(header) < RECORD.size:
+                logging.warning(f"Truncated record at the end of {filename}")
+                return
+            t_ns, direction, length = RECORD.unpack(header)
+            yield t_ns, direction, f.read(length)
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class ReplayPort:
+    """Fake CAT port which plays back the replies of a recording."""
+
+    def __init__(self, filename: str | Path, speed: float = 1.0, timeout: float = 0.1) -> None:
+        """Load the recording
+
+        :param filename: The recording
+        :param speed: Replay speed, 2.0 = twice as fast. 0 = no delays at all.
+        :param timeout: Maximum time read() waits for data, in seconds
+        """
+
+        self.speed = speed
+        self.timeout = timeout
+
+        # Each reply is released after the host has written as many bytes as had been
+        # written before it in the recording, with the recorded delay after that write.
+        self.reads: list[tuple[int, int, bytes]] = []  # (written bytes, delay ns, data)
+        writes = []
+        written, last_write_ns = 0, 0
+        for t_ns, direction, data in read_recording(filename):
+            if direction == WRITE:
+                writes.append(data)
+                written, last_write_ns = written + len(data), t_ns
+            else:
+                self.reads.append((written, t_ns - last_write_ns, data))
+        self.writes = b"".join(writes)
+
+        self.buffer = b""
+        self.next_read: int = 0  # Index in self.reads of the next record to release
+        self.written: int = 0  # Number of bytes written by the host
+        self.write_ns: list[tuple[int, int]] = [(0, time.perf_counter_ns())]
+        self.mismatches: int = 0  # Writes which differ from the recording
+
+    def due_ns(self) -> int | None:
+        """perf_counter_ns() at which the next reply is due, None if it is not known yet"""
+
+        if self.next_read >= len(self.reads):
+            return None
+        needed, delay_ns, _data = self.reads[self.next_read]
+        if self.written < needed:
+            return None  # The host has not sent the request yet
+
+        # The moment of the host write which completed the request
+        t_write = next(t for end, t in self.write_ns if end >= needed)
+        return t_write + (round(delay_ns / self.speed) if self.speed else 0)
+
+    def release(self) -> None:
+        """Move the replies which are due from the recording to the receive buffer"""
+
+        now = time.perf_counter_ns()
+        while (due := self.due_ns()) is not None and due <= now:
+            self.buffer += self.reads[self.next_read][2]
+            self.next_read += 1
+
+        # Forget the writes no reply refers to anymore
+        if self.next_read < len(self.reads):
+            needed = self.reads[self.next_read][0]
+            while len(self.write_ns) > 1 and self.write_ns[1][0] < needed:
+                del self.write_ns[0]
+
+    @property
+    def finished(self) -> bool:
+        """True if all replies have been released and read"""
+
+        return self.next_read >= len(self.reads) and not self.buffer
+
+    @property
+    def in_waiting(self) -> int:
+        """Number of bytes released and not read yet"""
+
+        self.release()
+        return len(self.buffer)
+
+    def read(self, size: int = 1) -> bytes:
+        """Read the released data, waiting up to the timeout for more
+
+        :param size: Maximum number of bytes
+        :return: The data, b"" after a timeout
+        """
+
+        self.release()
+        if not self.buffer and self.timeout:
+            due = self.due_ns()
+            wait = self.timeout
+            if due is not None:
+                wait = min(max(due - time.perf_counter_ns(), 0) / 1e9, wait)
+            time.sleep(wait)
+            self.release()
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def write(self, data: bytes) -> int:
+        """Accept data, and count it as a mismatch if it differs from the recording
+
+        :param data: The data
+        :return: Number of bytes written
+        """
+
+        if self.writes[self.written : self.written + len(data)] != data:
+            self.mismatches += 1
+            logging.debug(f"Replay write {data!r} differs from the recording")
+        self.written += len(data)
+        self.write_ns.append((self.written, time.perf_counter_ns()))
+        return len(data)
+
+    def close(self) -> None:
+        """Nothing to close"""
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+@click.command()
+@click.argument("filename", type=click.Path(exists=True))
+def main(filename: str) -> None:
+    """Print a CAT recording"""
+
+    for t_ns, direction, data in read_recording(filename):
+        text = data.decode("ascii", errors="replace")
+        print(f"{t_ns / 1e6:12.3f} ms {DIRECTION_NAMES.get(direction, '??')} {text}")
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+# pylint: disable=no-value-for-parameter
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""CAT link instrumentation: latency histograms per command and link utilisation.
+
+Every CatSession keeps a CatStats instance. For each reply the time between the
+write of the request and the reception of the reply is recorded in a
+LatencyHistogram per command prefix ('SM', 'RM', 'FA', ...). Commands which got
+no reply before the session timeout are counted as timeouts, and an exchange
+which ended with an incomplete frame in the buffer counts as a partial frame.
+Together with the bytes in and out, this gives the utilisation of the link in
+both directions against the baud rate.
+
+The histograms are HDR style: linear sub-buckets within each power of two, so
+the relative error is below 1/16 (see SUB_BUCKET_BITS) over the full range of
+1 us to 100 s, with a fixed amount of memory.
+
+The statistics are shown with the 'cat stats' command, see cat_tools.
+"""
+
+# pylint: disable=logging-fstring-interpolation
+
+# Global imports
+import json
+import time
+from pathlib import Path
+from typing import Any
+
+# 3rd party imports
+import numpy as np
+
+SUB_BUCKET_BITS: int = 5  # 32 sub-buckets: relative error below 1/16
+SUB_BUCKETS: int = 1 << SUB_BUCKET_BITS
+HALF_SUB_BUCKETS: int = SUB_BUCKETS // 2
+MAX_MICROSECONDS: int = 100_000_000  # Highest value with full precision: 100 s
+BITS_PER_BYTE: int = 10  # Start bit, 8 data bits, stop bit
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def bucket_index(us: int) -> int:
+    """Get the histogram bucket of a value
+
+    :param us: Value in microseconds
+    :returns: Bucket index
+
+    >>> [bucket_index(us) for us in (0, 31, 32, 33, 34, 64, 1000)]
+    [0, 31, 32, 32, 33, 48, 111]
+    """
+
+    if us < SUB_BUCKETS:
+        return max(us, 0)
+    shift = us.bit_length() - SUB_BUCKET_BITS
+    return SUB_BUCKETS + (shift - 1) * HALF_SUB_BUCKETS + (us >> shift) - HALF_SUB_BUCKETS
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def bucket_value(index: int) -> int:
+    """Get the lowest value of a histogram bucket
+
+    :param index: Bucket index
+    :returns: Lowest value in the bucket, in microseconds
+
+    >>> [bucket_value(i) for i in (0, 31, 32, 33, 48, 111)]
+    [0, 31, 32, 34, 64, 992]
+    """
+
+    if index < SUB_BUCKETS:
+        return index
+    shift, sub = divmod(index - SUB_BUCKETS, HALF_SUB_BUCKETS)
+    return (sub + HALF_SUB_BUCKETS) << (shift + 1)
+
+
+NR_OF_BUCKETS: int = bucket_index(MAX_MICROSECONDS) + 1
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class LatencyHistogram:
+    """Latency histogram with a bounded relative error and fixed memory."""
+
+    def __init__(self) -> None:
+        """Initialize an empty histogram"""
+
+        self.counts = np.zeros(NR_OF_BUCKETS, dtype=np.int64)
+        self.count: int = 0
+        self.total_ns: int = 0
+        self.min_ns: int = 0
+        self.max_ns: int = 0
+
+    def record(self, ns: int) -> None:
+        """Add a latency
+
+        :param ns: Latency in nanoseconds
+        """
+
+        self.counts[min(bucket_index(ns // 1000), NR_OF_BUCKETS - 1)] += 1
+        self.min_ns = ns if not self.count else min(self.min_ns, ns)
+        self.max_ns = max(self.max_ns, ns)
+        self.count += 1
+        self.total_ns += ns
+
+    def percentile(self, q: float) -> float:
+        """Get a percentile
+
+        :param q: Percentile (0..100)
+        :returns: Latency in milliseconds (lower bound of the bucket), 0.0 if empty
+
+        >>> h = LatencyHistogram()
+        >>> for ms in range(1, 101):
+        ...     h.record(ms * 1_000_000)
+        >>> h.percentile(50), h.percentile(99)
+        (49.152, 98.304)
+        """
+
+        if not self.count:
+            return 0.0
+        rank = max(int(np.ceil(q / 100.0 * self.count)), 1)
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return bucket_value(index) / 1000.0
+
+    def to_dict(self) -> dict[str, Any]:
+        """Summary of the histogram, with the non-empty buckets
+
+        :returns: dict, times in milliseconds
+        """
+
+        nonzero = np.flatnonzero(self.counts)
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ns / self.count / 1e6 if self.count else 0.0,
+            "min_ms": self.min_ns / 1e6,
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "max_ms": self.max_ns / 1e6,
+            "buckets_us": {str(bucket_value(int(i))): int(self.counts[i]) for i in nonzero},
+        }
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class CatStats:
+    """Counters and latency histograms of one CAT session."""
+
+    def __init__(self) -> None:
+        """Initialize all counters to zero"""
+
+        self.reset()
+
+    def reset(self) -> None:
+        """Start counting again"""
+
+        self.start_ns = time.perf_counter_ns()
+        self.latency: dict[str, LatencyHistogram] = {}
+        self.timeouts: dict[str, int] = {}
+        self.exchanges: int = 0
+        self.partial_frames: int = 0
+        self.bytes_in: int = 0
+        self.bytes_out: int = 0
+
+    def record_reply(self, prefix: str, ns: int) -> None:
+        """Record the latency of a reply
+
+        :param prefix: Two letter command
+        :param ns: Time between the write and the reception in nanoseconds
+        """
+
+        histogram = self.latency.get(prefix)
+        if histogram is None:
+            histogram = self.latency[prefix] = LatencyHistogram()
+        histogram.record(ns)
+
+    def record_timeout(self, prefix: str) -> None:
+        """Count a command which got no reply
+
+        :param prefix: Two letter command
+        """
+
+        self.timeouts[prefix] = self.timeouts.get(prefix, 0) + 1
+
+    def utilisation(self, baudrate: int) -> tuple[float, float]:
+        """Fraction of the time the link was busy
+
+        :param baudrate: Baud rate of the CAT port
+        :returns: tuple of the utilisation out (to the transceiver) and in (0.0..1.0)
+        """
+
+        elapsed = (time.perf_counter_ns() - self.start_ns) / 1e9
+        capacity = baudrate / BITS_PER_BYTE * elapsed
+        if capacity <= 0:
+            return 0.0, 0.0
+        return self.bytes_out / capacity, self.bytes_in / capacity
+
+    def to_dict(self, baudrate: int = 38400) -> dict[str, Any]:
+        """All statistics in a JSON compatible dict
+
+        :param baudrate: Baud rate of the CAT port
+        :returns: dict
+        """
+
+        out, received = self.utilisation(baudrate)
+        return {
+            "seconds": (time.perf_counter_ns() - self.start_ns) / 1e9,
+            "baudrate": baudrate,
+            "exchanges": self.exchanges,
+            "bytes_out": self.bytes_out,
+            "bytes_in": self.bytes_in,
+            "utilisation_out": out,
+            "utilisation_in": received,
+            "partial_frames": self.partial_frames,
+            "timeouts": dict(self.timeouts),
+            "latency": {p: h.to_dict() for p, h in sorted(self.latency.items())},
+        }
+
+    def dump(self, filename: str | Path, baudrate: int = 38400) -> None:
+        """Write the statistics to a JSON file
+
+        :param filename: The file to write
+        :param baudrate: Baud rate of the CAT port
+        """
+
+        Path(filename).write_text(json.dumps(self.to_dict(baudrate), indent=2), "utf-8")
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def print_stats(stats: dict[str, Any]) -> None:
+    """Print statistics (see CatStats.to_dict) as a table
+
+    :param stats: The statistics
+    """
+
+    print(
+        f"{stats['exchanges']} exchanges in {stats['seconds']:.1f} s, "
+        f"{stats['bytes_out']} bytes out, {stats['bytes_in']} bytes in"
+    )
+    print(
+        f"Link utilisation at {stats['baudrate']} baud: "
+        f"out {stats['utilisation_out']:.1%}, in {stats['utilisation_in']:.1%}"
+    )
+    print(f"Partial frames: {stats['partial_frames']}")
+    print()
+    print("cmd     count  timeouts   mean ms    p50 ms    p90 ms    p99 ms    max ms")
+    prefixes = sorted(set(stats["latency"]) | set(stats["timeouts"]))
+    for prefix in prefixes:
+        h = stats["latency"].get(prefix, {})
+        print(
+            f"{prefix:4} {h.get('count', 0):8} {stats['timeouts'].get(prefix, 0):9}"
+            + "".join(
+                f"{h.get(key, 0.0):10.2f}"
+                for key in ("mean_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms")
+            )
+        )
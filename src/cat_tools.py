@@ -0,0 +1,61 @@
+"""CAT link tools, the 'cat' group of commands.
+
+CLI::
+
+    python __main__.py cat stats --seconds 10   # Measure with S-meter sampling
+    python __main__.py cat stats --dump stats.json --json
+"""
+
+# Global imports
+import json
+import time
+from pathlib import Path
+
+# 3rd party imports
+import click
+
+# Local imports
+import cat
+import cat_stats
+import param
+import sampler
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+@click.group(name="cat")
+def cat_group() -> None:
+    """CAT link tools"""
+
+
+@cat_group.command()
+@click.option("--port", default="", help="CAT port, found automatically if not given")
+@click.option("--seconds", default=10.0, help="Measure S-meter sampling for this long")
+@click.option("--meters", default="", help="RM meters to sample as well, like '67'")
+@click.option("--dump", "dump_file", default="", help="Show this saved dump instead")
+@click.option("--save", default="", help="Save the statistics to this JSON file")
+@click.option("--json", "as_json", is_flag=True, help="Print JSON instead of a table")
+def stats(port, seconds, meters, dump_file, save, as_json) -> None:  # type: ignore
+    """Show CAT latency histograms and link utilisation"""
+
+    if dump_file:
+        result = json.loads(Path(dump_file).read_text("utf-8"))
+    else:
+        if port:
+            param.port = cat.open_cat_port(port)
+        session = cat.get_session()
+        session.stats.reset()
+        acquisition = sampler.Sampler(session, meters=meters)
+        acquisition.start()
+        time.sleep(seconds)
+        acquisition.stop()
+        baudrate = getattr(session.port, "baudrate", 38400)
+        result = session.stats.to_dict(baudrate)
+        if save:
+            session.stats.dump(save, baudrate)
+
+    if as_json:
+        print(json.dumps(result, indent=2))
+    else:
+        cat_stats.print_stats(result)
@@ -0,0 +1,26 @@
+"""Find the folder with the configuration files (config.ini, Beacons.lst)."""
+
+# Global imports
+from pathlib import Path
+
+
+# ------------------------------------------------------------------------
+#
+# ------------------------------------------------------------------------
+def find_config_folder(foldername: str = "config") -> Path | None:
+    """Find the folder named 'config', searching up and down the current folder"""
+
+    current_dir = Path.cwd()
+
+    # Search upwards (parent directories)
+    for parent in current_dir.parents:
+        config_path = parent / foldername
+        if config_path.is_dir():
+            return config_path
+
+    # Search downwards (subdirectories)
+    for child in current_dir.glob(f"**/{foldername}"):
+        if child.is_dir():
+            return child
+
+    return None  # Return None if the 'config' folder is not found
@@ -1,84 +1,280 @@
-"""Based on current time, calculate which beacon cycle we are in."""
+"""Based on current time, calculate which beacon cycle we are in.
+
+The NCDXF schedule is fixed: every 10 seconds each beacon steps one band up,
+so on a given band all 18 beacons are heard once per 3 minute cycle.
+The slot/band/beacon relation is precomputed once in small lookup tables,
+so every question about the schedule is answered with one index computation.
+"""
 
 # pylint: disable=unnecessary-ellipsis,logging-fstring-interpolation,
 
-import logging
 import math
 
 # global imports
-import time
 from typing import Any
 
 # 3rd party imports
+import numpy as np
 from rich.console import Console
 
 # local imports
 import beacons
+import cycle_clock
 import frequency
 import param
 
 console = Console()
 
+# The schedule is defined in cycle_clock, which cannot import this module
+SLOT_SECONDS: int = cycle_clock.SLOT_SECONDS
+NR_OF_SLOTS: int = cycle_clock.NR_OF_SLOTS
+CYCLE_SECONDS: int = cycle_clock.CYCLE_SECONDS
+
+# The beacon bands in transmission order (lowest to highest)
+BANDS: tuple[int, ...] = tuple(sorted(param.beacon_frequency))
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def build_beacon_table() -> tuple[tuple[int, ...], ...]:
+    """Build the table with the beacon number per slot and band.
+
+    :returns: beacon_table[slot][band_index] is the transmitting beacon number
+
+    >>> table = build_beacon_table()
+    >>> table[0]
+    (0, 17, 16, 15, 14)
+    >>> table[5]
+    (5, 4, 3, 2, 1)
+    """
+
+    return tuple(
+        tuple((slot - band_index) % NR_OF_SLOTS for band_index in range(len(BANDS)))
+        for slot in range(NR_OF_SLOTS)
+    )
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def build_band_table() -> tuple[tuple[int, ...], ...]:
+    """Build the table with the band index per slot and beacon.
+
+    :returns: band_table[slot][beacon] is the band index, or -1 if that beacon is silent
+
+    >>> table = build_band_table()
+    >>> table[5][3]     # In slot 5, beacon 3 transmits on the third band (21 MHz)
+    2
+    >>> table[5][6]     # In slot 5, beacon 6 is silent
+    -1
+    """
+
+    table = [[-1] * NR_OF_SLOTS for _slot in range(NR_OF_SLOTS)]
+    for slot, row in enumerate(BEACON_TABLE):
+        for band_index, beacon_nr in enumerate(row):
+            table[slot][beacon_nr] = band_index
+    return tuple(tuple(row) for row in table)
+
+
+BEACON_TABLE = build_beacon_table()
+BAND_TABLE = build_band_table()
+
+# The same tables as arrays, for the vectorised lookups
+BEACON_ARRAY = np.array(BEACON_TABLE, dtype=np.int8)
+BAND_ARRAY = np.array(BAND_TABLE, dtype=np.int8)
+
 
 # -----------------------------------------------------------------------------
 #
 # -----------------------------------------------------------------------------
-def current_cycle() -> tuple[int, int]:
+def current_cycle() -> tuple[int, float]:
     """Calculate the current cycle and seconds in that cycle.
 
-    :returns: tuple of cycle number and seconds in that cycle
+    :returns: tuple of cycle number and (fractional) seconds in that cycle
 
     Note: A cycle lasts 180 seconds
     """
 
-    curtime = time.gmtime()
-    seconds_since_midnight = (
-        curtime.tm_hour * 3600 + curtime.tm_min * 60 + curtime.tm_sec
+    return cycle_clock.get_clock().current_cycle()
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def band_index(freq: Any) -> int:
+    """Get the index of the given band in BANDS
+
+    :param freq: Frequency or band, like 14, 20, "21.150" or "10m"
+    :returns: Index in BANDS, -1 in case of an error
+
+    >>> band_index(14)
+    0
+    >>> band_index("10m")
+    4
+    """
+
+    f = frequency.freq_or_meter_to_freq(freq)
+    if f not in BANDS:
+        return -1
+    return BANDS.index(f)
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def slot_at(t: float | None = None) -> int:
+    """Get the slot in the cycle for the given time.
+
+    :param t: UTC time in seconds since the epoch. Now (cycle_clock) if not given.
+    :returns: Slot number 0..17
+
+    >>> slot_at(0)
+    0
+    >>> slot_at(185.5)
+    0
+    >>> slot_at(179.9)
+    17
+    """
+
+    if t is None:
+        t = cycle_clock.get_clock().now()
+    return int(t // SLOT_SECONDS) % NR_OF_SLOTS
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def beacon_on_band(freq: Any, t: float | None = None) -> int:
+    """Get the number of the beacon transmitting on the given band.
+
+    :param freq: Frequency or band, like 14, 20, "21.150" or "10m"
+    :param t: UTC time in seconds since the epoch. Now if not given.
+    :returns: Beacon number 0..17, -1 in case of an invalid band
+
+    >>> beacon_on_band(14, 50)
+    5
+    >>> beacon_on_band(28, 50)
+    1
+    """
+
+    index = band_index(freq)
+    if index < 0:
+        return -1
+    return BEACON_TABLE[slot_at(t)][index]
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def band_of_beacon(beacon_nr: int, t: float | None = None) -> int:
+    """Get the band on which the given beacon is transmitting.
+
+    :param beacon_nr: Beacon number 0..17
+    :param t: UTC time in seconds since the epoch. Now if not given.
+    :returns: Band in MHz (14, 18, 21, 24 or 28), 0 if the beacon is silent
+
+    >>> band_of_beacon(3, 50)
+    21
+    >>> band_of_beacon(6, 50)
+    0
+    """
+
+    index = BAND_TABLE[slot_at(t)][beacon_nr]
+    if index < 0:
+        return 0
+    return BANDS[index]
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def slots_at(timestamps: Any) -> np.ndarray:
+    """Vectorised version of slot_at().
+
+    :param timestamps: Array-like of UTC times in seconds since the epoch
+    :returns: Array with the slot number (0..17) of each timestamp
+
+    >>> slots_at([0, 10, 185.5, 179.9]).tolist()
+    [0, 1, 0, 17]
+    """
+
+    t = np.asarray(timestamps, dtype=np.float64)
+    return (np.floor_divide(t, SLOT_SECONDS).astype(np.int64) % NR_OF_SLOTS).astype(
+        np.int8
     )
-    cycle = math.floor(seconds_since_midnight / 180)
-    seconds_in_cycle = seconds_since_midnight - (180 * cycle)
 
-    return cycle, seconds_in_cycle
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def beacons_on_band_at(timestamps: Any, freq: Any) -> np.ndarray:
+    """Vectorised version of beacon_on_band().
+
+    :param timestamps: Array-like of UTC times in seconds since the epoch
+    :param freq: Frequency or band, like 14, 20, "21.150" or "10m"
+    :returns: Array with the beacon number per timestamp, -1 for an invalid band
+
+    >>> beacons_on_band_at([0, 10, 20], 18).tolist()
+    [17, 0, 1]
+    """
+
+    slots = slots_at(timestamps)
+    index = band_index(freq)
+    if index < 0:
+        return np.full(slots.shape, -1, dtype=np.int8)
+    return BEACON_ARRAY[slots, index]
 
 
 # -----------------------------------------------------------------------------
 #
 # -----------------------------------------------------------------------------
-def print_beacon_on_freq(freq: [int | str]) -> None:  # type: ignore
-    """Determine the current transmitting beacon on the given frequency
+def bands_of_beacon_at(timestamps: Any, beacon_nr: int) -> np.ndarray:
+    """Vectorised version of band_of_beacon().
 
-    :param freq: Frequency band in MHz like 14, 18, 21, 24, 28
+    :param timestamps: Array-like of UTC times in seconds since the epoch
+    :param beacon_nr: Beacon number 0..17
+    :returns: Array with the band index (into BANDS) per timestamp, -1 if silent
+
+    >>> bands_of_beacon_at([20, 30, 60, 70], 2).tolist()
+    [0, 1, 4, -1]
     """
 
-    cycle, seconds = current_cycle()
-    slot = math.floor(seconds / 10)
-    logging.debug(f"{cycle=} {seconds=} {slot=}\n")
+    return BAND_ARRAY[slots_at(timestamps), beacon_nr]
 
-    if not beacons.dict_of_beacons:
-        beacons.dict_of_beacons = beacons.get_dict_of_beacons()
 
-    # Show current list of transmitting beacons.
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def get_beacon_on_band(freq: Any, t: float | None = None) -> beacons.Beacon | None:
+    """Get the Beacon transmitting on the given band.
 
-    if int(freq) == 14:
-        n = slot
-    elif int(freq) == 18:
-        n = slot - 1
-    elif int(freq) == 21:
-        n = slot - 2
-    elif int(freq) == 24:
-        n = slot - 3
-    elif int(freq) == 28:
-        n = slot - 4
-    else:
-        print(f"Invalid frequency {freq}")
-        return
+    :param freq: Frequency or band, like 14, 20, "21.150" or "10m"
+    :param t: UTC time in seconds since the epoch. Now if not given.
+    :returns: The Beacon, None in case of an invalid band or no known beacons
+    """
 
-    # Compensate for the wrap-around through the list.
-    # It is an ugly solution, but it works.
+    n = beacon_on_band(freq, t)
     if n < 0:
-        n += 18
+        return None
+    return beacons.load_beacons().get(n)
 
-    print(f"{freq} MHz: {beacons.dict_of_beacons[n]}")
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def print_beacon_on_freq(freq: [int | str]) -> None:  # type: ignore
+    """Determine the current transmitting beacon on the given frequency
+
+    :param freq: Frequency band in MHz like 14, 18, 21, 24, 28
+    """
+
+    beacon = get_beacon_on_band(freq)
+    if beacon is None:
+        print(f"Invalid frequency {freq}")
+        return
+
+    print(f"{freq} MHz: {beacon}")
 
 
 # -----------------------------------------------------------------------------
@@ -91,34 +287,11 @@ def get_current_slot_on_frequency(freq: Any) -> int:
     :returns: Current slot, 0 in case of an error
     """
 
-    freq = frequency.freq_or_meter_to_freq(freq)
-
-    cycle, seconds = current_cycle()
-    slot = math.floor(seconds / 10)
-    logging.debug(f"{cycle=} {seconds=} {slot=}\n")
-
-    # Determine current beacon on the given frequency
-
-    if int(freq) == 14:  # 20 meter band
-        n = slot
-    elif int(freq) == 18:  # 17 meter band
-        n = slot - 1
-    elif int(freq) == 21:  # 15 meter band
-        n = slot - 2
-    elif int(freq) == 24:  # 12 meter band
-        n = slot - 3
-    elif int(freq) == 28:  # 10 meter band
-        n = slot - 4
-    else:
+    n = beacon_on_band(freq)
+    if n < 0:
         print(f"Invalid frequency {freq}")
         return 0
 
-    # Compensate for the wrap-around through the list.
-    # It is an ugly solution, but it works.
-    if n < 0:
-        n += 18
-
-    # return f"{freq} MHz: {bcns[n]}"
     return n
 
 
@@ -129,39 +302,14 @@ def show_transmitting_beacons() -> None:
     """Show a list of currently transmitting beacons."""
 
     cycle, seconds = current_cycle()
-    slot = math.floor(seconds / 10)
-    print(f"{cycle=} {seconds=} {slot=}\n")
+    slot = math.floor(seconds / SLOT_SECONDS)
+    print(f"{cycle=} {seconds=:.3f} {slot=}\n")
 
-    bcns = beacons.get_dict_of_beacons()
+    bcns = beacons.load_beacons()
 
     # Show current list of transmitting beacons.
-    # Compensate for the wrap-around through the list.
-    # It is an ugly solution, but it works.
-
-    n = slot
-    if n < 0:
-        n += 18
-    console.print(f"14.100 MHz: {bcns[n]}")
-
-    n = slot - 1
-    if n < 0:
-        n += 18
-    console.print(f"18.110 MHz: {bcns[n]}")
-
-    n = slot - 2
-    if n < 0:
-        n += 18
-    console.print(f"21.150 MHz: {bcns[n]}")
-
-    n = slot - 3
-    if n < 0:
-        n += 18
-    console.print(f"24.930 MHz: {bcns[n]}")
-
-    n = slot - 4
-    if n < 0:
-        n += 18
-    console.print(f"28.200 MHz: {bcns[n]}")
+    for band, beacon_nr in zip(BANDS, BEACON_TABLE[slot]):
+        console.print(f"{param.beacon_frequency[band]:.3f} MHz: {bcns.get(beacon_nr)}")
 
 
 # ----------------------------------------------------------------------------
@@ -0,0 +1,257 @@
+"""Sub-second, offset corrected clock for the beacon cycle calculations.
+
+The NCDXF slots are 10 seconds long and the power step dashes inside a slot
+last about one second, so whole seconds from time.gmtime() are not good enough.
+
+The CycleClock is anchored on the host UTC clock (time.time_ns()) and advances
+with the high resolution performance counter (time.perf_counter_ns()) between
+anchors. A known offset of the host clock (manual calibration, configuration
+or the chrony tracking log) is added to every reading.
+
+All consumers use the module level clock, which can be replaced with set_clock().
+"""
+
+# pylint: disable=logging-fstring-interpolation
+
+# Global imports
+import logging
+import time
+from configparser import ConfigParser
+from pathlib import Path
+from typing import Any, Callable
+
+# Local imports
+import config_folder
+
+NS_PER_SECOND: int = 1_000_000_000
+SLOT_SECONDS: int = 10  # Length of one beacon transmission
+NR_OF_SLOTS: int = 18  # Number of beacons (and slots) in one cycle
+CYCLE_SECONDS: int = SLOT_SECONDS * NR_OF_SLOTS  # A cycle lasts 180 seconds
+SECONDS_PER_DAY: int = 86400
+
+DEFAULT_CHRONY_TRACKING_LOG = "/var/log/chrony/tracking.log"
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def read_chrony_offset(filename: str | Path = DEFAULT_CHRONY_TRACKING_LOG) -> float:
+    """Read the latest offset of the local clock from a chrony tracking log
+
+    :param filename: The chrony tracking.log file
+    :returns: Correction in seconds to add to the local clock, 0.0 if unknown
+
+    The 7th column of the tracking log is the estimated offset of the local
+    clock. A positive value means the local clock is fast, so the correction
+    is the negated offset.
+    """
+
+    try:
+        lines = Path(filename).read_text(encoding="utf-8").splitlines()
+    except OSError as e:
+        logging.debug(f"Could not read {filename}: {e}")
+        return 0.0
+
+    for line in reversed(lines):
+        fields = line.split()
+        if len(fields) < 7 or not fields[0][:1].isdigit():
+            continue  # Header, separator or empty line
+        try:
+            return -float(fields[6])
+        except ValueError:
+            continue
+
+    return 0.0
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class CycleClock:
+    """High resolution UTC clock with a correctable offset."""
+
+    def __init__(
+        self,
+        offset: float = 0.0,
+        resync_interval: float = 60.0,
+        ticks_ns: Callable[[], int] = time.perf_counter_ns,
+    ) -> None:
+        """Initialize the clock
+
+        :param offset: Correction in seconds, added to the host clock
+        :param resync_interval: Re-anchor on the host clock after this many seconds
+        :param ticks_ns: Monotonic nanosecond counter used between anchors
+        """
+
+        self.offset_ns: int = round(offset * NS_PER_SECOND)
+        self.resync_interval_ns: int = round(resync_interval * NS_PER_SECOND)
+        self.ticks_ns = ticks_ns
+        self.drift_ppb: int = 0  # Rate error of the tick counter vs. UTC
+        self.anchor_utc_ns: int = 0
+        self.anchor_ticks_ns: int = 0
+        self.resync()
+
+    @property
+    def offset(self) -> float:
+        """Current offset in seconds"""
+
+        return self.offset_ns / NS_PER_SECOND
+
+    def set_offset(self, offset: float) -> None:
+        """Set the correction of the host clock
+
+        :param offset: Correction in seconds, added to the host clock
+        """
+
+        logging.debug(f"Clock offset set to {offset:+.6f} s")
+        self.offset_ns = round(offset * NS_PER_SECOND)
+
+    def calibrate(self, reference_utc: float) -> None:
+        """Calibrate the offset against a known reference time (now)
+
+        :param reference_utc: The true UTC time, in seconds since the epoch
+        """
+
+        self.set_offset(reference_utc - (self.now() - self.offset))
+
+    def resync(self) -> None:
+        """Anchor the tick counter on the host UTC clock again.
+
+        The difference between the elapsed UTC time and the elapsed ticks since
+        the previous anchor is used to estimate the drift of the tick counter.
+        """
+
+        utc_ns = time.time_ns()
+        ticks = self.ticks_ns()
+        if self.anchor_ticks_ns:
+            elapsed_ticks = ticks - self.anchor_ticks_ns
+            elapsed_utc = utc_ns - self.anchor_utc_ns
+            error = elapsed_utc - elapsed_ticks
+            # Ignore steps of the host clock, only follow a plausible drift
+            if elapsed_ticks > 0 and abs(error) < elapsed_ticks // 1000:
+                self.drift_ppb = error * NS_PER_SECOND // elapsed_ticks
+        self.anchor_utc_ns = utc_ns
+        self.anchor_ticks_ns = ticks
+
+    def ticks_to_utc_ns(self, ticks: Any) -> Any:
+        """Convert tick counter values to corrected UTC nanoseconds
+
+        :param ticks: Tick counter value(s) (int or numpy array)
+        :returns: UTC time(s) in nanoseconds since the epoch
+        """
+
+        elapsed = ticks - self.anchor_ticks_ns
+        correction = elapsed * self.drift_ppb // NS_PER_SECOND
+        return self.anchor_utc_ns + elapsed + correction + self.offset_ns
+
+    def now_ns(self) -> int:
+        """Get the corrected UTC time
+
+        :returns: Nanoseconds since the epoch
+        """
+
+        ticks = self.ticks_ns()
+        if ticks - self.anchor_ticks_ns > self.resync_interval_ns:
+            self.resync()
+            ticks = self.ticks_ns()
+        return int(self.ticks_to_utc_ns(ticks))
+
+    def now(self) -> float:
+        """Get the corrected UTC time
+
+        :returns: Seconds since the epoch, with sub-second resolution
+        """
+
+        return self.now_ns() / NS_PER_SECOND
+
+    def current_cycle(self, t: float | None = None) -> tuple[int, float]:
+        """Calculate the cycle and the fractional seconds in that cycle
+
+        :param t: UTC time in seconds since the epoch. Now if not given.
+        :returns: tuple of cycle number since midnight and seconds in that cycle
+
+        >>> CycleClock().current_cycle(1000.25)
+        (5, 100.25)
+        """
+
+        if t is None:
+            t = self.now()
+        seconds_since_midnight = t % SECONDS_PER_DAY
+        cycle = int(seconds_since_midnight // CYCLE_SECONDS)
+        return cycle, seconds_since_midnight - cycle * CYCLE_SECONDS
+
+    def seconds_in_cycle(self, t: float | None = None) -> float:
+        """Get the fractional number of seconds in the current cycle
+
+        :param t: UTC time in seconds since the epoch. Now if not given.
+        :returns: Seconds in the cycle (0.0 <= seconds < 180.0)
+        """
+
+        return self.current_cycle(t)[1]
+
+
+clock = CycleClock()
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def get_clock() -> CycleClock:
+    """Get the clock shared by all modules
+
+    :returns: The CycleClock instance
+    """
+
+    return clock
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def set_clock(new_clock: CycleClock) -> None:
+    """Replace the clock shared by all modules (for example in tests or replays)
+
+    :param new_clock: The CycleClock to use from now on
+    """
+
+    global clock  # pylint: disable=global-statement
+    clock = new_clock
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def load_clock_config(configfile: Path | None = None) -> CycleClock:
+    """Configure the shared clock from the [CLOCK] section of config.ini
+
+    :param configfile: The config file. Searched for if not given.
+    :returns: The configured shared clock
+
+    The section may contain::
+
+        [CLOCK]
+        # Manual correction in seconds, added to the host clock
+        offset = 0.0
+        # Chrony tracking log to read the measured offset from (optional)
+        chrony_tracking = /var/log/chrony/tracking.log
+
+    """
+
+    if configfile is None:
+        folder = config_folder.find_config_folder()
+        if folder is None:
+            return clock
+        configfile = folder / "config.ini"
+
+    config = ConfigParser()
+    config.read(configfile)
+    if not config.has_section("CLOCK"):
+        return clock
+
+    offset = config.getfloat("CLOCK", "offset", fallback=0.0)
+    tracking_log = config.get("CLOCK", "chrony_tracking", fallback="")
+    if tracking_log:
+        offset += read_chrony_offset(tracking_log)
+
+    clock.set_offset(offset)
+    return clock
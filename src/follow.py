@@ -0,0 +1,162 @@
+"""Follow one beacon: hop bands in lockstep with its transmissions.
+
+A beacon moves 14.100 -> 18.110 -> 21.150 -> 24.930 -> 28.200 MHz, one band per
+10 second slot. The MonitorEngine retunes VFO A (transceiver.set_vfo) ahead of
+each boundary, with a lead time which follows the measured CAT latency, so the
+radio is on the band before the callsign starts.
+
+A Sampler thread reads the S-meter, and after every slot the samples are
+analysed with power_steps. When the 50 second sweep is complete, the signal of
+the beacon on all five bands is logged on one line.
+"""
+
+# pylint: disable=logging-fstring-interpolation
+
+# Global imports
+import asyncio
+import logging
+import sys
+import time
+
+# 3rd party imports
+import click
+import numpy as np
+
+# Local imports
+import appearances
+import cat
+import cycle_calculator
+import cycle_clock
+import monitor_engine
+import power_steps
+import sampler
+import slot_scheduler
+import transceiver
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class Follower:
+    """Collect the signal of one beacon on each band of its sweep."""
+
+    def __init__(
+        self,
+        beacon_nr: int,
+        ring: sampler.SampleRing | None = None,
+        margin: float = power_steps.MARGIN,
+    ) -> None:
+        """Initialize the follower
+
+        :param beacon_nr: Beacon number 0..17
+        :param ring: Ring buffer the S-meter samples are written to
+        :param margin: Raw units above the noise floor for a step to count as heard
+        """
+
+        self.beacon_nr = beacon_nr
+        self.ring = ring if ring is not None else sampler.SampleRing()
+        self.margin = margin
+        self.table = power_steps.segment_table()
+        self.seen: int = 0  # Sequence number of the last sample analysed
+
+        # Result of the current sweep per band index: (weakest step, 100 W level)
+        self.sweep: list[tuple[str, float] | None] = [None] * len(cycle_calculator.BANDS)
+        self.sweeps: int = 0
+
+    def on_slot(self, event: slot_scheduler.SlotEvent) -> None:
+        """Slot handler: analyse the slot which just ended, if the beacon was on the air
+
+        :param event: The slot event of the new slot
+        """
+
+        snapshot = self.ring.snapshot(since=self.seen)
+        self.seen = snapshot.end
+
+        start = event.utc - cycle_calculator.SLOT_SECONDS
+        band = cycle_calculator.band_of_beacon(self.beacon_nr, start)
+        if not band:
+            return
+        band_index = cycle_calculator.band_index(band)
+
+        is_s_meter = snapshot.meter_type == sampler.S_METER
+        t_ns = cycle_clock.get_clock().ticks_to_utc_ns(snapshot.ticks[is_s_meter])
+        result = power_steps.analyse_slot(
+            start, t_ns, snapshot.raw[is_s_meter], band_index, self.table, self.margin
+        )
+        if result is None:
+            logging.warning(f"No S-meter samples on {band} MHz")
+            self.sweep[band_index] = ("", np.nan)
+        else:
+            _beacon_nr, steps = result
+            level = float(steps.level[self.beacon_nr, band_index, 1])  # 100 W dash
+            self.sweep[band_index] = (steps.weakest_step(self.beacon_nr, band_index), level)
+
+        if band_index == len(cycle_calculator.BANDS) - 1:
+            self.log_sweep(start)
+
+    def log_sweep(self, end: float) -> None:
+        """Log the signal of the beacon on all bands of the sweep, and start a new one
+
+        :param end: UTC start of the last slot of the sweep
+        """
+
+        utc = time.strftime("%H:%M:%S", time.gmtime(end))
+        parts = []
+        for band, result in zip(cycle_calculator.BANDS, self.sweep):
+            if result is None:
+                parts.append(f"{band}: -")
+            else:
+                step, level = result
+                parts.append(f"{band}: {step or 'not heard'} ({level:.0f})")
+        logging.info(f"{utc} UTC beacon {self.beacon_nr}: " + ", ".join(parts))
+
+        self.sweep = [None] * len(cycle_calculator.BANDS)
+        self.sweeps += 1
+
+    async def run(self, sweeps: int = 0) -> None:
+        """Follow the beacon, with a sampler thread on the shared CAT session
+
+        :param sweeps: Number of 50 second sweeps. 0 means forever.
+        """
+
+        # One cycle per sweep, plus the slot in which the engine starts
+        slots = sweeps * cycle_calculator.NR_OF_SLOTS + 1 if sweeps else 0
+        engine = monitor_engine.MonitorEngine(monitor_engine.plan_follow(self.beacon_nr))
+        engine.register(self.on_slot)
+        s_meter = sampler.Sampler(cat.get_session(), self.ring)
+
+        saved = transceiver.save_state()
+        transceiver.set_mode("CW-U")
+        s_meter.start()
+        try:
+            await engine.run(slots)
+        finally:
+            s_meter.stop()
+            transceiver.restore_state(saved)
+            logging.info(
+                f"Lead time {engine.lead_time * 1000:.0f} ms, "
+                f"{engine.late_tunes} of {engine.tunes} tunes late"
+            )
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+@click.command()
+@click.option("--call", "callsign", required=True, help="Callsign of the beacon")
+@click.option("--sweeps", default=0, help="Number of 50 second sweeps, 0 = forever")
+def follow(callsign: str, sweeps: int) -> None:
+    """Follow a beacon over the bands and log its signal"""
+
+    try:
+        beacon_nr = appearances.beacon_numbers([callsign])[0]
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    cycle_clock.load_clock_config()
+    print(f"Following {callsign.upper()} (beacon {beacon_nr}). Press Ctrl+C to stop.")
+    try:
+        asyncio.run(Follower(beacon_nr).run(sweeps))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,352 @@
+"""Yaesu FTdx10 CAT emulator on a Linux pseudo-terminal.
+
+The emulator opens a pty and answers the FA/FB/MD/IF/SM/RM/CF/AI/ID commands
+with the reply formats of the real transceiver. The serial link is simulated
+with a per-byte delay for the configured baud rate, plus a configurable
+processing latency per command.
+
+The S-meter follows the real NCDXF schedule: when VFO A is on a beacon
+frequency, the beacon transmitting on that band is keyed (callsign and the
+four power step dashes), with a fixed pseudo random propagation per beacon
+and band.
+
+Usage::
+
+    python ftdx10_emulator.py                  # Prints the device path to use
+    python ftdx10_emulator.py --benchmark 500  # Measure CAT round trips
+
+and in the code under test::
+
+    param.port = cat.open_cat_port("/dev/pts/5")
+
+"""
+
+# pylint: disable=logging-fstring-interpolation
+
+# Global imports
+import logging
+import os
+import random
+import select
+import sys
+import threading
+import time
+import tty
+
+# 3rd party imports
+import click
+
+# Local imports
+import beacons
+import cat
+import cycle_calculator
+import cycle_clock
+import param
+import transmission
+
+BEACON_TOLERANCE_HZ: int = 500  # Maximum distance to a beacon frequency
+NOISE_LEVEL: int = 20  # Raw S-meter value of the band noise
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class FTdx10Emulator:
+    """Emulated FTdx10 behind a pseudo-terminal."""
+
+    def __init__(
+        self,
+        baudrate: int = 38400,
+        latency: float = 0.002,
+        seed: int = 0,
+    ) -> None:
+        """Initialize the emulator
+
+        :param baudrate: Simulated baud rate, used for the per-byte delay
+        :param latency: Processing time per command in seconds
+        :param seed: Seed for the simulated propagation
+        """
+
+        self.baudrate = baudrate
+        self.latency = latency
+
+        # Transceiver state
+        self.vfo_a: int = 14_100_000
+        self.vfo_b: int = 14_100_000
+        self.mode: str = "3"  # CW-U
+        self.clarifier_offset: str = "+0000"
+        self.rx_clarifier: str = "0"
+        self.tx_clarifier: str = "0"
+        self.auto_information: str = "0"
+
+        # Signal strength of each beacon on each band, in dB above the noise (100 W)
+        rng = random.Random(seed)
+        self.propagation = [
+            [rng.choice([0, 0, 10, 20, 30, 40]) for _band in cycle_calculator.BANDS]
+            for _beacon in range(cycle_calculator.NR_OF_SLOTS)
+        ]
+
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)
+        self.device = os.ttyname(self.slave_fd)
+
+        self.commands: int = 0
+        self.running = False
+        self.thread: threading.Thread | None = None
+        self.lock = threading.Lock()
+
+    def start(self) -> str:
+        """Start serving CAT commands in a background thread
+
+        :returns: The device path to open with cat.open_cat_port()
+        """
+
+        self.running = True
+        self.thread = threading.Thread(target=self.serve, name="ftdx10", daemon=True)
+        self.thread.start()
+        logging.info(f"FTdx10 emulator on {self.device}")
+        return self.device
+
+    def stop(self) -> None:
+        """Stop serving and close the pseudo-terminal"""
+
+        self.running = False
+        if self.thread:
+            self.thread.join()
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+    def serve(self) -> None:
+        """Thread: read commands from the pty and answer them"""
+
+        buffer = b""
+        while self.running:
+            ready, _, _ = select.select([self.master_fd], [], [], 0.1)
+            if not ready:
+                continue
+            try:
+                data = os.read(self.master_fd, 1024)
+            except OSError:
+                break
+            self.transfer_delay(len(data))
+            buffer += data
+            while b";" in buffer:
+                cmd, buffer = buffer.split(b";", 1)
+                reply = self.handle(cmd.decode("ascii", errors="replace"))
+                if reply:
+                    self.send(reply)
+
+    def transfer_delay(self, nr_of_bytes: int) -> None:
+        """Wait for the time it takes to transfer bytes over the serial link
+
+        :param nr_of_bytes: Number of bytes (10 bits each: start, 8 data, stop)
+        """
+
+        if self.baudrate:
+            time.sleep(nr_of_bytes * 10 / self.baudrate)
+
+    def send(self, reply: str) -> None:
+        """Send a reply, at the speed of the simulated serial link
+
+        :param reply: The reply frame(s)
+        """
+
+        self.transfer_delay(len(reply))
+        with self.lock:
+            os.write(self.master_fd, reply.encode("ascii"))
+
+    def push(self, frame: str) -> None:
+        """Send an auto information frame, if auto information is on
+
+        :param frame: The frame to send
+        """
+
+        if self.auto_information == "1":
+            self.send(frame)
+
+    def tune(self, hz: int) -> None:
+        """Simulate the operator turning the VFO A knob
+
+        :param hz: New frequency of VFO A
+        """
+
+        self.vfo_a = hz
+        self.push(f"FA{hz:09};")
+
+    def handle(self, cmd: str) -> str:  # pylint: disable=too-many-return-statements
+        """Handle one command
+
+        :param cmd: The command, without the ';'
+        :returns: The reply, an empty string for set commands
+        """
+
+        self.commands += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        prefix, parameters = cmd[:2].upper(), cmd[2:]
+        if not cat.expects_reply(cmd + ";"):
+            return self.set(prefix, parameters)
+
+        if prefix == "FA":
+            return f"FA{self.vfo_a:09};"
+        if prefix == "FB":
+            return f"FB{self.vfo_b:09};"
+        if prefix == "MD":
+            return f"MD{parameters}{self.mode};"
+        if prefix == "IF":
+            return self.information()
+        if prefix == "SM":
+            return f"SM{parameters}{self.s_meter():03};"
+        if prefix == "RM":
+            return f"RM{parameters}{self.meter(parameters):03}000;"
+        if prefix == "CF":
+            if parameters.endswith("1"):
+                return f"CF{parameters}{self.clarifier_offset};"
+            return f"CF{parameters}{self.rx_clarifier}{self.tx_clarifier}000;"
+        if prefix == "AI":
+            return f"AI{self.auto_information};"
+        if prefix == "ID":
+            return "ID0761;"
+        return "?;"
+
+    def set(self, prefix: str, parameters: str) -> str:
+        """Handle a set command
+
+        :param prefix: Two letter command
+        :param parameters: The parameters of the command
+        :returns: An empty string, or '?;' for an invalid command
+        """
+
+        try:
+            if prefix == "FA":
+                self.vfo_a = int(parameters)
+                self.push(f"FA{self.vfo_a:09};")
+            elif prefix == "FB":
+                self.vfo_b = int(parameters)
+            elif prefix == "MD" and parameters[1:] in param.mode_dict:
+                self.mode = parameters[1:]
+                self.push(f"MD0{self.mode};")
+            elif prefix == "CF" and parameters[2] == "0":
+                self.rx_clarifier, self.tx_clarifier = parameters[3], parameters[4]
+            elif prefix == "CF" and parameters[2] == "1":
+                self.clarifier_offset = parameters[3:8]
+            elif prefix == "AI":
+                self.auto_information = parameters
+            else:
+                return "?;"
+        except (ValueError, IndexError):
+            return "?;"
+        return ""
+
+    def information(self) -> str:
+        """Create the reply to the IF command
+
+        :returns: The IF frame
+        """
+
+        return (
+            f"IF001{self.vfo_a:09}{self.clarifier_offset}"
+            f"{self.rx_clarifier}{self.tx_clarifier}{self.mode}00000;"
+        )
+
+    def s_meter(self, t: float | None = None) -> int:
+        """Synthesize the S-meter value following the NCDXF schedule
+
+        :param t: UTC time in seconds since the epoch. Now if not given.
+        :returns: Raw S-meter value 0..255
+        """
+
+        if t is None:
+            t = cycle_clock.get_clock().now()
+        noise = NOISE_LEVEL + random.randint(-3, 3)
+
+        band = 0
+        for b, freq in param.beacon_frequency.items():
+            if abs(self.vfo_a - round(freq * 1_000_000)) <= BEACON_TOLERANCE_HZ:
+                band = b
+        if not band:
+            return noise
+
+        beacon_nr = cycle_calculator.beacon_on_band(band, t)
+        beacon = beacons.load_beacons().get(beacon_nr)
+        callsign = beacon.callsign if beacon else ""
+        step = transmission.carrier(callsign, t % cycle_calculator.SLOT_SECONDS)
+        if step < 0:
+            return noise
+
+        # Every power step is 10 dB lower, 4 raw units per dB
+        snr = self.propagation[beacon_nr][cycle_calculator.band_index(band)] - 10 * step
+        return min(255, noise + 4 * max(snr, 0))
+
+    def meter(self, meter_type: str) -> int:
+        """Synthesize a meter value
+
+        :param meter_type: RM meter type ('1' = S, ..., '8' = VDD)
+        :returns: Raw meter value 0..255
+        """
+
+        values = {"1": self.s_meter(), "6": 0, "7": 15, "8": 190}
+        return values.get(meter_type, 0)
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def benchmark(device: str, count: int = 500) -> None:
+    """Measure the CAT round trip time of S-meter reads
+
+    :param device: Device path of the CAT port
+    :param count: Number of S-meter reads
+    """
+
+    session = cat.CatSession(cat.open_cat_port(device))
+    latencies = []
+    for _n in range(count):
+        start = time.perf_counter()
+        session.execute("SM0;")
+        latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    total = sum(latencies)
+    print(f"{count} S-meter reads in {total:.3f} s: {count / total:.1f} reads/s")
+    print(
+        f"latency min {latencies[0] * 1000:.2f} ms, "
+        f"median {latencies[count // 2] * 1000:.2f} ms, "
+        f"max {latencies[-1] * 1000:.2f} ms"
+    )
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+@click.command()
+@click.option("--baud", default=38400, help="Simulated baud rate (0 = no delay)")
+@click.option("--latency", default=0.002, help="Processing time per command (s)")
+@click.option("--benchmark", "count", default=0, help="Run N S-meter reads and exit")
+def main(baud: int, latency: float, count: int) -> None:
+    """Run the FTdx10 emulator"""
+
+    emulator = FTdx10Emulator(baudrate=baud, latency=latency)
+    device = emulator.start()
+
+    if count:
+        benchmark(device, count)
+        emulator.stop()
+        return
+
+    print(f"FTdx10 emulator running on {device}. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        emulator.stop()
+        sys.exit(0)
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+# pylint: disable=no-value-for-parameter
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""Asyncio monitoring engine which tunes the radio ahead of each slot boundary.
+
+A CAT command takes time to complete, so tuning at the boundary means the first
+part of the next transmission is missed. The engine knows the schedule, asks a
+plan function which frequency is wanted in the next slot, and issues the tune
+command a lead time before the boundary.
+
+The completion latency of each tune command is measured, and the lead time
+follows it in the same way TCP follows the round trip time: a smoothed latency
+plus four times its smoothed deviation, plus a fixed safety margin.
+"""
+
+# pylint: disable=logging-fstring-interpolation
+
+# Global imports
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+# Local imports
+import auto_information
+import cat_async
+import cycle_calculator
+import cycle_clock
+import param
+import slot_scheduler
+import transceiver
+
+# Returns the wanted frequency in MHz for the slot starting at the given UTC time,
+# or None to leave the radio where it is.
+Plan = Callable[[float], float | None]
+Tuner = Callable[[float], Awaitable[None]]
+SlotHandler = Callable[[slot_scheduler.SlotEvent], None]
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def plan_band(band: int) -> Plan:
+    """Create a plan which stays on one beacon band
+
+    :param band: Band in MHz (14, 18, 21, 24 or 28)
+    :returns: Plan function
+    """
+
+    freq = param.beacon_frequency[band]
+    return lambda _t: freq
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def plan_follow(beacon_nr: int) -> Plan:
+    """Create a plan which follows one beacon over the bands
+
+    :param beacon_nr: Beacon number 0..17
+    :returns: Plan function. None for the slots in which the beacon is silent.
+
+    >>> plan = plan_follow(5)
+    >>> plan(50.0), plan(60.0), plan(100.0)
+    (14.1, 18.11, None)
+    """
+
+    def plan(t: float) -> float | None:
+        band = cycle_calculator.band_of_beacon(beacon_nr, t)
+        if not band:
+            return None
+        return param.beacon_frequency[band]
+
+    return plan
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+async def cat_tuner(freq: float) -> None:
+    """Tune VFO A with the blocking CAT functions, in a worker thread
+
+    :param freq: Frequency in MHz
+    """
+
+    await asyncio.to_thread(transceiver.set_vfo, freq)
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def async_cat_tuner(
+    driver: cat_async.AsyncCat, auto: auto_information.AutoInformation | None = None
+) -> Tuner:
+    """Create a tuner which uses the asyncio CAT driver
+
+    :param driver: The started AsyncCat driver
+    :param auto: Started auto information subscriber on the same driver. Its
+        pushed state tells if VFO A is already on the frequency, then nothing is sent.
+    :returns: Tuner coroutine function
+
+    The frequency is read back in the same write, so the tune only completes
+    when the transceiver has processed the set command.
+    """
+
+    async def tuner(freq: float) -> None:
+        cmd = transceiver.vfo_command(freq)
+        if auto and auto.rig_state.valid and cmd[2:11] == f"{auto.rig_state.frequency:09}":
+            return
+        _, reply = await driver.query(cmd, "FA;")
+        if auto and reply.startswith("FA"):
+            auto.rig_state.frequency = int(reply[2:11])
+
+    return tuner
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class MonitorEngine:
+    """Tune the radio ahead of the slot boundaries according to a plan."""
+
+    def __init__(
+        self,
+        plan: Plan,
+        tuner: Tuner = cat_tuner,
+        lead_time: float = 0.25,
+        margin: float = 0.02,
+        max_lead_time: float = 5.0,
+    ) -> None:
+        """Initialize the engine
+
+        :param plan: Function returning the wanted frequency per slot
+        :param tuner: Coroutine function which tunes the radio to a frequency in MHz
+        :param lead_time: Initial lead time in seconds
+        :param margin: Safety margin in seconds added to the measured latency
+        :param max_lead_time: Upper limit of the lead time in seconds
+        """
+
+        self.plan = plan
+        self.tuner = tuner
+        self.lead_time = lead_time
+        self.margin = margin
+        self.max_lead_time = max_lead_time
+        self.handlers: list[SlotHandler] = []
+
+        # Latency statistics, in seconds
+        self.latency: float = 0.0
+        self.smoothed_latency: float = 0.0
+        self.latency_deviation: float = 0.0
+        self.late_tunes: int = 0
+        self.tunes: int = 0
+
+        self.current_freq: float | None = None
+
+    def register(self, handler: SlotHandler) -> None:
+        """Register a handler, called with a SlotEvent at each slot boundary
+
+        :param handler: Function to call
+        """
+
+        self.handlers.append(handler)
+
+    def update_lead_time(self, latency: float) -> None:
+        """Feed a measured tune latency back into the lead time
+
+        :param latency: Measured completion time of a tune, in seconds
+        """
+
+        self.latency = latency
+        if not self.tunes:
+            self.smoothed_latency = latency
+            self.latency_deviation = latency / 2
+        else:
+            error = latency - self.smoothed_latency
+            self.smoothed_latency += error / 8
+            self.latency_deviation += (abs(error) - self.latency_deviation) / 4
+        self.tunes += 1
+
+        lead_time = self.smoothed_latency + 4 * self.latency_deviation + self.margin
+        self.lead_time = min(lead_time, self.max_lead_time)
+
+    async def sleep_until(self, utc: float) -> None:
+        """Sleep until the given corrected UTC time
+
+        :param utc: UTC time in seconds since the epoch
+        """
+
+        delay = utc - cycle_clock.get_clock().now()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def tune(self, freq: float, boundary: float) -> None:
+        """Tune to the frequency and measure how long it took
+
+        :param freq: Frequency in MHz
+        :param boundary: UTC time of the boundary the tune is meant for
+        """
+
+        clock = cycle_clock.get_clock()
+        start = clock.now()
+        await self.tuner(freq)
+        end = clock.now()
+
+        self.update_lead_time(end - start)
+        self.current_freq = freq
+        if end > boundary:
+            self.late_tunes += 1
+            logging.warning(f"Tuned to {freq} MHz {end - boundary:.3f} s late")
+        logging.debug(
+            f"Tuned to {freq} MHz in {(end - start) * 1000:.1f} ms, "
+            f"lead time now {self.lead_time * 1000:.1f} ms"
+        )
+
+    async def run(self, count: int = 0) -> None:
+        """Run the engine
+
+        :param count: Number of slots to handle. 0 means forever.
+        """
+
+        clock = cycle_clock.get_clock()
+        n = 0
+        while not count or n < count:
+            boundary = slot_scheduler.next_boundary(clock.now() + self.lead_time)
+            freq = self.plan(boundary)
+
+            if freq is not None and freq != self.current_freq:
+                await self.sleep_until(boundary - self.lead_time)
+                try:
+                    await self.tune(freq, boundary)
+                except Exception:  # pylint: disable=broad-exception-caught
+                    # A CAT timeout or serial error: try again at the next boundary
+                    logging.exception(f"Tuning to {freq} MHz failed")
+
+            await self.sleep_until(boundary)
+            event = slot_scheduler.slot_event(boundary, clock.now() - boundary)
+            for handler in self.handlers:
+                try:
+                    handler(event)
+                except Exception:  # pylint: disable=broad-exception-caught
+                    logging.exception(f"Slot handler {handler} failed")
+            n += 1
@@ -0,0 +1,231 @@
+"""Monitor several beacon bands at once, with one receiver per band.
+
+Every rig has its own CAT port, CatSession and Sampler thread, and stays on the
+beacon frequency of its band. At each slot boundary the shared SlotScheduler
+collects the new samples of all rigs, tags them with the band of their rig and
+feeds them into one signal_matrix.CycleAccumulator. The per-cycle beacon x band
+matrix therefore fills up to five times faster than with a single radio.
+Optionally all samples are kept in an observation_log, and the cycle matrices
+in a sqlite_store database.
+
+The transceiver functions work on the single param.port, so the rigs are
+tuned here with their own sessions.
+"""
+
+# pylint: disable=logging-fstring-interpolation
+
+# Global imports
+import logging
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass, field
+
+# 3rd party imports
+import click
+import numpy as np
+
+# Local imports
+import beacons
+import cat
+import cycle_calculator
+import cycle_clock
+import observation_log
+import param
+import sampler
+import signal_matrix
+import slot_scheduler
+import sqlite_store
+import transceiver
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+@dataclass
+class Rig:
+    """Dataclass with one receiver and its acquisition."""
+
+    device: str  # CAT port, like '/dev/ttyUSB0' or 'COM6'
+    band: int  # Beacon band in MHz (14, 18, 21, 24 or 28)
+    session: cat.CatSession | None = None
+    ring: sampler.SampleRing = field(default_factory=sampler.SampleRing)
+    acquisition: sampler.Sampler | None = None
+    seen: int = 0  # Sequence number of the last sample collected
+
+    @property
+    def band_index(self) -> int:
+        """Index of the band in cycle_calculator.BANDS"""
+
+        return cycle_calculator.band_index(self.band)
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def parse_assignment(text: str) -> Rig:
+    """Parse a rig assignment
+
+    :param text: CAT port and band, like '/dev/ttyUSB0=14' or 'COM6=10m'
+    :returns: The Rig
+    :raises ValueError: If the text is not a port and a beacon band
+
+    >>> rig = parse_assignment("COM6=10m")
+    >>> rig.device, rig.band
+    ('COM6', 28)
+    """
+
+    device, _, band = text.rpartition("=")
+    index = cycle_calculator.band_index(band)
+    if not device or index < 0:
+        raise ValueError(f"Invalid rig assignment {text}, use PORT=BAND")
+    return Rig(device, cycle_calculator.BANDS[index])
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class MultiRig:
+    """Concurrent acquisition on several rigs, merged into one signal matrix."""
+
+    def __init__(
+        self,
+        rigs: list[Rig],
+        accumulator: signal_matrix.CycleAccumulator | None = None,
+        log: observation_log.ObservationWriter | None = None,
+    ) -> None:
+        """Initialize the rigs
+
+        :param rigs: The rigs, each on another band
+        :param accumulator: Receives the merged samples. A new one if not given.
+        :param log: Observation log to append all samples to
+        """
+
+        bands = [rig.band for rig in rigs]
+        if len(set(bands)) != len(bands):
+            raise ValueError(f"Each rig needs its own band, got {bands}")
+
+        self.rigs = rigs
+        self.accumulator = (
+            accumulator if accumulator is not None else signal_matrix.CycleAccumulator()
+        )
+        self.log = log
+
+    def start(self) -> None:
+        """Open the CAT ports, tune the rigs and start a sampler per rig"""
+
+        for rig in self.rigs:
+            if rig.session is None:
+                rig.session = cat.CatSession(cat.open_cat_port(rig.device, reconnect=True))
+            freq = param.beacon_frequency[rig.band]
+            rig.session.execute(
+                transceiver.vfo_command(freq), transceiver.mode_command("CW-U")
+            )
+            rig.acquisition = sampler.Sampler(rig.session, rig.ring)
+            rig.acquisition.start()
+            logging.info(f"Rig {rig.device} on {freq} MHz")
+
+    def stop(self) -> None:
+        """Stop the samplers and emit the open cycle"""
+
+        for rig in self.rigs:
+            if rig.acquisition:
+                rig.acquisition.stop()
+        self.collect()
+        self.accumulator.flush()
+
+    def collect(self, _event: slot_scheduler.SlotEvent | None = None) -> None:
+        """Move the new samples of all rigs into the accumulator, in time order
+
+        :param _event: The slot event, when used as a slot callback
+        """
+
+        clock = cycle_clock.get_clock()
+        times, values, bands = [], [], []
+        for rig in self.rigs:
+            snapshot = rig.ring.snapshot(since=rig.seen)
+            rig.seen = snapshot.end
+            t_ns = clock.ticks_to_utc_ns(snapshot.ticks)
+            if self.log is not None:
+                self.log.append_samples(t_ns, snapshot.raw, rig.band_index, snapshot.meter_type)
+            is_s_meter = snapshot.meter_type == sampler.S_METER
+            times.append(t_ns[is_s_meter])
+            values.append(snapshot.raw[is_s_meter])
+            bands.append(np.full(int(is_s_meter.sum()), rig.band_index, dtype=np.int8))
+
+        t_ns = np.concatenate(times)
+        order = np.argsort(t_ns, kind="stable")
+        self.accumulator.add(
+            t_ns[order], np.concatenate(values)[order], np.concatenate(bands)[order]
+        )
+
+    def run(self, count: int = 0) -> None:
+        """Acquire until stopped
+
+        :param count: Number of slots. 0 means forever.
+        """
+
+        scheduler = slot_scheduler.SlotScheduler()
+        scheduler.register(self.collect)
+        self.start()
+        try:
+            scheduler.run(count)
+        finally:
+            self.stop()
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def print_matrix(matrix: signal_matrix.CycleMatrix) -> None:
+    """Print the peak level per beacon and band of a cycle
+
+    :param matrix: The matrix of the cycle
+    """
+
+    known = beacons.load_beacons()
+    start = time.gmtime(matrix.start_ns // cycle_clock.NS_PER_SECOND)
+    print(f"\nCycle starting at {time.strftime('%Y-%m-%d %H:%M:%S', start)} UTC, peak levels")
+    print("        " + "".join(f"{band:>6}" for band in cycle_calculator.BANDS))
+    for nr in range(cycle_calculator.NR_OF_SLOTS):
+        callsign = known[nr].callsign if nr in known else str(nr)
+        levels = "".join(
+            f"{matrix.peak[nr, b]:>6}" if matrix.count[nr, b] else "     -"
+            for b in range(len(cycle_calculator.BANDS))
+        )
+        print(f"{callsign:8}{levels}")
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+@click.command(name="multi")
+@click.option("--rig", "rigs", multiple=True, required=True, help="PORT=BAND (repeatable)")
+@click.option("--slots", default=0, help="Number of slots to monitor, 0 = forever")
+@click.option("--log", "log_file", default="", help="Append all samples to this observation log")
+@click.option("--db", default="", help="Store the levels per slot in this SQLite database")
+def multi_rig(rigs, slots, log_file, db) -> None:  # type: ignore
+    """Monitor several bands at once, one rig per band"""
+
+    try:
+        assignments = [parse_assignment(text) for text in rigs]
+        store = sqlite_store.SqliteStore(db) if db else None
+        log = observation_log.ObservationWriter(log_file) if log_file else None
+        multi = MultiRig(assignments, log=log)
+    except (ValueError, OSError, sqlite3.Error) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    cycle_clock.load_clock_config()
+    multi.accumulator.register(print_matrix)
+    if store is not None:
+        multi.accumulator.register(store.put)
+    try:
+        multi.run(slots)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if log is not None:
+            log.close()
+        if store is not None:
+            store.close()
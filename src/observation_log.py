@@ -0,0 +1,324 @@
+"""Append-only observation log in a memory-mapped file of fixed-size records.
+
+Each observation is one 16 byte record: UTC time in nanoseconds, band index,
+slot, beacon number, meter type and value (see RECORD). The file starts with a
+header which holds the number of records written so far::
+
+    header: 8s magic b"IBPOBS1\\n", uint32 record size, uint32 segment records,
+            int64 number of records, int64 creation time (ns since the epoch)
+    record: int64 t_ns, int8 band index, uint8 slot, int8 beacon, uint8 meter type,
+            float32 value
+
+The file grows in preallocated segments, so appending is a copy into the
+mapping followed by an update of the count. The count is published after the
+records are stored, so a reader which maps the same file never sees a partly
+written record. Writing the pages to disk (msync) is done by a background
+thread: the acquisition thread never waits for the disk.
+
+Readers get numpy views on the mapping, without copying or parsing.
+"""
+
+# pylint: disable=logging-fstring-interpolation
+
+# Global imports
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, BinaryIO, Iterator
+
+# 3rd party imports
+import click
+import numpy as np
+
+# Local imports
+import cycle_calculator
+import signal_matrix
+
+MAGIC: bytes = b"IBPOBS1\n"
+HEADER = struct.Struct("<8sIIqq")
+HEADER_SIZE: int = 32  # HEADER padded to a multiple of the record size
+COUNT_OFFSET: int = 16  # Offset of the number of records in the header
+RECORD = np.dtype(
+    [
+        ("t_ns", "<i8"),  # UTC in nanoseconds since the epoch
+        ("band", "i1"),  # Index in cycle_calculator.BANDS, -1 = not a beacon band
+        ("slot", "u1"),  # Slot 0..17
+        ("beacon", "i1"),  # Beacon number 0..17, -1 = no beacon
+        ("meter_type", "u1"),  # sampler.S_METER or RM meter number
+        ("value", "<f4"),  # Raw meter value
+    ]
+)
+SEGMENT_RECORDS: int = 1 << 16  # The file grows by 1 MiB at a time
+FLUSH_INTERVAL: float = 5.0  # Seconds between writes of the pages to disk
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def make_records(t_ns: Any, value: Any, band: Any, meter_type: Any = 0) -> np.ndarray:
+    """Build observation records, with the slot and beacon from the NCDXF schedule
+
+    :param t_ns: Array-like of UTC times in nanoseconds since the epoch
+    :param value: Array-like of meter values
+    :param band: Band index (into cycle_calculator.BANDS) per sample, or one for all
+    :param meter_type: Meter type per sample, or one for all
+    :returns: Array of RECORD
+
+    >>> records = make_records([10_000_000_000, 25_000_000_000], [40, 80], [0, 4])
+    >>> records["slot"].tolist(), records["beacon"].tolist()
+    ([1, 2], [1, 16])
+    """
+
+    t_ns = np.asarray(t_ns, dtype=np.int64)
+    records = np.empty(len(t_ns), dtype=RECORD)
+    records["t_ns"] = t_ns
+    records["slot"] = (t_ns // signal_matrix.SLOT_NS) % cycle_calculator.NR_OF_SLOTS
+    records["band"] = band
+    records["meter_type"] = meter_type
+    records["value"] = value
+
+    band = records["band"].astype(np.int64)
+    valid = band >= 0
+    beacon = np.full(len(records), -1, dtype=np.int8)
+    beacon[valid] = cycle_calculator.BEACON_ARRAY[records["slot"][valid], band[valid]]
+    records["beacon"] = beacon
+    return records
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class ObservationWriter:
+    """Appends records to an observation log, for a single writer process."""
+
+    def __init__(
+        self,
+        filename: str | Path,
+        segment_records: int = SEGMENT_RECORDS,
+        flush_interval: float = FLUSH_INTERVAL,
+    ) -> None:
+        """Open the log, or create it if it does not exist
+
+        :param filename: The log file
+        :param segment_records: Number of records the file grows by
+        :param flush_interval: Seconds between writes of the pages to disk
+        :raises ValueError: If the file exists and is not an observation log
+        """
+
+        self.filename = Path(filename)
+        self.segment_records = segment_records
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+
+        if self.filename.exists() and self.filename.stat().st_size >= HEADER_SIZE:
+            self.file: BinaryIO = open(self.filename, "r+b")  # pylint: disable=consider-using-with
+            magic, record_size, _segment, self.count, _created = HEADER.unpack(
+                self.file.read(HEADER.size)
+            )
+            if magic != MAGIC or record_size != RECORD.itemsize:
+                self.file.close()
+                raise ValueError(f"{filename} is not an observation log")
+            self.capacity = (self.filename.stat().st_size - HEADER_SIZE) // RECORD.itemsize
+        else:
+            self.file = open(self.filename, "w+b")  # pylint: disable=consider-using-with
+            self.count = 0
+            self.capacity = 0
+            header = HEADER.pack(MAGIC, RECORD.itemsize, segment_records, 0, time.time_ns())
+            self.file.write(header.ljust(HEADER_SIZE, b"\0"))
+            self.file.flush()
+        self.map = self.grow(max(self.capacity, segment_records))
+
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="observation log", daemon=True)
+        self.thread.start()
+
+    def grow(self, capacity: int) -> mmap.mmap:
+        """Preallocate the file for a number of records and map it
+
+        :param capacity: Number of records the file must hold
+        :returns: The new mapping
+        """
+
+        size = HEADER_SIZE + capacity * RECORD.itemsize
+        fd = self.file.fileno()
+        if os.fstat(fd).st_size < size:
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(fd, 0, size)
+            else:
+                os.ftruncate(fd, size)
+        self.capacity = capacity
+        return mmap.mmap(fd, size)
+
+    def append(self, records: np.ndarray) -> None:
+        """Append records
+
+        :param records: Array of RECORD, see make_records()
+        """
+
+        with self.lock:
+            end = self.count + len(records)
+            if end > self.capacity:
+                segments = -(-(end - self.capacity) // self.segment_records)
+                # The flush thread may still hold the old mapping, so it is not closed here
+                self.map = self.grow(self.capacity + segments * self.segment_records)
+            view = np.frombuffer(self.map, RECORD, self.capacity, HEADER_SIZE)
+            view[self.count : end] = records
+            struct.pack_into("<q", self.map, COUNT_OFFSET, end)  # Publish after storing
+            self.count = end
+
+    def append_samples(self, t_ns: Any, value: Any, band: Any, meter_type: Any = 0) -> None:
+        """Append samples, see make_records()
+
+        :param t_ns: Array-like of UTC times in nanoseconds since the epoch
+        :param value: Array-like of meter values
+        :param band: Band index per sample, or one for all
+        :param meter_type: Meter type per sample, or one for all
+        """
+
+        self.append(make_records(t_ns, value, band, meter_type))
+
+    def flush(self) -> None:
+        """Write the mapped pages to disk"""
+
+        with self.lock:
+            current = self.map
+        if not current.closed:
+            current.flush()
+
+    def run(self) -> None:
+        """Thread: write the pages to disk at every flush interval"""
+
+        while not self.stopping.wait(self.flush_interval):
+            try:
+                self.flush()
+            except (OSError, ValueError):
+                logging.exception(f"Flushing {self.filename} failed")
+
+    def close(self) -> None:
+        """Stop the flush thread, write everything to disk and close the log"""
+
+        self.stopping.set()
+        self.thread.join()
+        with self.lock:
+            self.map.flush()
+            self.map.close()
+            self.file.close()
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class ObservationReader:
+    """Read-only view of an observation log, which may still be written to."""
+
+    def __init__(self, filename: str | Path) -> None:
+        """Map the log
+
+        :param filename: The log file
+        :raises ValueError: If the file is not an observation log
+        """
+
+        self.filename = Path(filename)
+        self.file: BinaryIO = open(self.filename, "rb")  # pylint: disable=consider-using-with
+        magic, record_size, _segment, _count, self.created_ns = HEADER.unpack(
+            self.file.read(HEADER.size)
+        )
+        if magic != MAGIC or record_size != RECORD.itemsize:
+            self.file.close()
+            raise ValueError(f"{filename} is not an observation log")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.capacity = (len(self.map) - HEADER_SIZE) // RECORD.itemsize
+
+    def __len__(self) -> int:
+        """Number of records written so far"""
+
+        return struct.unpack_from("<q", self.map, COUNT_OFFSET)[0]
+
+    def records(self, since: int = 0) -> np.ndarray:
+        """Get the records written so far, without copying
+
+        :param since: Index of the first record, like the length at the previous call
+        :returns: Read-only array of RECORD
+        """
+
+        count = len(self)
+        if count > self.capacity:
+            # The writer added segments. Views on the old mapping stay valid.
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.capacity = (len(self.map) - HEADER_SIZE) // RECORD.itemsize
+        view = np.frombuffer(self.map, RECORD, self.capacity, HEADER_SIZE)
+        return view[since:count]
+
+    def follow(self, interval: float = 1.0, since: int = 0) -> Iterator[np.ndarray]:
+        """Wait for new records
+
+        :param interval: Seconds between checks for new records
+        :param since: Index of the first record
+        :returns: Generator of arrays of new records
+        """
+
+        while True:
+            new = self.records(since)
+            if len(new):
+                since += len(new)
+                yield new
+            else:
+                time.sleep(interval)
+
+    def close(self) -> None:
+        """Close the file. The mapping is released when the last view is gone."""
+
+        self.file.close()
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def print_records(records: np.ndarray) -> None:
+    """Print observation records, one per line
+
+    :param records: Array of RECORD
+    """
+
+    for record in records:
+        utc = time.gmtime(int(record["t_ns"]) // 1_000_000_000)
+        band = cycle_calculator.BANDS[record["band"]] if record["band"] >= 0 else "-"
+        print(
+            f"{time.strftime('%Y-%m-%d %H:%M:%S', utc)} {band:>3} slot {record['slot']:2} "
+            f"beacon {record['beacon']:2} meter {record['meter_type']} {record['value']:g}"
+        )
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+@click.command()
+@click.argument("filename", type=click.Path(exists=True))
+@click.option("--last", default=20, help="Number of records to show, 0 = all")
+@click.option("--follow", "keep_following", is_flag=True, help="Keep showing new records")
+def main(filename: str, last: int, keep_following: bool) -> None:
+    """Print the records of an observation log"""
+
+    reader = ObservationReader(filename)
+    count = len(reader)
+    print(f"{count} records")
+    print_records(reader.records(max(count - last, 0) if last else 0))
+    if keep_following:
+        try:
+            for records in reader.follow(since=count):
+                print_records(records)
+        except KeyboardInterrupt:
+            pass
+    reader.close()
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+# pylint: disable=no-value-for-parameter
+if __name__ == "__main__":
+    main()
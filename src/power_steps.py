@@ -0,0 +1,213 @@
+"""Detection of the four power step dashes within each beacon transmission.
+
+Each transmission is the callsign followed by dashes at 100 W, 10 W, 1 W and
+100 mW (see transmission.segments). The weakest step which is still heard is
+the real measure of the propagation.
+
+The samples of a cycle are mapped to the segment of the transmission they fall
+in, using the callsign of the beacon on air to get the segment timing. A guard
+time at both ends of each window absorbs timestamp and keying uncertainty.
+The noise floor of each band is taken from the silent part at the end of the
+slots, after the last dash.
+
+analyse_cycle() has the same signature as a signal_matrix reducer, so it can
+be plugged into a signal_matrix.CycleAccumulator.
+"""
+
+# Global imports
+from dataclasses import dataclass
+
+# 3rd party imports
+import numpy as np
+
+# Local imports
+import beacons
+import cycle_calculator
+import cycle_clock
+import signal_matrix
+import transmission
+
+GUARD_SECONDS: float = 0.1  # Ignored at both ends of each segment window
+MARGIN: float = 12.0  # Raw units above the noise floor for a step to count as heard
+NOISE_PERCENTILE: float = 50.0  # Of the samples after the last dash
+NR_OF_SEGMENTS: int = 1 + len(transmission.POWER_STEPS)  # Callsign and the dashes
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+@dataclass
+class PowerSteps:
+    """Power step levels of one cycle, indexed [beacon_nr, band_index, segment]."""
+
+    start_ns: int  # UTC start of the cycle in nanoseconds since the epoch
+    count: np.ndarray  # int32 [18, 5, 5], number of samples per segment
+    level: np.ndarray  # float32 [18, 5, 5], mean raw value, NaN without samples
+    noise: np.ndarray  # float32 [5], noise floor per band, NaN if unknown
+    weakest: np.ndarray  # int8 [18, 5], index in POWER_STEPS of the weakest step heard, -1 none
+
+    def weakest_step(self, beacon_nr: int, band_index: int) -> str:
+        """Get the name of the weakest step heard
+
+        :param beacon_nr: Beacon number 0..17
+        :param band_index: Index in cycle_calculator.BANDS
+        :returns: Power step like '1W', "" if no step was heard
+        """
+
+        step = self.weakest[beacon_nr, band_index]
+        return transmission.POWER_STEPS[step] if step >= 0 else ""
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def segment_table(
+    callsigns: dict[int, str] | None = None, guard: float = GUARD_SECONDS
+) -> np.ndarray:
+    """Calculate the segment windows of each beacon
+
+    :param callsigns: Callsign per beacon number. From beacons.ini if not given.
+    :param guard: Seconds to leave out at both ends of each window
+    :returns: int64 array [18, NR_OF_SEGMENTS + 1, 2] with (start, end) in nanoseconds
+        after the slot boundary. The last row is the silent window after the last dash.
+
+    >>> table = segment_table({nr: "VK6RBP" for nr in range(18)}, guard=0.0)
+    >>> (table[0] // 10_000_000).tolist()
+    [[0, 387], [420, 520], [525, 625], [630, 730], [736, 836], [836, 1000]]
+    """
+
+    if callsigns is None:
+        callsigns = {nr: b.callsign for nr, b in beacons.load_beacons().items()}
+
+    guard_ns = round(guard * cycle_clock.NS_PER_SECOND)
+    slot_ns = signal_matrix.SLOT_NS
+    table = np.zeros((cycle_calculator.NR_OF_SLOTS, NR_OF_SEGMENTS + 1, 2), np.int64)
+    for nr in range(cycle_calculator.NR_OF_SLOTS):
+        windows = [
+            (round(start * cycle_clock.NS_PER_SECOND), round(end * cycle_clock.NS_PER_SECOND))
+            for _name, start, end in transmission.segments(callsigns.get(nr, ""))
+        ]
+        windows.append((windows[-1][1], slot_ns))
+        table[nr] = windows
+    table[:, :, 0] += guard_ns
+    table[:, :, 1] -= guard_ns
+    return table
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def analyse_cycle(
+    start_ns: int,
+    t_ns: np.ndarray,
+    raw: np.ndarray,
+    band: np.ndarray,
+    table: np.ndarray | None = None,
+    margin: float = MARGIN,
+) -> PowerSteps:
+    """Calculate the level of each segment and the weakest step heard
+
+    :param start_ns: UTC start of the cycle in nanoseconds
+    :param t_ns: UTC time of each sample in nanoseconds, all within the cycle
+    :param raw: Raw S-meter value of each sample
+    :param band: Band index of each sample, -1 for samples off the beacon bands
+    :param table: Segment windows, see segment_table(). From beacons.ini if not given.
+    :param margin: Raw units above the noise floor for a step to count as heard
+    :returns: The power step levels of the cycle
+
+    >>> table = segment_table({nr: "VK6RBP" for nr in range(18)})
+    >>> t = np.arange(0, 10_000, 25) * 1_000_000  # 40 Hz during the first slot
+    >>> step = np.digitize(t % 10**10, table[0, :, 0]) - 1  # Approximately
+    >>> raw = np.where((step >= 1) & (step <= 3), 100 - 30 * (step - 1), 20)
+    >>> result = analyse_cycle(0, t, raw, np.zeros(len(t), np.int8), table)
+    >>> result.weakest_step(0, 0), float(result.noise[0])
+    ('1W', 20.0)
+    """
+
+    if table is None:
+        table = segment_table()
+
+    nr_of_slots = cycle_calculator.NR_OF_SLOTS
+    nr_of_bands = signal_matrix.NR_OF_BANDS
+    valid = band >= 0
+    offset = (t_ns[valid] - start_ns) % signal_matrix.SLOT_NS
+    slot = (t_ns[valid] - start_ns) // signal_matrix.SLOT_NS
+    band = band[valid].astype(np.int64)
+    raw = raw[valid].astype(np.float64)
+    beacon = (slot - band) % nr_of_slots
+
+    # Segment of each sample, -1 for samples outside all (guarded) windows
+    windows = table[beacon]  # [samples, segments + 1, 2]
+    inside = (windows[:, :, 0] <= offset[:, None]) & (offset[:, None] < windows[:, :, 1])
+    segment = np.where(inside.any(axis=1), inside.argmax(axis=1), -1)
+
+    # Noise floor per band from the silent window after the last dash
+    noise = np.full(nr_of_bands, np.nan, dtype=np.float32)
+    silent = segment == NR_OF_SEGMENTS
+    for b in np.unique(band[silent]):
+        noise[b] = np.percentile(raw[silent & (band == b)], NOISE_PERCENTILE)
+
+    # Mean level per beacon, band and segment
+    keep = (segment >= 0) & (segment < NR_OF_SEGMENTS)
+    cell = (beacon[keep] * nr_of_bands + band[keep]) * NR_OF_SEGMENTS + segment[keep]
+    nr_of_cells = nr_of_slots * nr_of_bands * NR_OF_SEGMENTS
+    count = np.bincount(cell, minlength=nr_of_cells)
+    total = np.bincount(cell, weights=raw[keep], minlength=nr_of_cells)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        level = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+    shape = (nr_of_slots, nr_of_bands, NR_OF_SEGMENTS)
+    level = level.reshape(shape)
+
+    # A step is heard if its dash is above the noise floor plus the margin
+    with np.errstate(invalid="ignore"):
+        heard = level[:, :, 1:] > (noise[None, :, None] + margin)
+    last = heard.shape[2] - 1 - np.argmax(heard[:, :, ::-1], axis=2)
+    weakest = np.where(heard.any(axis=2), last, -1)
+
+    return PowerSteps(
+        start_ns=start_ns,
+        count=count.reshape(shape).astype(np.int32),
+        level=level.astype(np.float32),
+        noise=noise,
+        weakest=weakest.astype(np.int8),
+    )
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def analyse_slot(
+    start: float,
+    t_ns: np.ndarray,
+    raw: np.ndarray,
+    band_index: int,
+    table: np.ndarray | None = None,
+    margin: float = MARGIN,
+) -> tuple[int, PowerSteps] | None:
+    """Analyse the samples of one slot, taken on one band
+
+    :param start: UTC start of the slot in seconds
+    :param t_ns: UTC time of each sample in nanoseconds, may extend beyond the slot
+    :param raw: Raw S-meter value of each sample
+    :param band_index: Index in cycle_calculator.BANDS the radio was tuned to
+    :param table: Segment windows, see segment_table(). From beacons.ini if not given.
+    :param margin: Raw units above the noise floor for a step to count as heard
+    :returns: tuple of the beacon number on the air and the power steps,
+        None if there are no samples in the slot
+    """
+
+    start_ns = round(start * cycle_clock.NS_PER_SECOND)
+    in_slot = (t_ns >= start_ns) & (t_ns < start_ns + signal_matrix.SLOT_NS)
+    if not in_slot.any():
+        return None
+
+    steps = analyse_cycle(
+        start_ns - start_ns % signal_matrix.CYCLE_NS,
+        t_ns[in_slot],
+        raw[in_slot],
+        np.full(int(in_slot.sum()), band_index, dtype=np.int8),
+        table,
+        margin,
+    )
+    beacon_nr = cycle_calculator.beacon_on_band(cycle_calculator.BANDS[band_index], start)
+    return beacon_nr, steps
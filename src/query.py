@@ -0,0 +1,317 @@
+"""Query the observations in an archive (and the live log) by time, beacon and band.
+
+For example all S-meter levels of ZS6DN on 28 MHz between 06:00 and 09:00 UTC
+over the last 30 days::
+
+    python __main__.py query history.arc --call ZS6DN --band 28 --days 30 --hours 06:00-09:00
+
+The chunk index of the archive is bisected on the time range and pruned with
+the band and beacon bitmaps and the hours of the day, so only chunks which can
+hold matching records are decompressed. The records are streamed one chunk at
+a time, so memory use does not depend on the length of the period.
+
+From scripts, use run() for a generator of record arrays, or to_array() to get
+all matching records as one numpy array of observation_log.RECORD.
+"""
+
+# pylint: disable=logging-fstring-interpolation
+
+# Global imports
+import csv
+import json
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Iterator, TextIO
+
+# 3rd party imports
+import click
+import numpy as np
+
+# Local imports
+import appearances
+import archive
+import beacons
+import cycle_calculator
+import cycle_clock
+import observation_log
+import sampler
+
+DAY_NS: int = cycle_clock.SECONDS_PER_DAY * cycle_clock.NS_PER_SECOND
+END_OF_TIME: int = np.iinfo(np.int64).max
+FIELDS: tuple[str, ...] = ("utc", "band", "callsign", "slot", "meter", "value")
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def parse_hours(text: str) -> tuple[int, int]:
+    """Parse a daily time window
+
+    :param text: UTC window like '06:00-09:00', or '22-02' across midnight
+    :returns: tuple of the start and end in nanoseconds since midnight
+    :raises ValueError: If the text is not a time window
+
+    >>> [h // 3_600_000_000_000 for h in parse_hours("06:00-09:00")]
+    [6, 9]
+    """
+
+    def nanoseconds(hhmm: str) -> int:
+        hours, _, minutes = hhmm.strip().partition(":")
+        seconds = int(hours) * 3600 + int(minutes or 0) * 60
+        if not 0 <= seconds <= cycle_clock.SECONDS_PER_DAY:
+            raise ValueError(f"Invalid time {hhmm}")
+        return seconds * cycle_clock.NS_PER_SECOND
+
+    first, sep, last = text.partition("-")
+    if not sep:
+        raise ValueError(f"Invalid time window {text}, use HH:MM-HH:MM")
+    return nanoseconds(first), nanoseconds(last)
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+@dataclass
+class Query:
+    """Dataclass with the selection of a query."""
+
+    start_ns: int = 0  # UTC in nanoseconds since the epoch (inclusive)
+    end_ns: int = END_OF_TIME  # (inclusive)
+    beacons: list[int] = field(default_factory=list)  # Beacon numbers, empty = all
+    bands: list[int] = field(default_factory=list)  # Band indices, empty = all
+    hours: tuple[int, int] | None = None  # Daily window, see parse_hours()
+    meter_type: int | None = sampler.S_METER  # None = all meters
+    min_value: float | None = None  # Only values at or above this level
+
+    def bitmaps(self) -> tuple[int, int]:
+        """Get the band and beacon bitmaps, as in the archive index
+
+        :returns: tuple of the band bits and beacon bits, 0 = all
+        """
+
+        return sum(1 << b for b in set(self.bands)), sum(1 << n for n in set(self.beacons))
+
+    def in_hours(self, t_ns: np.ndarray) -> np.ndarray:
+        """Check if times are in the daily window
+
+        :param t_ns: UTC times in nanoseconds since the epoch
+        :returns: Boolean array
+        """
+
+        if self.hours is None:
+            return np.ones(len(t_ns), dtype=bool)
+        first, last = self.hours
+        time_of_day = t_ns % DAY_NS
+        if first <= last:
+            return (time_of_day >= first) & (time_of_day < last)
+        return (time_of_day >= first) | (time_of_day < last)
+
+    def chunks_in_hours(self, index: np.ndarray) -> np.ndarray:
+        """Check if chunks overlap the daily window
+
+        :param index: CHUNK headers from the archive index
+        :returns: Boolean array
+        """
+
+        if self.hours is None:
+            return np.ones(len(index), dtype=bool)
+        first, last = self.hours
+        windows = [(first, last)] if first <= last else [(first, DAY_NS), (0, last)]
+        chunk_start = index["min_t"] % DAY_NS
+        chunk_end = chunk_start + (index["max_t"] - index["min_t"])
+        overlap = index["max_t"] - index["min_t"] >= DAY_NS
+        for begin, end in windows:
+            for day in (0, DAY_NS):  # The chunk may run into the next day
+                overlap |= (chunk_start < end + day) & (chunk_end >= begin + day)
+        return overlap
+
+    def match(self, records: np.ndarray) -> np.ndarray:
+        """Check which records are selected
+
+        :param records: Array of observation_log.RECORD
+        :returns: Boolean array
+        """
+
+        t_ns = records["t_ns"]
+        selected = (t_ns >= self.start_ns) & (t_ns <= self.end_ns) & self.in_hours(t_ns)
+        if self.beacons:
+            selected &= np.isin(records["beacon"], self.beacons)
+        if self.bands:
+            selected &= np.isin(records["band"], self.bands)
+        if self.meter_type is not None:
+            selected &= records["meter_type"] == self.meter_type
+        if self.min_value is not None:
+            selected &= records["value"] >= self.min_value
+        return selected
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def run(source: archive.Archive, query: Query, log: str = "") -> Iterator[np.ndarray]:
+    """Find the matching records
+
+    :param source: The archive
+    :param query: The selection
+    :param log: Observation log to search too, for the records not archived yet
+    :returns: Generator of arrays of observation_log.RECORD, each in time order.
+        The archive has separate chunks per band, so different bands may overlap.
+    """
+
+    band_bits, beacon_bits = query.bitmaps()
+    chunks = source.select(query.start_ns, query.end_ns, band_bits, beacon_bits)
+    chunks = chunks[query.chunks_in_hours(source.index[chunks])]
+    for nr in chunks:
+        records = source.read_chunk(int(nr))
+        selected = records[query.match(records)]
+        if len(selected):
+            yield selected
+
+    if log:
+        reader = observation_log.ObservationReader(log)
+        since = source.log_position if reader.created_ns == source.log_created_ns else 0
+        new = reader.records(since)
+        for start in range(0, len(new), archive.CHUNK_RECORDS):
+            records = new[start : start + archive.CHUNK_RECORDS]
+            selected = records[query.match(records)]
+            if len(selected):
+                yield np.sort(selected, order="t_ns", kind="stable")
+        reader.close()
+
+
+def to_array(source: archive.Archive, query: Query, log: str = "") -> np.ndarray:
+    """Get all matching records at once
+
+    :param source: The archive
+    :param query: The selection
+    :param log: Observation log to search too, for the records not archived yet
+    :returns: Array of observation_log.RECORD
+    """
+
+    parts = list(run(source, query, log))
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=observation_log.RECORD)
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def values(records: np.ndarray, known: dict[int, beacons.Beacon]) -> Iterator[tuple]:
+    """Convert records to output values, in the order of FIELDS
+
+    :param records: Array of observation_log.RECORD
+    :param known: The beacons by number, see beacons.load_beacons()
+    :returns: Generator of tuples of utc, band, callsign, slot, meter and value
+    """
+
+    bands = cycle_calculator.BANDS
+    callsigns = {nr: beacon.callsign for nr, beacon in known.items()}
+    times = np.datetime_as_string(records["t_ns"].astype("datetime64[ns]"), unit="ms")
+    for utc, (_t_ns, band, slot, beacon_nr, meter_type, value) in zip(
+        times.tolist(), records.tolist()
+    ):
+        yield (
+            f"{utc}Z",
+            bands[band] if band >= 0 else None,
+            callsigns.get(beacon_nr, beacon_nr),
+            slot,
+            meter_type,
+            value,
+        )
+
+
+def rows(records: np.ndarray, known: dict[int, beacons.Beacon]) -> Iterator[dict]:
+    """Convert records to output rows
+
+    :param records: Array of observation_log.RECORD
+    :param known: The beacons by number, see beacons.load_beacons()
+    :returns: Generator of dicts with utc, band, callsign, slot, meter and value
+    """
+
+    for row in values(records, known):
+        yield dict(zip(FIELDS, row))
+
+
+def write_csv(parts: Iterator[np.ndarray], out: TextIO) -> int:
+    """Write records as CSV, with a header line
+
+    :param parts: Arrays of observation_log.RECORD, see run()
+    :param out: The output stream
+    :returns: Number of records written
+    """
+
+    known = beacons.load_beacons()
+    writer = csv.writer(out)
+    writer.writerow(FIELDS)
+    count = 0
+    for records in parts:
+        writer.writerows(values(records, known))
+        count += len(records)
+    return count
+
+
+def write_jsonl(parts: Iterator[np.ndarray], out: TextIO) -> int:
+    """Write records as JSON lines
+
+    :param parts: Arrays of observation_log.RECORD, see run()
+    :param out: The output stream
+    :returns: Number of records written
+    """
+
+    known = beacons.load_beacons()
+    count = 0
+    for records in parts:
+        out.writelines(json.dumps(row) + "\n" for row in rows(records, known))
+        count += len(records)
+    return count
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+@click.command(name="query")
+@click.argument("archive_file", type=click.Path(exists=True))
+@click.option("--call", "calls", multiple=True, help="Beacon callsign (repeatable)")
+@click.option("--band", "bands", multiple=True, help="Band or frequency (repeatable)")
+@click.option("--start", default="", help="UTC start time (ISO 8601)")
+@click.option("--end", default="", help="UTC end time (ISO 8601), default now")
+@click.option("--days", default=0.0, help="Period before the end, if no start is given")
+@click.option("--hours", default="", help="Daily UTC window, like 06:00-09:00")
+@click.option("--meter", default=sampler.S_METER, help="Meter type, 0 = S-meter")
+@click.option("--min-level", type=float, default=None, help="Only levels at or above this")
+@click.option("--log", "log_file", default="", help="Observation log with newer records")
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), default="csv")
+@click.option("--output", type=click.File("w"), default="-", help="Output file, - = stdout")
+def query_archive(  # type: ignore
+    archive_file, calls, bands, start, end, days, hours, meter, min_level, log_file, fmt, output
+) -> None:
+    """Print the stored observations of beacons and bands in a time range"""
+
+    try:
+        end_ns = (
+            int(appearances.parse_utc(end) * cycle_clock.NS_PER_SECOND) if end else time.time_ns()
+        )
+        start_ns = 0
+        if start:
+            start_ns = int(appearances.parse_utc(start) * cycle_clock.NS_PER_SECOND)
+        elif days:
+            start_ns = end_ns - int(days * DAY_NS)
+        selection = Query(
+            start_ns,
+            end_ns,
+            appearances.beacon_numbers(calls) if calls else [],
+            appearances.band_indices(bands) if bands else [],
+            parse_hours(hours) if hours else None,
+            meter,
+            min_level,
+        )
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    source = archive.Archive(archive_file)
+    t_start = time.perf_counter()
+    write = write_csv if fmt == "csv" else write_jsonl
+    count = write(run(source, selection, log_file), output)
+    source.close()
+    click.echo(f"{count} records in {time.perf_counter() - t_start:.3f} s", err=True)
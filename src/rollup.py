@@ -0,0 +1,340 @@
+"""Online rollups of the signal levels per beacon, band and time bucket.
+
+A Rollup keeps running statistics per (bucket, beacon, band): the number of
+slots and samples, the sum for the mean, the peak and a histogram of the level
+per slot (CycleMatrix.percentile) as a percentile sketch. Each cycle matrix
+updates the statistics as it arrives, so a report reads O(buckets) cells
+instead of the raw history.
+
+Cycles are 180 seconds, and hours and days are a whole number of cycles, so
+each cycle falls in exactly one bucket. The standard rollups are:
+
+- hour_of_day: 24 buckets, the hour of the day over all days (the propagation picture)
+- day: one bucket per UTC day
+
+The rollups are persisted in the rollup table of a SQLite database (see
+sqlite_store, which updates them in the transaction of each cycle). In memory
+a rollup only keeps the buckets which can still be updated: all 24 of
+hour_of_day, and the current day of day (see prune). Older buckets are read
+from the database when they are needed.
+"""
+
+# pylint: disable=logging-fstring-interpolation
+
+# Global imports
+import sqlite3
+import time
+from dataclasses import dataclass, field
+
+# 3rd party imports
+import click
+import numpy as np
+
+# Local imports
+import cycle_calculator
+import cycle_clock
+import signal_matrix
+
+LEVEL_BINS: int = 32  # Histogram bins of the raw level 0..255
+BIN_WIDTH: int = 256 // LEVEL_BINS
+SHAPE: tuple[int, int] = (cycle_calculator.NR_OF_SLOTS, signal_matrix.NR_OF_BANDS)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup (
+    name TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    beacon INTEGER NOT NULL,
+    band INTEGER NOT NULL,
+    slots INTEGER NOT NULL,
+    samples INTEGER NOT NULL,
+    total REAL NOT NULL,
+    peak INTEGER NOT NULL,
+    histogram BLOB NOT NULL,
+    PRIMARY KEY (name, bucket, beacon, band)
+) WITHOUT ROWID;
+"""
+
+UPSERT = "INSERT OR REPLACE INTO rollup VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+@dataclass
+class Bucket:
+    """Running statistics of one time bucket, indexed [beacon_nr, band_index]."""
+
+    slots: np.ndarray = field(default_factory=lambda: np.zeros(SHAPE, dtype=np.int64))
+    samples: np.ndarray = field(default_factory=lambda: np.zeros(SHAPE, dtype=np.int64))
+    total: np.ndarray = field(default_factory=lambda: np.zeros(SHAPE))  # Sum of the samples
+    peak: np.ndarray = field(default_factory=lambda: np.full(SHAPE, -1, dtype=np.int16))
+    histogram: np.ndarray = field(
+        default_factory=lambda: np.zeros(SHAPE + (LEVEL_BINS,), dtype=np.int32)
+    )  # Number of slots per level bin
+
+    def update(self, matrix: signal_matrix.CycleMatrix) -> None:
+        """Add the cells with samples of a cycle
+
+        :param matrix: The matrix of the cycle
+        """
+
+        nrs, bands = np.nonzero(matrix.count)
+        self.slots[nrs, bands] += 1
+        self.samples[nrs, bands] += matrix.count[nrs, bands]
+        self.total[nrs, bands] += matrix.mean[nrs, bands] * matrix.count[nrs, bands]
+        self.peak[nrs, bands] = np.maximum(self.peak[nrs, bands], matrix.peak[nrs, bands])
+        level = np.nan_to_num(matrix.percentile[nrs, bands])
+        bins = np.clip(level // BIN_WIDTH, 0, LEVEL_BINS - 1).astype(np.int64)
+        np.add.at(self.histogram, (nrs, bands, bins), 1)
+
+    def copy(self) -> "Bucket":
+        """Get a copy, which can be updated without changing this bucket"""
+
+        return Bucket(
+            self.slots.copy(),
+            self.samples.copy(),
+            self.total.copy(),
+            self.peak.copy(),
+            self.histogram.copy(),
+        )
+
+    def mean(self) -> np.ndarray:
+        """Get the mean level
+
+        :returns: float array [beacon_nr, band_index], NaN without samples
+        """
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.samples > 0, self.total / self.samples, np.nan)
+
+    def percentile(self, q: float) -> np.ndarray:
+        """Get a percentile of the level per slot, from the histogram
+
+        :param q: Percentile (0..100)
+        :returns: float array [beacon_nr, band_index] with the middle of the bin,
+            NaN without slots
+
+        >>> bucket = Bucket()
+        >>> bucket.histogram[0, 0, [2, 5]] = 1, 3
+        >>> bucket.slots[0, 0] = 4
+        >>> float(bucket.percentile(25)[0, 0]), float(bucket.percentile(50)[0, 0])
+        (20.0, 44.0)
+        """
+
+        rank = np.maximum(np.ceil(q / 100.0 * self.slots), 1)
+        index = (np.cumsum(self.histogram, axis=-1) < rank[..., None]).sum(axis=-1)
+        return np.where(self.slots > 0, index * BIN_WIDTH + BIN_WIDTH / 2, np.nan)
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class Rollup:
+    """Running statistics per time bucket, beacon and band."""
+
+    def __init__(self, name: str, bucket_seconds: int, period: int = 0) -> None:
+        """Initialize without data
+
+        :param name: Name of the rollup in the database, like 'hour_of_day'
+        :param bucket_seconds: Length of a bucket, a multiple of the cycle length
+        :param period: Number of buckets after which they repeat (24 for the hour of
+            the day), 0 = the buckets do not repeat
+        """
+
+        if bucket_seconds % cycle_calculator.CYCLE_SECONDS:
+            raise ValueError(f"A bucket of {bucket_seconds} s does not hold whole cycles")
+        self.name = name
+        self.bucket_seconds = bucket_seconds
+        self.period = period
+        self.buckets: dict[int, Bucket] = {}
+
+    def bucket_of(self, t: float) -> int:
+        """Get the bucket of a time
+
+        :param t: UTC in seconds since the epoch
+        :returns: Bucket number
+
+        >>> hour_of_day().bucket_of(86400 + 7 * 3600 + 59)
+        7
+        """
+
+        bucket = int(t // self.bucket_seconds)
+        return bucket % self.period if self.period else bucket
+
+    def updated(
+        self,
+        matrices: list[signal_matrix.CycleMatrix],
+        connection: sqlite3.Connection | None = None,
+    ) -> dict[int, Bucket]:
+        """Get the buckets with cycles added, without changing the rollup
+
+        Save the result, and apply it with self.buckets.update() once it is stored.
+
+        :param matrices: The matrices of the cycles
+        :param connection: Database to read the buckets from which are not in memory
+        :returns: dict of the updated copies of the buckets, by bucket number
+        """
+
+        numbers = [self.bucket_of(m.start_ns / cycle_clock.NS_PER_SECOND) for m in matrices]
+        missing = sorted(set(numbers) - set(self.buckets))
+        if connection is not None and missing:
+            self.load(connection, missing)
+
+        changed: dict[int, Bucket] = {}
+        for number, matrix in zip(numbers, matrices):
+            if number not in changed:
+                current = self.buckets.get(number)
+                changed[number] = current.copy() if current is not None else Bucket()
+            changed[number].update(matrix)
+        return changed
+
+    def update(self, matrix: signal_matrix.CycleMatrix) -> int:
+        """Add a cycle
+
+        :param matrix: The matrix of the cycle
+        :returns: The bucket which was updated
+        """
+
+        changed = self.updated([matrix])
+        self.buckets.update(changed)
+        return next(iter(changed))
+
+    def table(self, statistic: str = "mean", q: float = 50.0) -> tuple[np.ndarray, np.ndarray]:
+        """Get one statistic of all buckets
+
+        :param statistic: 'mean', 'peak', 'slots', 'samples' or 'percentile'
+        :param q: Percentile, for 'percentile'
+        :returns: tuple of the bucket numbers (sorted) and an array [bucket, beacon_nr, band_index]
+        """
+
+        numbers = sorted(self.buckets)
+        values = []
+        for number in numbers:
+            bucket = self.buckets[number]
+            if statistic == "mean":
+                values.append(bucket.mean())
+            elif statistic == "percentile":
+                values.append(bucket.percentile(q))
+            else:
+                values.append(getattr(bucket, statistic))
+        array = np.stack(values) if values else np.zeros((0,) + SHAPE)
+        return np.array(numbers, dtype=np.int64), array
+
+    def save(
+        self, connection: sqlite3.Connection, buckets: dict[int, Bucket] | None = None
+    ) -> None:
+        """Write buckets to the rollup table, in the current transaction
+
+        :param connection: The database
+        :param buckets: The buckets to write, by number, like from updated(). All if not given.
+        """
+
+        rows = []
+        for number, bucket in (self.buckets if buckets is None else buckets).items():
+            nrs, bands = np.nonzero(bucket.slots)
+            for nr, band in zip(nrs.tolist(), bands.tolist()):
+                rows.append(
+                    (
+                        self.name,
+                        number,
+                        nr,
+                        cycle_calculator.BANDS[band],
+                        int(bucket.slots[nr, band]),
+                        int(bucket.samples[nr, band]),
+                        float(bucket.total[nr, band]),
+                        int(bucket.peak[nr, band]),
+                        bucket.histogram[nr, band].astype("<i4").tobytes(),
+                    )
+                )
+        connection.executemany(UPSERT, rows)
+
+    def load(self, connection: sqlite3.Connection, numbers: list[int] | None = None) -> None:
+        """Read buckets of this rollup from the rollup table
+
+        :param connection: The database
+        :param numbers: The buckets to read. If not given, the buckets which can still be
+            updated: all buckets of a rollup which repeats, else the current one.
+        """
+
+        connection.executescript(SCHEMA)
+        if numbers is None:
+            numbers = list(range(self.period)) if self.period else [self.bucket_of(time.time())]
+        for number in numbers:
+            self.buckets.pop(number, None)
+        for number, nr, band, slots, samples, total, peak, histogram in connection.execute(
+            "SELECT bucket, beacon, band, slots, samples, total, peak, histogram "
+            f"FROM rollup WHERE name = ? AND bucket IN ({', '.join('?' * len(numbers))})",
+            (self.name, *numbers),
+        ):
+            bucket = self.buckets.get(number)
+            if bucket is None:
+                bucket = self.buckets[number] = Bucket()
+            cell = (nr, cycle_calculator.band_index(band))
+            bucket.slots[cell] = slots
+            bucket.samples[cell] = samples
+            bucket.total[cell] = total
+            bucket.peak[cell] = peak
+            bucket.histogram[cell] = np.frombuffer(histogram, "<i4")
+
+    def prune(self) -> None:
+        """Drop the buckets before the newest one, if the buckets do not repeat.
+        They are complete, as the cycles arrive in time order.
+        """
+
+        if not self.period and len(self.buckets) > 1:
+            newest = max(self.buckets)
+            self.buckets = {newest: self.buckets[newest]}
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def hour_of_day() -> Rollup:
+    """Rollup per hour of the day, over all days"""
+
+    return Rollup("hour_of_day", 3600, 24)
+
+
+def day() -> Rollup:
+    """Rollup per UTC day"""
+
+    return Rollup("day", cycle_clock.SECONDS_PER_DAY)
+
+
+def standard_rollups() -> list[Rollup]:
+    """The rollups the SQLite store keeps up to date"""
+
+    return [hour_of_day(), day()]
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+@click.command(name="rollup")
+@click.argument("filename", type=click.Path(exists=True))
+@click.option("--call", "callsign", required=True, help="Callsign of the beacon")
+@click.option("--percentile", "q", default=50.0, help="Percentile of the level per slot")
+def show_rollup(filename: str, callsign: str, q: float) -> None:
+    """Print the level of a beacon per band and hour of the day, from the rollups"""
+
+    connection = sqlite3.connect(filename)
+    row = connection.execute(
+        "SELECT slot FROM beacon WHERE callsign = ? COLLATE NOCASE", (callsign,)
+    ).fetchone()
+    if row is None:
+        print(f"Error: unknown beacon {callsign}")
+        return
+
+    t_start = time.perf_counter()
+    rollup = hour_of_day()
+    rollup.load(connection)
+    numbers, levels = rollup.table("percentile", q)
+    by_hour = dict(zip(numbers.tolist(), levels[:, row[0]]))
+    print(f"p{q:.0f} level of {callsign.upper()} per UTC hour")
+    print("band" + "".join(f"{hour:4}" for hour in range(24)))
+    for b, band in enumerate(cycle_calculator.BANDS):
+        cells = (by_hour[hour][b] if hour in by_hour else np.nan for hour in range(24))
+        print(f"{band:4}" + "".join("   -" if np.isnan(v) else f"{v:4.0f}" for v in cells))
+    print(f"({time.perf_counter() - t_start:.3f} s)")
+    connection.close()
+
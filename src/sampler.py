@@ -0,0 +1,258 @@
+"""Background S-meter sampler with a preallocated, timestamped ring buffer.
+
+A thread reads SM0; (and optionally RM meters) over a CatSession as fast as the
+link allows, and stores each sample as (ticks, raw value, meter type) in fixed
+numpy arrays. Memory use is fixed at creation, so the sampler can run for weeks.
+
+The ticks are the monotonic counter of the shared cycle_clock, taken halfway
+between request and reply. Convert them with cycle_clock.get_clock().ticks_to_utc_ns().
+
+Consumers read with SampleRing.snapshot() without taking a lock: the write
+count is published after the sample is stored, and samples which were overwritten
+during the copy are dropped from the result.
+"""
+
+# pylint: disable=logging-fstring-interpolation
+
+# Global imports
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+# 3rd party imports
+import click
+import numpy as np
+
+# Local imports
+import cat
+import cycle_clock
+
+S_METER: int = 0  # Meter type of SM0; samples. RM samples use their meter number 1..9.
+DEFAULT_SIZE: int = 1 << 16  # About half an hour at 35 samples per second
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+@dataclass
+class Snapshot:
+    """Copy of the samples in the ring buffer, oldest first."""
+
+    end: int  # Sequence number after the last sample, pass to the next snapshot()
+    ticks: np.ndarray  # int64, cycle_clock ticks in nanoseconds
+    raw: np.ndarray  # int16, raw meter value 0..255
+    meter_type: np.ndarray  # uint8, S_METER or RM meter number
+
+    def __len__(self) -> int:
+        return len(self.ticks)
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class SampleRing:
+    """Fixed size ring buffer of meter samples, for one writer and many readers."""
+
+    def __init__(self, size: int = DEFAULT_SIZE) -> None:
+        """Allocate the buffer
+
+        :param size: Number of samples kept
+        """
+
+        self.size = size
+        self.ticks = np.zeros(size, dtype=np.int64)
+        self.raw = np.zeros(size, dtype=np.int16)
+        self.meter_type = np.zeros(size, dtype=np.uint8)
+        self.written: int = 0  # Total number of samples ever written
+
+    def append(self, ticks: int, raw: int, meter_type: int = S_METER) -> None:
+        """Store one sample, overwriting the oldest one when the buffer is full
+
+        :param ticks: Tick counter at the moment of measurement
+        :param raw: Raw meter value
+        :param meter_type: S_METER or RM meter number
+
+        >>> ring = SampleRing(4)
+        >>> for n in range(6):
+        ...     ring.append(n * 10, n)
+        >>> snapshot = ring.snapshot()
+        >>> snapshot.end, snapshot.ticks.tolist(), snapshot.raw.tolist()
+        (6, [30, 40, 50], [3, 4, 5])
+        >>> ring.snapshot(since=5).raw.tolist()
+        [5]
+        """
+
+        index = self.written % self.size
+        self.ticks[index] = ticks
+        self.raw[index] = raw
+        self.meter_type[index] = meter_type
+        self.written += 1  # Publish the sample only after it has been stored
+
+    def snapshot(self, since: int = 0) -> Snapshot:
+        """Copy the samples written since a sequence number
+
+        :param since: Sequence number, like Snapshot.end of the previous call
+        :returns: The samples, oldest first. Samples already overwritten are missing.
+        """
+
+        end = self.written
+        start = max(since, end - self.size)
+        indices = np.arange(start, end) % self.size
+        snapshot = Snapshot(
+            end, self.ticks[indices], self.raw[indices], self.meter_type[indices]
+        )
+
+        # The writer may have overwritten the oldest samples during the copy,
+        # and may be busy overwriting the next one
+        overwritten = self.written - self.size - start + 1
+        if overwritten > 0:
+            snapshot.ticks = snapshot.ticks[overwritten:]
+            snapshot.raw = snapshot.raw[overwritten:]
+            snapshot.meter_type = snapshot.meter_type[overwritten:]
+        return snapshot
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def parse_meter(reply: str) -> tuple[int, int] | None:
+    """Parse an SM or RM reply
+
+    :param reply: The reply, like 'SM0123;' or 'RM6045000;'
+    :returns: tuple of meter type and raw value, None if the reply is invalid
+
+    >>> parse_meter('SM0123;'), parse_meter('RM6045000;'), parse_meter('?;')
+    ((0, 123), (6, 45), None)
+    """
+
+    if reply[:2] not in ("SM", "RM") or len(reply) < 7:
+        return None
+    try:
+        value = int(reply[3:6])
+        meter_type = S_METER if reply[:2] == "SM" else int(reply[2])
+    except ValueError:
+        return None
+    return meter_type, value
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class Sampler:
+    """Thread which samples the S-meter into a SampleRing."""
+
+    def __init__(
+        self,
+        session: cat.CatSession | None = None,
+        ring: SampleRing | None = None,
+        meters: str = "",
+        meter_every: int = 20,
+        interval: float = 0.0,
+    ) -> None:
+        """Initialize the sampler
+
+        :param session: The CAT session. The shared session if not given, which other
+            threads use in turns through CatSession.lock.
+        :param ring: The ring buffer to write to. A new one if not given.
+        :param meters: RM meter numbers to sample as well, like '67' for SWR and IDD
+        :param meter_every: Read the RM meters along with every n-th S-meter read
+        :param interval: Minimum time between S-meter reads in seconds, 0 = no pause
+        """
+
+        self.session = session
+        self.ring = ring if ring is not None else SampleRing()
+        self.meter_commands = [f"RM{m};" for m in meters]
+        self.meter_every = max(meter_every, 1)
+        self.interval = interval
+
+        self.reads: int = 0  # Number of CAT exchanges
+        self.failures: int = 0  # Number of invalid or missing replies
+        self.stopping = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """Start the sampling thread"""
+
+        if self.session is None:
+            self.session = cat.get_session()
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.run, name="sampler", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Stop the sampling thread and wait for it"""
+
+        self.stopping.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def sample(self) -> None:
+        """Read the meters once and store the samples"""
+
+        commands = ["SM0;"]
+        if self.meter_commands and self.reads % self.meter_every == 0:
+            commands += self.meter_commands
+
+        ticks_ns = cycle_clock.get_clock().ticks_ns
+        # Other threads share the session. Take its lock before the first tick, so
+        # waiting for their exchanges does not shift the time of the sample.
+        with self.session.lock:
+            t_start = ticks_ns()
+            replies = self.session.execute(*commands)
+            ticks = (t_start + ticks_ns()) // 2
+        self.reads += 1
+
+        for reply in replies:
+            parsed = parse_meter(reply)
+            if parsed is None:
+                self.failures += 1
+                continue
+            self.ring.append(ticks, parsed[1], parsed[0])
+
+    def run(self) -> None:
+        """Thread: sample until stopped"""
+
+        logging.info("S-meter sampler started")
+        while not self.stopping.is_set():
+            t_start = time.monotonic()
+            try:
+                self.sample()
+            except Exception:  # pylint: disable=broad-exception-caught
+                self.failures += 1
+                logging.exception("S-meter sample failed")
+                self.stopping.wait(1.0)  # Do not flood the log when the port is gone
+            if self.interval:
+                self.stopping.wait(self.interval - (time.monotonic() - t_start))
+        logging.info(f"S-meter sampler stopped after {self.reads} reads")
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+@click.command()
+@click.option("--seconds", default=10.0, help="Sampling time in seconds")
+@click.option("--meters", default="", help="RM meters to sample as well, like '67'")
+def main(seconds: float, meters: str) -> None:
+    """Sample the S-meter and report the sample rate"""
+
+    sampler = Sampler(meters=meters)
+    sampler.start()
+    time.sleep(seconds)
+    sampler.stop()
+
+    snapshot = sampler.ring.snapshot()
+    s_meter = snapshot.raw[snapshot.meter_type == S_METER]
+    print(f"{sampler.reads} reads in {seconds} s: {sampler.reads / seconds:.1f} reads/s")
+    if len(s_meter):
+        print(f"S-meter min {s_meter.min()}, mean {s_meter.mean():.1f}, max {s_meter.max()}")
+    print(f"{sampler.failures} failures")
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+# pylint: disable=no-value-for-parameter
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Adaptive band scanner: one radio, choosing a beacon band for every slot.
+
+In each 10 second slot five beacons are on the air, one per band. The scanner
+picks the band whose beacon is the most valuable to observe: likely to be heard
+(recent detection statistics) and not observed for a while. Over a number of
+cycles a single radio covers most of the 18 x 5 beacon/band combinations.
+
+The MonitorEngine tunes ahead of each boundary according to the choice, a
+Sampler thread reads the S-meter, and at each boundary the samples of the
+previous slot are analysed with power_steps to see if the beacon was heard.
+The original VFO state is restored afterwards.
+"""
+
+# pylint: disable=logging-fstring-interpolation
+
+# Global imports
+import asyncio
+import logging
+
+# 3rd party imports
+import click
+import numpy as np
+
+# Local imports
+import cat
+import cycle_calculator
+import cycle_clock
+import monitor_engine
+import param
+import power_steps
+import sampler
+import slot_scheduler
+import transceiver
+
+DECAY: float = 0.8  # Weight of the history at each new observation of a beacon/band
+REVISIT_SECONDS: float = 1800.0  # An observation is stale after this time
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class DetectionStats:
+    """Recent detection statistics per beacon and band."""
+
+    def __init__(self, decay: float = DECAY, revisit: float = REVISIT_SECONDS) -> None:
+        """Initialize without observations
+
+        :param decay: Weight of the history at each new observation
+        :param revisit: Seconds after which an observation is completely stale
+        """
+
+        shape = (cycle_calculator.NR_OF_SLOTS, len(cycle_calculator.BANDS))
+        self.decay = decay
+        self.revisit = revisit
+        self.observations = np.zeros(shape)  # Decayed number of observations
+        self.hits = np.zeros(shape)  # Decayed number of detections
+        self.last_observed = np.full(shape, -np.inf)  # UTC in seconds
+
+    def update(self, beacon_nr: int, band_index: int, heard: bool, t: float) -> None:
+        """Add an observation
+
+        :param beacon_nr: Beacon number 0..17
+        :param band_index: Index in cycle_calculator.BANDS
+        :param heard: True if the beacon was detected
+        :param t: UTC time of the observation in seconds
+        """
+
+        cell = (beacon_nr, band_index)
+        self.observations[cell] = self.observations[cell] * self.decay + 1
+        self.hits[cell] = self.hits[cell] * self.decay + heard
+        self.last_observed[cell] = t
+
+    def scores(self, t: float) -> np.ndarray:
+        """Value of observing each band in the slot starting at t
+
+        :param t: UTC start of the slot in seconds
+        :returns: Score per band index: probability of hearing the beacon
+            (Laplace estimate) times the staleness of the last observation
+
+        >>> stats = DetectionStats()
+        >>> stats.update(0, 0, True, 0.0)    # Beacon 0 on 14 MHz, just heard
+        >>> stats.update(17, 1, False, 0.0)  # Beacon 17 on 18 MHz, not heard
+        >>> stats.scores(0.0).round(2).tolist()
+        [0.0, 0.0, 0.5, 0.5, 0.5]
+        >>> int(stats.scores(1800.0).argmax())  # Stale again, and likely to be heard
+        0
+        """
+
+        slot = cycle_calculator.slot_at(t)
+        beacon_nrs = cycle_calculator.BEACON_ARRAY[slot].astype(np.int64)
+        bands = np.arange(len(cycle_calculator.BANDS))
+        probability = (self.hits[beacon_nrs, bands] + 1) / (
+            self.observations[beacon_nrs, bands] + 2
+        )
+        age = t - self.last_observed[beacon_nrs, bands]
+        staleness = np.minimum(age / self.revisit, 1.0)
+        return probability * staleness
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class Scanner:
+    """Choose a band per slot and record the detections."""
+
+    def __init__(
+        self,
+        stats: DetectionStats | None = None,
+        ring: sampler.SampleRing | None = None,
+        margin: float = power_steps.MARGIN,
+    ) -> None:
+        """Initialize the scanner
+
+        :param stats: Detection statistics to start from
+        :param ring: Ring buffer the S-meter samples are written to
+        :param margin: Raw units above the noise floor for a beacon to count as heard
+        """
+
+        self.stats = stats if stats is not None else DetectionStats()
+        self.ring = ring if ring is not None else sampler.SampleRing()
+        self.margin = margin
+        self.table = power_steps.segment_table()
+        self.choices: dict[float, int] = {}  # Slot start (UTC) -> band index
+        self.seen: int = 0  # Sequence number of the last sample analysed
+
+    def plan(self, t: float) -> float:
+        """Monitor engine plan: choose the band for the slot starting at t
+
+        :param t: UTC start of the slot in seconds
+        :returns: Beacon frequency in MHz
+        """
+
+        band_index = int(self.stats.scores(t).argmax())
+        self.choices[t] = band_index
+        return param.beacon_frequency[cycle_calculator.BANDS[band_index]]
+
+    def on_slot(self, event: slot_scheduler.SlotEvent) -> None:
+        """Slot handler: analyse the samples of the slot which just ended
+
+        :param event: The slot event of the new slot
+        """
+
+        snapshot = self.ring.snapshot(since=self.seen)
+        self.seen = snapshot.end
+
+        start = event.utc - cycle_calculator.SLOT_SECONDS
+        band_index = self.choices.pop(start, None)
+        if band_index is None:
+            return
+
+        is_s_meter = snapshot.meter_type == sampler.S_METER
+        t_ns = cycle_clock.get_clock().ticks_to_utc_ns(snapshot.ticks[is_s_meter])
+        result = power_steps.analyse_slot(
+            start, t_ns, snapshot.raw[is_s_meter], band_index, self.table, self.margin
+        )
+        if result is None:
+            logging.warning(f"No S-meter samples in the slot at {start}")
+            return
+
+        beacon_nr, steps = result
+        weakest = steps.weakest_step(beacon_nr, band_index)
+        self.stats.update(beacon_nr, band_index, bool(weakest), start)
+        logging.info(
+            f"Beacon {beacon_nr} on {cycle_calculator.BANDS[band_index]} MHz: "
+            f"{weakest or 'not heard'}"
+        )
+
+    async def run(self, count: int = 0, tuner: monitor_engine.Tuner | None = None) -> None:
+        """Scan, with a sampler thread on the shared CAT session
+
+        :param count: Number of slots to scan. 0 means forever.
+        :param tuner: Tuner for the monitor engine. monitor_engine.cat_tuner if not given.
+        """
+
+        engine = monitor_engine.MonitorEngine(self.plan, tuner or monitor_engine.cat_tuner)
+        engine.register(self.on_slot)
+        s_meter = sampler.Sampler(cat.get_session(), self.ring)
+
+        saved = transceiver.save_state()
+        s_meter.start()
+        try:
+            await engine.run(count)
+        finally:
+            s_meter.stop()
+            transceiver.restore_state(saved)
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+@click.command()
+@click.option("--slots", default=0, help="Number of slots to scan, 0 = forever")
+def scan(slots: int) -> None:
+    """Scan the beacon bands, choosing the most valuable band per slot"""
+
+    cycle_clock.load_clock_config()
+    scanner = Scanner()
+    try:
+        asyncio.run(scanner.run(slots))
+    except KeyboardInterrupt:
+        pass
+
+    heard = scanner.stats.hits > 0
+    print(f"Heard {int(heard.sum())} of {heard.size} beacon/band combinations")
@@ -5,7 +5,6 @@
 # Global imports
 import sys
 import signal
-import time
 import logging
 
 # from pathlib import Path
@@ -20,7 +19,9 @@ from rich.console import Console
 import param
 import beacons
 import cycle_calculator
+import cycle_clock
 import frequency
+import slot_scheduler
 import transceiver
 
 from lib.helper import debug, clear_debug_window
@@ -80,23 +81,22 @@ def show(band, tune) -> None:
         transceiver.set_mode(mode)
 
     signal.signal(signal.SIGINT, signal_handler)
-    old_slot: int = 0
-    color: str = "[bold red]"
     with console.status("Initial status", spinner="bouncingBall") as status:
-        while True:
-            current_slot = cycle_calculator.get_current_slot_on_frequency(f)
-            if current_slot != old_slot:
-                # print("New slot")
-                old_slot = current_slot
-                if current_slot % 2 == 0:
-                    color = "[bold red]"
-                else:
-                    color = "[bold blue]"
-
-            # debug(f"{current_slot=}")
-            beacon = beacons.dict_of_beacons[current_slot]
+
+        def render(event: slot_scheduler.SlotEvent | None = None) -> None:
+            """Show the beacon of the current slot"""
+
+            t = event.utc if event else None
+            current_slot = cycle_calculator.beacon_on_band(f, t)
+            color = "[bold red]" if current_slot % 2 == 0 else "[bold blue]"
+            beacon = beacons.load_beacons()[current_slot]
             status.update(f"{color} {beacon}")
-            time.sleep(0.25)  # or do some more work
+
+        # Show the current beacon now, then only update at each slot boundary
+        render()
+        scheduler = slot_scheduler.SlotScheduler()
+        scheduler.register(render)
+        scheduler.run()
 
 
 # ------------------------------------------------------------------------
@@ -112,6 +112,7 @@ def main():
     debug(f"Found {beacons_ini}")
 
     beacons.dict_of_beacons = beacons.get_dict_of_beacons(beacons_ini)
+    cycle_clock.load_clock_config()
     show()
 
 
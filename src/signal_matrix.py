@@ -0,0 +1,259 @@
+"""Reduce timestamped S-meter samples to a beacon x band signal matrix per cycle.
+
+Every sample is mapped to its slot with the NCDXF schedule and to the band the
+radio was tuned to at that moment (BandTrack). Together these give the beacon
+which was transmitting, so each sample lands in one of the 18 x 5 cells.
+All reductions (peak, mean, percentile, count) are done with numpy on the
+whole batch of samples, without a Python loop per sample.
+
+The CycleAccumulator collects the samples as they come in (for example from
+sampler.SampleRing snapshots) and emits the CycleMatrix of each 3 minute cycle
+as soon as a sample of a later cycle arrives.
+"""
+
+# pylint: disable=logging-fstring-interpolation
+
+# Global imports
+import functools
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable
+
+# 3rd party imports
+import numpy as np
+
+# Local imports
+import cycle_calculator
+import cycle_clock
+
+SLOT_NS: int = cycle_calculator.SLOT_SECONDS * cycle_clock.NS_PER_SECOND
+CYCLE_NS: int = cycle_calculator.CYCLE_SECONDS * cycle_clock.NS_PER_SECOND
+NR_OF_BANDS: int = len(cycle_calculator.BANDS)
+PERCENTILE: float = 90.0
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+@dataclass
+class CycleMatrix:
+    """Signal levels of one cycle, indexed [beacon_nr, band_index]."""
+
+    start_ns: int  # UTC start of the cycle in nanoseconds since the epoch
+    count: np.ndarray  # int32, number of samples
+    peak: np.ndarray  # int16, highest raw value, -1 without samples
+    mean: np.ndarray  # float32, mean raw value, NaN without samples
+    percentile: np.ndarray  # float32, PERCENTILE percentile of the raw values
+
+    def heard(self, threshold: float) -> np.ndarray:
+        """Get the cells with a percentile level above a threshold
+
+        :param threshold: Raw S-meter level, for example the noise floor plus a margin
+        :returns: Boolean array [beacon_nr, band_index]
+        """
+
+        return np.nan_to_num(self.percentile, nan=-1.0) > threshold
+
+
+MatrixCallback = Callable[[Any], None]
+# Reduces the samples of one cycle: (start_ns, t_ns, raw, band) -> result
+Reducer = Callable[[int, np.ndarray, np.ndarray, np.ndarray], Any]
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class BandTrack:
+    """History of the band the radio was tuned to, for looking up sample times."""
+
+    def __init__(self, size: int = 4096) -> None:
+        """Initialize an empty history
+
+        :param size: Maximum number of band changes kept
+        """
+
+        self.size = size
+        self.times: list[int] = []  # UTC of each change in nanoseconds, ascending
+        self.bands: list[int] = []  # Band index from that moment on, -1 = no beacon band
+
+    def record(self, t_ns: int, freq: Any) -> None:
+        """Record a band change
+
+        :param t_ns: UTC time of the change in nanoseconds
+        :param freq: New frequency or band, like 14, 21.15 or "10m"
+        """
+
+        band = cycle_calculator.band_index(freq)
+        if self.bands and self.bands[-1] == band:
+            return
+        self.times.append(t_ns)
+        self.bands.append(band)
+        if len(self.times) > self.size:
+            del self.times[: -self.size]
+            del self.bands[: -self.size]
+
+    def lookup(self, t_ns: np.ndarray) -> np.ndarray:
+        """Get the band index at the given times
+
+        :param t_ns: Array of UTC times in nanoseconds
+        :returns: Array of band indices, -1 before the first change or off the beacon bands
+
+        >>> track = BandTrack()
+        >>> track.record(100, 14)
+        >>> track.record(200, 21)
+        >>> track.lookup(np.array([50, 100, 150, 250])).tolist()
+        [-1, 0, 0, 2]
+        """
+
+        index = np.searchsorted(np.asarray(self.times, dtype=np.int64), t_ns, "right") - 1
+        bands = np.asarray([-1] + self.bands, dtype=np.int8)
+        return bands[index + 1]
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def reduce_cycle(
+    start_ns: int,
+    t_ns: np.ndarray,
+    raw: np.ndarray,
+    band: np.ndarray,
+    q: float = PERCENTILE,
+) -> CycleMatrix:
+    """Reduce the samples of one cycle to a CycleMatrix
+
+    :param start_ns: UTC start of the cycle in nanoseconds
+    :param t_ns: UTC time of each sample in nanoseconds, all within the cycle
+    :param raw: Raw S-meter value of each sample
+    :param band: Band index of each sample, -1 for samples off the beacon bands
+    :param q: Percentile to calculate (0..100)
+    :returns: The matrix of the cycle
+
+    >>> t = np.array([0, 1, 2, 10, 11]) * 1_000_000_000
+    >>> m = reduce_cycle(0, t, np.array([10, 30, 20, 50, 40]), np.zeros(5, np.int8), 50)
+    >>> int(m.count[0, 0]), int(m.peak[0, 0]), float(m.mean[0, 0]), float(m.percentile[0, 0])
+    (3, 30, 20.0, 20.0)
+    >>> int(m.peak[1, 0])  # Beacon 1 transmits on 14 MHz in the second slot
+    50
+    """
+
+    valid = band >= 0
+    slot = (t_ns[valid] - start_ns) // SLOT_NS
+    band = band[valid].astype(np.int64)
+    raw = raw[valid].astype(np.int64)
+    beacon = (slot - band) % cycle_calculator.NR_OF_SLOTS
+    cell = beacon * NR_OF_BANDS + band
+
+    nr_of_cells = cycle_calculator.NR_OF_SLOTS * NR_OF_BANDS
+    count = np.bincount(cell, minlength=nr_of_cells)
+    total = np.bincount(cell, weights=raw, minlength=nr_of_cells)
+    peak = np.full(nr_of_cells, -1, dtype=np.int64)
+    np.maximum.at(peak, cell, raw)
+
+    # Percentile: sort by cell, then by value, and pick the rank within each cell
+    percentile = np.full(nr_of_cells, np.nan)
+    order = np.lexsort((raw, cell))
+    starts = np.cumsum(count) - count
+    heard = count > 0
+    rank = starts[heard] + np.floor(q / 100.0 * (count[heard] - 1)).astype(np.int64)
+    percentile[heard] = raw[order][rank]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(heard, total / np.maximum(count, 1), np.nan)
+
+    shape = (cycle_calculator.NR_OF_SLOTS, NR_OF_BANDS)
+    return CycleMatrix(
+        start_ns=start_ns,
+        count=count.reshape(shape).astype(np.int32),
+        peak=peak.reshape(shape).astype(np.int16),
+        mean=mean.reshape(shape).astype(np.float32),
+        percentile=percentile.reshape(shape).astype(np.float32),
+    )
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class CycleAccumulator:
+    """Collect samples and emit a CycleMatrix at the end of every cycle."""
+
+    def __init__(
+        self,
+        band_track: BandTrack | None = None,
+        q: float = PERCENTILE,
+        reducer: Reducer | None = None,
+    ) -> None:
+        """Initialize the accumulator
+
+        :param band_track: The history of the tuned band. Not needed if add() gets the bands.
+        :param q: Percentile to calculate (0..100)
+        :param reducer: Reduction of the samples of a cycle. reduce_cycle() if not given.
+        """
+
+        self.band_track = band_track if band_track is not None else BandTrack()
+        self.reducer = reducer or functools.partial(reduce_cycle, q=q)
+        self.callbacks: list[MatrixCallback] = []
+        self.cycle_start: int | None = None  # UTC start of the open cycle in ns
+        self.pending: list[tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+
+    def register(self, callback: MatrixCallback) -> None:
+        """Register a function to be called with each completed CycleMatrix (or reducer result)
+
+        :param callback: Function called with the result
+        """
+
+        self.callbacks.append(callback)
+
+    def add(self, t_ns: np.ndarray, raw: np.ndarray, band: np.ndarray | None = None) -> None:
+        """Add samples, in time order, and emit the cycles they complete
+
+        :param t_ns: UTC time of each sample in nanoseconds
+        :param raw: Raw S-meter value of each sample
+        :param band: Band index of each sample. Looked up in the band track if not given.
+        """
+
+        if not len(t_ns):
+            return
+        if band is None:
+            band = self.band_track.lookup(t_ns)
+        cycle_of = t_ns - t_ns % CYCLE_NS
+        boundaries = np.flatnonzero(np.diff(cycle_of)) + 1
+        for part_t, part_raw, part_band in zip(
+            np.split(t_ns, boundaries),
+            np.split(raw, boundaries),
+            np.split(band, boundaries),
+        ):
+            start = int(part_t[0] - part_t[0] % CYCLE_NS)
+            if self.cycle_start is not None and start != self.cycle_start:
+                self.flush()
+            self.cycle_start = start
+            self.pending.append((part_t, part_raw, part_band))
+
+    def add_ticks(self, ticks: np.ndarray, raw: np.ndarray) -> None:
+        """Add samples timestamped with cycle_clock ticks, like sampler snapshots
+
+        :param ticks: Tick counter value of each sample
+        :param raw: Raw S-meter value of each sample
+        """
+
+        self.add(cycle_clock.get_clock().ticks_to_utc_ns(ticks), raw)
+
+    def flush(self) -> Any:
+        """Reduce the open cycle and pass the result to the callbacks
+
+        :returns: The CycleMatrix (or reducer result), None if there were no samples
+        """
+
+        if self.cycle_start is None or not self.pending:
+            return None
+        t_ns, raw, band = (np.concatenate(parts) for parts in zip(*self.pending))
+        matrix = self.reducer(self.cycle_start, t_ns, raw, band)
+        self.pending = []
+        self.cycle_start = None
+
+        for callback in self.callbacks:
+            try:
+                callback(matrix)
+            except Exception:  # pylint: disable=broad-exception-caught
+                logging.exception(f"Cycle matrix callback {callback} failed")
+        return matrix
@@ -0,0 +1,175 @@
+"""Event driven scheduler which wakes up exactly at the beacon slot boundaries.
+
+Instead of polling the clock several times per second, the scheduler calculates
+the next 10 second boundary with the shared cycle_clock, sleeps on its monotonic
+tick counter until just before it, and fires the registered callbacks (render,
+tune, sample, ...) at the boundary.
+"""
+
+# pylint: disable=logging-fstring-interpolation
+
+# Global imports
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+# Local imports
+import cycle_calculator
+import cycle_clock
+
+# Sleep until this many seconds before the boundary, then spin on the
+# monotonic clock. This keeps the wake-up within a millisecond, also on
+# platforms with a coarse sleep granularity.
+SPIN_SECONDS: float = 0.002
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+@dataclass
+class SlotEvent:
+    """Dataclass with the information passed to the slot callbacks."""
+
+    utc: float  # UTC time of the boundary, seconds since the epoch
+    cycle: int  # Cycle number since midnight UTC
+    slot: int  # Slot number in the cycle (0..17)
+    lateness: float  # Seconds between the boundary and the actual wake-up
+
+
+SlotCallback = Callable[[SlotEvent], None]
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def next_boundary(t: float, period: float = cycle_calculator.SLOT_SECONDS) -> float:
+    """Get the first slot boundary after the given time
+
+    :param t: UTC time in seconds since the epoch
+    :param period: Length of a slot in seconds
+    :returns: UTC time of the next boundary
+
+    >>> next_boundary(1000.0)
+    1010.0
+    >>> next_boundary(1003.7)
+    1010.0
+    """
+
+    return float((math.floor(t / period) + 1) * period)
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def slot_event(boundary: float, lateness: float = 0.0) -> SlotEvent:
+    """Create the SlotEvent for the given boundary
+
+    :param boundary: UTC time of the boundary, seconds since the epoch
+    :param lateness: Seconds between the boundary and the actual wake-up
+    :returns: SlotEvent
+
+    >>> slot_event(86400.0 + 370.0)
+    SlotEvent(utc=86770.0, cycle=2, slot=1, lateness=0.0)
+    """
+
+    seconds_since_midnight = boundary % 86400
+    return SlotEvent(
+        utc=boundary,
+        cycle=int(seconds_since_midnight // cycle_calculator.CYCLE_SECONDS),
+        slot=cycle_calculator.slot_at(boundary),
+        lateness=lateness,
+    )
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class SlotScheduler:
+    """Fire the registered callbacks at each slot boundary."""
+
+    def __init__(self, period: float = cycle_calculator.SLOT_SECONDS) -> None:
+        """Initialize the scheduler
+
+        :param period: Time between wake-ups in seconds (one slot by default)
+        """
+
+        self.period = period
+        self.callbacks: list[SlotCallback] = []
+
+        # Wake-up statistics, all in seconds
+        self.wakeups: int = 0
+        self.last_lateness: float = 0.0
+        self.max_lateness: float = 0.0
+        self.total_lateness: float = 0.0
+
+    def register(self, callback: SlotCallback) -> None:
+        """Register a callback, to be called with a SlotEvent at each boundary
+
+        :param callback: Function to call
+        """
+
+        self.callbacks.append(callback)
+
+    @property
+    def mean_lateness(self) -> float:
+        """Mean lateness of all wake-ups so far, in seconds"""
+
+        if not self.wakeups:
+            return 0.0
+        return self.total_lateness / self.wakeups
+
+    def wait_for_boundary(self) -> SlotEvent:
+        """Sleep until the next boundary
+
+        :returns: SlotEvent describing the boundary and the lateness of the wake-up
+        """
+
+        # Translate the UTC boundary to a deadline on the monotonic tick counter
+        clock = cycle_clock.get_clock()
+        now_ns = clock.now_ns()
+        boundary = next_boundary(now_ns / cycle_clock.NS_PER_SECOND, self.period)
+        boundary_ns = round(boundary * cycle_clock.NS_PER_SECOND)
+        deadline = clock.ticks_ns() + boundary_ns - now_ns
+
+        remaining = (deadline - clock.ticks_ns()) / cycle_clock.NS_PER_SECOND
+        if remaining > SPIN_SECONDS:
+            time.sleep(remaining - SPIN_SECONDS)
+        while clock.ticks_ns() < deadline:
+            pass
+
+        lateness = (clock.now_ns() - boundary_ns) / cycle_clock.NS_PER_SECOND
+        self.wakeups += 1
+        self.last_lateness = lateness
+        self.max_lateness = max(self.max_lateness, lateness)
+        self.total_lateness += lateness
+
+        return slot_event(boundary, lateness)
+
+    def fire(self, event: SlotEvent) -> None:
+        """Call all registered callbacks with the given event
+
+        :param event: The SlotEvent to pass
+        """
+
+        for callback in self.callbacks:
+            try:
+                callback(event)
+            except Exception:  # pylint: disable=broad-exception-caught
+                logging.exception(f"Slot callback {callback} failed")
+
+    def run(self, count: int = 0) -> None:
+        """Wait for each boundary and fire the callbacks
+
+        :param count: Number of boundaries to handle. 0 means forever.
+        """
+
+        n = 0
+        while not count or n < count:
+            event = self.wait_for_boundary()
+            logging.debug(
+                f"Slot {event.slot} woke up {event.lateness * 1000:.3f} ms late"
+            )
+            self.fire(event)
+            n += 1
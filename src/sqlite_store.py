@@ -0,0 +1,296 @@
+"""SQLite storage of the signal levels per slot, for access with SQL.
+
+Each cell of a signal_matrix.CycleMatrix is one transmission: a beacon on a
+band in one 10 second slot. SqliteStore writes these per-slot results in one
+transaction per cycle (executemany on the same, cached prepared statement)
+from its own thread, so the acquisition only puts the matrix in a queue. When
+the writer falls behind, all waiting cycles go into one transaction. The
+rollup tables (see rollup) are updated in the same transaction.
+
+Schema::
+
+    beacon(slot PRIMARY KEY, callsign UNIQUE, dx_entity, city, grid_locator)
+    band(band PRIMARY KEY, frequency)     -- band in MHz, beacon frequency in MHz
+    observation(beacon, band, utc, count, peak, mean, percentile)
+        PRIMARY KEY (beacon, band, utc), WITHOUT ROWID
+    observation_utc ON observation(utc, count, peak, mean, percentile)
+
+The table is clustered on (beacon, band, utc) and the index on utc holds all
+columns, so both kinds of lookup are answered from one b-tree. The database
+runs in WAL mode: readers do not block the writer, and a commit only waits for
+the log to be written.
+"""
+
+# pylint: disable=logging-fstring-interpolation
+
+# Global imports
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+# 3rd party imports
+import click
+import numpy as np
+
+# Local imports
+import beacons
+import cycle_calculator
+import cycle_clock
+import param
+import rollup
+import signal_matrix
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS beacon (
+    slot INTEGER PRIMARY KEY,
+    callsign TEXT NOT NULL UNIQUE,
+    dx_entity TEXT,
+    city TEXT,
+    grid_locator TEXT
+);
+CREATE TABLE IF NOT EXISTS band (
+    band INTEGER PRIMARY KEY,
+    frequency REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS observation (
+    beacon INTEGER NOT NULL,
+    band INTEGER NOT NULL,
+    utc INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    peak INTEGER NOT NULL,
+    mean REAL,
+    percentile REAL,
+    PRIMARY KEY (beacon, band, utc)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS observation_utc
+    ON observation (utc, count, peak, mean, percentile);
+"""
+
+INSERT = (
+    "INSERT OR REPLACE INTO observation (beacon, band, utc, count, peak, mean, percentile) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+SELECT_LEVELS = (
+    "SELECT utc, count, peak, mean, percentile FROM observation "
+    "WHERE beacon = ? AND band = ? AND utc BETWEEN ? AND ? ORDER BY utc"
+)
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def connect(filename: str | Path) -> sqlite3.Connection:
+    """Open the database, and create the tables if needed
+
+    :param filename: The database file
+    :returns: The connection, in WAL mode
+    """
+
+    connection = sqlite3.connect(filename, cached_statements=64)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")  # Durable at checkpoints, not per commit
+    connection.executescript(SCHEMA)
+    with connection:
+        connection.executemany(
+            "INSERT OR REPLACE INTO beacon VALUES (?, ?, ?, ?, ?)",
+            [
+                (b.slot, b.callsign, b.dx_entity, b.city, b.grid_locator)
+                for b in beacons.load_beacons().values()
+            ],
+        )
+        connection.executemany(
+            "INSERT OR REPLACE INTO band VALUES (?, ?)", param.beacon_frequency.items()
+        )
+    return connection
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def matrix_rows(matrix: signal_matrix.CycleMatrix) -> list[tuple]:
+    """Convert the cells with samples of a cycle matrix to observation rows
+
+    :param matrix: The matrix of one cycle
+    :returns: List of (beacon, band in MHz, utc of the slot, count, peak, mean, percentile)
+    """
+
+    nrs, band_idx = np.nonzero(matrix.count)
+    slots = (nrs + band_idx) % cycle_calculator.NR_OF_SLOTS
+    utc = matrix.start_ns // cycle_clock.NS_PER_SECOND + slots * cycle_calculator.SLOT_SECONDS
+    mean = matrix.mean[nrs, band_idx].astype(float)
+    percentile = matrix.percentile[nrs, band_idx].astype(float)
+    return list(
+        zip(
+            nrs.tolist(),
+            np.array(cycle_calculator.BANDS)[band_idx].tolist(),
+            utc.tolist(),
+            matrix.count[nrs, band_idx].tolist(),
+            matrix.peak[nrs, band_idx].tolist(),
+            mean.tolist(),
+            percentile.tolist(),
+        )
+    )
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+class SqliteStore:
+    """Thread which writes cycle matrices to the database, one transaction per cycle."""
+
+    def __init__(
+        self,
+        filename: str | Path,
+        queue_size: int = 100,
+        rollups: list[rollup.Rollup] | None = None,
+    ) -> None:
+        """Start the writer thread
+
+        :param filename: The database file
+        :param queue_size: Maximum number of cycles waiting to be written
+        :param rollups: Rollups to keep up to date. rollup.standard_rollups() if not given.
+        :raises sqlite3.Error: If the database can not be opened
+        """
+
+        self.filename = filename
+        self.rollups = rollups if rollups is not None else rollup.standard_rollups()
+        self.queue: queue.Queue[signal_matrix.CycleMatrix | None] = queue.Queue(queue_size)
+        self.dropped: int = 0  # Cycles lost because the queue was full
+        self.rows: int = 0  # Number of observations written
+        self.transactions: int = 0
+        self.error: Exception | None = None  # Why the database could not be opened
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="sqlite store", daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        if self.error is not None:
+            raise self.error
+
+    def put(self, matrix: signal_matrix.CycleMatrix) -> None:
+        """Queue a cycle for writing, without waiting. Use as an accumulator callback.
+
+        :param matrix: The matrix of one cycle
+        """
+
+        try:
+            self.queue.put_nowait(matrix)
+        except queue.Full:
+            self.dropped += 1
+            logging.warning(f"Database queue full, cycle at {matrix.start_ns} dropped")
+
+    def run(self) -> None:
+        """Thread: write the queued cycles until close()"""
+
+        try:
+            connection = connect(self.filename)
+            for aggregate in self.rollups:
+                aggregate.load(connection)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self.error = e
+            return
+        finally:
+            self.ready.set()
+
+        stopping = False
+        try:
+            while not stopping:
+                # One transaction per cycle, or for all waiting cycles if the writer fell behind
+                matrices = [self.queue.get()]
+                while not self.queue.empty():
+                    matrices.append(self.queue.get_nowait())
+                stopping = None in matrices
+                try:
+                    self.write(connection, [m for m in matrices if m is not None])
+                except Exception:  # pylint: disable=broad-exception-caught
+                    logging.exception(f"Writing {len(matrices)} cycles failed")
+        finally:
+            connection.close()
+
+    def write(
+        self, connection: sqlite3.Connection, matrices: list[signal_matrix.CycleMatrix]
+    ) -> None:
+        """Write cycles and update the rollups, in one transaction
+
+        :param connection: The database
+        :param matrices: The matrices of the cycles
+        """
+
+        rows = [row for matrix in matrices for row in matrix_rows(matrix)]
+        if not rows:
+            return
+        # The rollups only change after the commit, so a failed write leaves them as stored
+        changes = [
+            (aggregate, aggregate.updated(matrices, connection)) for aggregate in self.rollups
+        ]
+        with connection:
+            connection.executemany(INSERT, rows)
+            for aggregate, buckets in changes:
+                aggregate.save(connection, buckets)
+        for aggregate, buckets in changes:
+            aggregate.buckets.update(buckets)
+            aggregate.prune()
+        self.rows += len(rows)
+        self.transactions += 1
+
+    def close(self) -> None:
+        """Write the queued cycles, and stop the thread"""
+
+        if self.thread.is_alive():
+            self.queue.put(None)
+        self.thread.join()
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def levels(
+    connection: sqlite3.Connection, beacon_nr: int, band: int, start: float, end: float
+) -> list[tuple]:
+    """Get the levels of a beacon on a band in a time range
+
+    :param connection: Connection from connect()
+    :param beacon_nr: Beacon number (Beacon.slot)
+    :param band: Band in MHz (14, 18, 21, 24 or 28)
+    :param start: UTC start in seconds since the epoch (inclusive)
+    :param end: UTC end in seconds since the epoch (inclusive)
+    :returns: List of (utc, count, peak, mean, percentile), in time order
+    """
+
+    return connection.execute(SELECT_LEVELS, (beacon_nr, band, int(start), int(end))).fetchall()
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+@click.command(name="levels")
+@click.argument("filename", type=click.Path(exists=True))
+@click.option("--call", "callsign", required=True, help="Callsign of the beacon")
+@click.option("--band", required=True, help="Band or frequency")
+@click.option("--hours", default=24.0, help="Period before now")
+def show_levels(filename: str, callsign: str, band: str, hours: float) -> None:
+    """Print the stored levels of a beacon on a band"""
+
+    connection = connect(filename)
+    row = connection.execute(
+        "SELECT slot FROM beacon WHERE callsign = ? COLLATE NOCASE", (callsign,)
+    ).fetchone()
+    index = cycle_calculator.band_index(band)
+    if row is None or index < 0:
+        print(f"Error: unknown beacon {callsign} or band {band}")
+        return
+
+    end = time.time()
+    for utc, count, peak, mean, percentile in levels(
+        connection, row[0], cycle_calculator.BANDS[index], end - hours * 3600, end
+    ):
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(utc))
+        print(
+            f"{stamp}  {count:4} samples  peak {peak:3}  mean {mean:5.1f}  "
+            f"p{signal_matrix.PERCENTILE:.0f} {percentile:5.1f}"
+        )
+    connection.close()
+
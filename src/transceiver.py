@@ -6,6 +6,7 @@
 # import sys
 import time
 import logging
+from dataclasses import dataclass, fields
 
 # 3rd party imports
 import serial  # type: ignore
@@ -13,6 +14,7 @@ import serial  # type: ignore
 # local imports
 import param
 import cat
+import cycle_clock
 
 logging.basicConfig(level=logging.INFO)
 
@@ -166,22 +168,202 @@ def show_information() -> None:
 # -----------------------------------------------------------------------------
 #
 # -----------------------------------------------------------------------------
-def set_vfo(frequency: [str | float], vfo: str = "A") -> bool:  # type: ignore
-    """Set VFO A to the given frequency
+class RigState:
+    """Cache of the transceiver state, to skip CAT writes which change nothing.
 
-    :param frequency: Frequency to use
-    :param vfo: VFO to use ("A" or "B")
-    :return: True on success, False if an error
+    The cache is seeded from one IF; reply (see show_information for the layout),
+    reloaded from the IF; reply which confirms every set command (see send_sets),
+    and dropped after ttl seconds, or as soon as the transceiver reports a change
+    by itself (auto information).
+    """
+
+    __slots__ = ("frequency", "mode", "clarifier", "rx_clarifier", "tx_clarifier", "updated", "ttl")
+
+    def __init__(self, ttl: float = 30.0) -> None:
+        """Initialize an empty (invalid) cache
+
+        :param ttl: Time to live of the cached state in seconds
+        """
+
+        self.frequency: int = 0  # VFO A in Hz
+        self.mode: str = ""  # Mode code, see param.mode_dict
+        self.clarifier: str = ""  # Clarifier offset, like '+0000'
+        self.rx_clarifier: str = ""  # '0' = off, '1' = on
+        self.tx_clarifier: str = ""  # '0' = off, '1' = on
+        self.updated: float = 0.0  # time.monotonic() of the last IF; reply
+        self.ttl = ttl
+
+    @property
+    def valid(self) -> bool:
+        """True if the cached state can be trusted"""
+
+        return bool(self.updated) and time.monotonic() - self.updated < self.ttl
+
+    def invalidate(self) -> None:
+        """Drop the cached state"""
+
+        self.updated = 0.0
+
+    def load(self, response: str) -> bool:
+        """Seed the cache from an IF; reply
+
+        :param response: The IF reply, like 'IF001014100000+000000300000;'
+        :return: True if the reply could be parsed
+
+        >>> state = RigState()
+        >>> state.load("IF001014100000-050010300000;")
+        True
+        >>> state.frequency, state.mode, state.clarifier, state.rx_clarifier, state.tx_clarifier
+        (14100000, '3', '-0500', '1', '0')
+        """
+
+        if not response.startswith("IF") or len(response) < 22:
+            self.invalidate()
+            return False
+        try:
+            self.frequency = int(response[5:14])
+        except ValueError:
+            self.invalidate()
+            return False
+        self.clarifier = response[14:19]
+        self.rx_clarifier = response[19]
+        self.tx_clarifier = response[20]
+        self.mode = response[21]
+        self.updated = time.monotonic()
+        return True
+
+
+rig_state = RigState()
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def refresh_state() -> RigState:
+    """Read the transceiver state with IF; into rig_state
+
+    :return: rig_state
+    """
+
+    rig_state.load(cat.write("IF;"))
+    return rig_state
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def send_sets(*cmds: str) -> list[str]:
+    """Send set commands in one write, followed by IF; to confirm them
+
+    The transceiver handles the commands in order, so a '?;' for a rejected set
+    command arrives before the IF; reply, and the IF; reply shows the state after
+    the set commands. rig_state is loaded from that reply.
+
+    :param cmds: The set commands
+    :return: The reply of each set command, '?;' if it was rejected
+    """
+
+    replies = cat.get_session().execute(*cmds, "IF;")
+    rig_state.load(replies[-1])
+    return replies[:-1]
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def get_frequency() -> int:
+    """Get the frequency of VFO A, from the cache if possible
+
+    :return: Frequency in Hz, 0 if unknown
     """
 
+    if not rig_state.valid:
+        refresh_state()
+    return rig_state.frequency if rig_state.valid else 0
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def get_mode() -> str:
+    """Get the mode of the main band, from the cache if possible
+
+    :return: Mode string like 'CW-U', empty if unknown
     """
 
+    if not rig_state.valid:
+        refresh_state()
+    return param.mode_dict.get(rig_state.mode, "") if rig_state.valid else ""
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def save_state() -> tuple[int, str, str, str, str] | None:
+    """Read the transceiver state, to restore it later with restore_state()
+
+    :return: tuple of frequency (Hz), mode code, clarifier offset, RX clarifier on/off
+        and TX clarifier on/off, None if the state could not be read
+    """
+
+    if not refresh_state().valid:
+        logging.error("Could not read the transceiver state")
+        return None
+    return (
+        rig_state.frequency,
+        rig_state.mode,
+        rig_state.clarifier,
+        rig_state.rx_clarifier,
+        rig_state.tx_clarifier,
+    )
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def restore_state(saved: tuple[int, str, str, str, str] | None) -> bool:
+    """Restore the state saved by save_state() with a single write
+
+    :param saved: The saved state
+    :return: True on success, False if there was no state to restore
+    """
+
+    if saved is None:
+        return False
+
+    frequency, mode, clarifier, rx_clarifier, tx_clarifier = saved
+    cmds = [
+        f"FA{frequency:09};",
+        f"MD0{mode};",
+        f"CF001{clarifier};",
+        f"CF000{rx_clarifier}{tx_clarifier}000;",
+    ]
+    if rig_state.valid:
+        cmds = [cmd for cmd in cmds if not state_matches(cmd)]
+    if cmds:
+        send_sets(*cmds)
+    return True
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def vfo_command(frequency: [str | float], vfo: str = "A") -> str:  # type: ignore
+    """Create the command to set a VFO to the given frequency
+
+    :param frequency: Frequency to use
+    :param vfo: VFO to use ("A" or "B")
+    :return: The command, an empty string if the frequency is invalid
+
     Frequency can be:
     * a string with length 9  (for example "014100000")
     * a float. Assumed to be in MHz. Will be converted to a bytearray and 0 padded
       (for example 14.1)
 
-
+    >>> vfo_command(14.1)
+    'FA014100000;'
+    >>> vfo_command("014100000", "B")
+    'FB014100000;'
     """
 
     freq_str = "000"
@@ -191,24 +373,45 @@ def set_vfo(frequency: [str | float], vfo: str = "A") -> bool:  # type: ignore
         # Test if it looks like a string representation of a float like '14.070'
         if len(frequency) != 9 and "." in frequency:
             frequency = float(frequency)
+        elif len(frequency) == 9 and frequency.isdigit():
+            freq_str = frequency
 
     # If it is a float between 0.0 and 999.999, convert it to bytes
     # This is a frequency, assumed to be expressed in MHz.
     if isinstance(frequency, float) and (0.0 < frequency < 999.99999):
-        f = frequency * 1000000
+        f = round(frequency * 1000000)
         freq_str = f"{int(f):09}"
 
     if len(freq_str) != 9:
         logging.error(f"Error: Invalid frequency {frequency=}")
-        return False
+        return ""
 
     # Create the set VFO A to frequency command
-    s = "F" + vfo + freq_str + ";"
+    return "F" + vfo + freq_str + ";"
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def set_vfo(frequency: [str | float], vfo: str = "A") -> bool:  # type: ignore
+    """Set a VFO (A by default) to the given frequency
+
+    :param frequency: Frequency to use
+    :param vfo: VFO to use ("A" or "B")
+    :return: True on success, False if an error
+    """
+
+    s = vfo_command(frequency, vfo)
+    if not s:
+        return False
+
+    if rig_state.valid and state_matches(s):
+        logging.debug(f"VFO {vfo} already set: {s}")
+        return True
+
     logging.debug(s)
     # Write it to the port
-    cat.write(s)
-
-    return True
+    return send_sets(s) != ["?;"]
 
 
 # -----------------------------------------------------------------------------
@@ -283,16 +486,76 @@ def read_meter() -> tuple[str, str]:
     :return: meter value
     """
 
-    cmd = "RM" + "0"
-    meter0 = cat.write(cmd)
-
-    cmd = "RM" + "1"
-    meter1 = cat.write(cmd)
+    meter0, meter1 = cat.get_session().execute("RM0;", "RM1;")
 
     logging.debug(f"{meter0=} {meter1=}")
     return meter0, meter1
 
 
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+@dataclass
+class Meters:
+    """Dataclass with one readout of the meters. None for meters not read."""
+
+    t_ns: int = 0  # UTC time of the readout in nanoseconds (cycle_clock)
+    s: int | None = None
+    comp: int | None = None
+    alc: int | None = None
+    po: int | None = None
+    swr: int | None = None
+    idd: int | None = None
+    vdd: int | None = None
+
+    def set_meter(self, valstr: str) -> bool:
+        """Store the value of an RM reply in the matching field
+
+        :param valstr: The full string with the meter value
+        :return: True if the reply was a valid meter value
+
+        >>> m = Meters()
+        >>> m.set_meter('RM6045000;'), m.set_meter('?;'), m.swr
+        (True, False, 45)
+        """
+
+        name = metervalue_type(valstr).lower()
+        if name not in METER_FIELDS:
+            return False
+        try:
+            setattr(self, name, metervalue_to_int(valstr))
+        except ValueError:
+            return False
+        return True
+
+
+METER_FIELDS = {f.name for f in fields(Meters)} - {"t_ns"}
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def read_meters(types: str = "1345678") -> Meters:
+    """Read several meters with a single CAT write
+
+    :param types: The meter types to read (P1 of the RM command), see metervalue_type()
+    :return: Meters with the values which were read
+
+    All RM commands are sent in one write, so a sweep of all meters costs one
+    round trip. The timestamp is the middle between request and last reply.
+    """
+
+    clock = cycle_clock.get_clock()
+    t_start = clock.now_ns()
+    replies = cat.get_session().execute(*[f"RM{t};" for t in types])
+    meters = Meters(t_ns=(t_start + clock.now_ns()) // 2)
+
+    for reply in replies:
+        if not meters.set_meter(reply):
+            logging.debug(f"Ignored meter reply {reply!r}")
+    return meters
+
+
 # -----------------------------------------------------------------------------
 #
 # -----------------------------------------------------------------------------
@@ -312,15 +575,36 @@ def read_s_meter() -> int:
     return i
 
 
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def read_s_meter_timestamped() -> tuple[int, int]:
+    """Read the S-meter value together with the time it was measured
+
+    :return: tuple of UTC time in nanoseconds (cycle_clock) and the S-meter value
+
+    The timestamp is the middle between sending the request and receiving
+    the response, which is the best estimate of the moment of measurement.
+    """
+
+    clock = cycle_clock.get_clock()
+    t_start = clock.now_ns()
+    value = read_s_meter()
+    t_end = clock.now_ns()
+    return (t_start + t_end) // 2, value
+
+
 # -----------------------------------------------------------------------------
 #
 # -----------------------------------------------------------------------------
 def scan_beacon_frequencies(port: serial.Serial, delay: float = 2.0) -> None:
     """Scan the list of beacon frequencies
 
-    :param port: instance of serial port to use
+    :param port: instance of serial port to use (unused, the shared CAT session is used)
     :param delay: Wait for delay seconds before jumping to the next frequency
     :return: Nothing
+
+    For a scan which follows the beacon schedule, see scanner.py
     """
 
     # Beacon frequeencies as strings in Hertz
@@ -333,31 +617,29 @@ def scan_beacon_frequencies(port: serial.Serial, delay: float = 2.0) -> None:
         "028200000",
     ]
 
-    # Get current frequency:
-
-    cat.write("FA;")
-    current_frequency = port.read_until(expected=";")
-    logging.debug(f"{current_frequency=}")
-
-    # port.write("IF;")
-    # s = port.read_until(expected=";")
-    # print(f"{s=}")
+    # Get current state (frequency, mode, clarifier)
+    saved = save_state()
+    logging.debug(f"{saved=}")
 
     for freq in beacon_frequencies:
         set_vfo(freq, "A")
         time.sleep(delay)
 
-    cat.write(current_frequency)
+    restore_state(saved)
 
 
 # -----------------------------------------------------------------------------
 #
 # -----------------------------------------------------------------------------
 # noinspection PyPep8Naming
-def set_mode(mode_str: str) -> bool:
-    """Set the main band mode to the given string (i.e. 'USB', 'LSB', 'CW')
+def mode_command(mode_str: str) -> str:
+    """Create the command to set the main band mode (i.e. 'USB', 'LSB', 'CW-U')
 
     :param mode_str: String representing the desired mode
+    :return: The command, an empty string if the mode is invalid
+
+    >>> mode_command("CW-U")
+    'MD03;'
     """
 
     MAIN_BAND: str = "0"
@@ -366,15 +648,32 @@ def set_mode(mode_str: str) -> bool:
     if mode_str not in param.str_to_mode_dict.keys():
         logging.error(f"Invalide mode {mode_str=} given")
         logging.error(f"Options are {param.str_to_mode_dict.keys()}")
-        return False
+        return ""
 
     mode = param.str_to_mode_dict.get(mode_str, "")
     band = MAIN_BAND
-    #          P1     P2
-    s = "MD" + band + mode
-    cat.write(s)
+    #        P1     P2
+    return "MD" + band + mode + ";"
 
-    return True
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def set_mode(mode_str: str) -> bool:
+    """Set the main band mode to the given string (i.e. 'USB', 'LSB', 'CW')
+
+    :param mode_str: String representing the desired mode
+    """
+
+    s = mode_command(mode_str)
+    if not s:
+        return False
+
+    if rig_state.valid and state_matches(s):
+        logging.debug(f"Mode already {mode_str}")
+        return True
+
+    return send_sets(s) != ["?;"]
 
 
 # -----------------------------------------------------------------------------
@@ -396,7 +695,7 @@ def reset_clarifiers() -> bool:
     TX_CLAR_ON = "1"
 
     #            P1          P2      P3             P4            P5            P6...P8
-    cmd = (
+    cmd1 = (
         "CF"
         + MAIN_BAND
         + FIXED
@@ -406,27 +705,29 @@ def reset_clarifiers() -> bool:
         + 3 * FIXED
         + ";"
     )
-    cat.write(cmd)
 
-    #            P1          P2      P3               P4    P5...P8
-    cmd = "CF" + MAIN_BAND + FIXED + CLAR_FREQUENCY + "+" + "0000" + ";"
-    cat.write(cmd)
+    #             P1          P2      P3               P4    P5...P8
+    cmd2 = "CF" + MAIN_BAND + FIXED + CLAR_FREQUENCY + "+" + "0000" + ";"
 
-    return True
+    # Both set commands in a single write
+    return "?;" not in send_sets(cmd1, cmd2)
 
 
 # -----------------------------------------------------------------------------
 #
 # -----------------------------------------------------------------------------
 # noinspection PyUnusedLocal,PyPep8Naming
-def set_clarifier(rx_offset: [str | int]) -> bool:  # type: ignore
-    """Set TX and/or RX clarifiers.
+def clarifier_commands(rx_offset: [str | int]) -> list[str]:  # type: ignore
+    """Create the commands to set the RX clarifier.
 
     :param rx_offset: The offset in Hz (positive or negative).
+    :return: List with the clarifier frequency and the clarifier on/off command
 
     A value of 0Hz will turn the clarifier off.
     The offset frequency must be less than 10 kHz.
 
+    >>> clarifier_commands(-500)
+    ['CF001-0500;', 'CF00010000;']
     """
 
     MAIN_BAND = "0"
@@ -443,7 +744,7 @@ def set_clarifier(rx_offset: [str | int]) -> bool:  # type: ignore
     # 0 will become '0000'
     rx_direction, rx_offset = offset_to_str(rx_offset)
 
-    print(f"{rx_direction=} {rx_offset=}")
+    logging.debug(f"{rx_direction=} {rx_offset=}")
 
     # If the offset is 0 or '0000', then turn of the RX clarifier
     rx_clar_onoff = RX_CLAR_OFF
@@ -451,13 +752,12 @@ def set_clarifier(rx_offset: [str | int]) -> bool:  # type: ignore
         rx_clar_onoff = RX_CLAR_ON
 
     # Set the RX Clarifier frequency
-    #            P1          P2      P3               P4    P5...P8
-    cmd = "CF" + MAIN_BAND + FIXED + CLAR_FREQUENCY + rx_direction + rx_offset + ";"
-    cat.write(cmd)
+    #             P1          P2      P3               P4    P5...P8
+    cmd1 = "CF" + MAIN_BAND + FIXED + CLAR_FREQUENCY + rx_direction + rx_offset + ";"
 
     # Turn the RX Clarifier on or off
     #            P1          P2      P3             P4        P5        P6...P8
-    cmd = (
+    cmd2 = (
         "CF"
         + MAIN_BAND
         + FIXED
@@ -467,9 +767,85 @@ def set_clarifier(rx_offset: [str | int]) -> bool:  # type: ignore
         + 3 * FIXED
         + ";"
     )
-    cat.write(cmd)
 
-    return True
+    return [cmd1, cmd2]
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def set_clarifier(rx_offset: [str | int]) -> bool:  # type: ignore
+    """Set TX and/or RX clarifiers.
+
+    :param rx_offset: The offset in Hz (positive or negative).
+
+    A value of 0Hz will turn the clarifier off.
+    The offset frequency must be less than 10 kHz.
+
+    """
+
+    cmds = clarifier_commands(rx_offset)
+    if rig_state.valid and all(state_matches(cmd) for cmd in cmds):
+        logging.debug(f"Clarifier already set: {cmds}")
+        return True
+
+    # Both set commands in a single write
+    return "?;" not in send_sets(*cmds)
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def tune(
+    frequency: [str | float],  # type: ignore
+    mode: str = "",
+    rx_offset: [str | int | None] = None,  # type: ignore
+) -> bool:
+    """Set frequency, mode and clarifier with a single write
+
+    :param frequency: Frequency for VFO A (see vfo_command)
+    :param mode: Mode to set (i.e. 'CW-U'). Unchanged if empty.
+    :param rx_offset: RX clarifier offset in Hz. Unchanged if None.
+    :return: True on success, False if an error
+    """
+
+    cmds = [vfo_command(frequency)]
+    if mode:
+        cmds.append(mode_command(mode))
+    if rx_offset is not None:
+        cmds.extend(clarifier_commands(rx_offset))
+
+    if not all(cmds):
+        return False
+
+    # Skip the commands which would not change anything
+    if rig_state.valid:
+        cmds = [cmd for cmd in cmds if not state_matches(cmd)]
+    if not cmds:
+        return True
+
+    return "?;" not in send_sets(*cmds)
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def state_matches(cmd: str) -> bool:
+    """Check if a FA, MD or CF set command matches the cached state
+
+    :param cmd: The set command
+    :return: True if sending it would not change anything
+    """
+
+    if cmd.startswith("FA"):
+        return rig_state.frequency == int(cmd[2:11])
+    if cmd.startswith("MD0"):
+        return rig_state.mode == cmd[3]
+    if cmd.startswith("CF001"):
+        return rig_state.clarifier == cmd[5:10]
+    if cmd.startswith("CF000"):
+        return rig_state.rx_clarifier == cmd[5] and rig_state.tx_clarifier == cmd[6]
+    return False
 
 
 # -----------------------------------------------------------------------------
@@ -495,8 +871,9 @@ def main() -> None:
         # k = metervalue_to_int(m1)
         # print(i, j, k)
 
-        s = read_s_meter()
-        print(f"{s=}", end=", ", flush=True)
+        t_ns, s = read_s_meter_timestamped()
+        seconds = cycle_clock.get_clock().seconds_in_cycle(t_ns / 1e9)
+        print(f"{seconds:.3f}: {s=}", end=", ", flush=True)
         time.sleep(0.25)
 
 
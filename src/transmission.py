@@ -0,0 +1,126 @@
+"""Timing of a single NCDXF beacon transmission within its 10 second slot.
+
+Each transmission is the callsign in CW at 22 WPM, followed by four dashes of
+one second each. The callsign and the first dash are sent at 100 W, the other
+dashes at 10 W, 1 W and 100 mW.
+"""
+
+WPM: int = 22
+DIT: float = 1.2 / WPM  # Length of one Morse unit in seconds
+DASH_SECONDS: float = 1.0  # Length of each of the power step dashes
+START_DELAY: float = 0.0  # Start of the callsign after the slot boundary
+
+POWER_STEPS: tuple[str, ...] = ("100W", "10W", "1W", "100mW")
+
+MORSE: dict[str, str] = {
+    "A": ".-",
+    "B": "-...",
+    "C": "-.-.",
+    "D": "-..",
+    "E": ".",
+    "F": "..-.",
+    "G": "--.",
+    "H": "....",
+    "I": "..",
+    "J": ".---",
+    "K": "-.-",
+    "L": ".-..",
+    "M": "--",
+    "N": "-.",
+    "O": "---",
+    "P": ".--.",
+    "Q": "--.-",
+    "R": ".-.",
+    "S": "...",
+    "T": "-",
+    "U": "..-",
+    "V": "...-",
+    "W": ".--",
+    "X": "-..-",
+    "Y": "-.--",
+    "Z": "--..",
+    "0": "-----",
+    "1": ".----",
+    "2": "..---",
+    "3": "...--",
+    "4": "....-",
+    "5": ".....",
+    "6": "-....",
+    "7": "--...",
+    "8": "---..",
+    "9": "----.",
+    "/": "-..-.",
+}
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def callsign_keying(callsign: str) -> list[tuple[float, float]]:
+    """Calculate when the carrier is on while sending the callsign
+
+    :param callsign: The callsign of the beacon
+    :returns: List of (start, end) times in seconds after the slot boundary
+
+    >>> [(round(a, 3), round(b, 3)) for a, b in callsign_keying("TE")]
+    [(0.0, 0.164), (0.327, 0.382)]
+    """
+
+    keying = []
+    t = START_DELAY
+    for n, char in enumerate(callsign.upper()):
+        if n:
+            t += 2 * DIT  # Letter space is 3 units, 1 unit already added
+        for element in MORSE.get(char, ""):
+            length = DIT if element == "." else 3 * DIT
+            keying.append((t, t + length))
+            t += length + DIT
+    return keying
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def segments(callsign: str) -> list[tuple[str, float, float]]:
+    """Calculate the segments of a transmission: the callsign and the four dashes
+
+    :param callsign: The callsign of the beacon
+    :returns: List of (name, start, end), times in seconds after the slot boundary
+
+    >>> [(name, round(a, 2), round(b, 2)) for name, a, b in segments("VK6RBP")]
+    [('callsign', 0.0, 3.87), ('100W', 4.2, 5.2), ('10W', 5.25, 6.25), ('1W', 6.31, 7.31), ('100mW', 7.36, 8.36)]
+    """
+
+    keying = callsign_keying(callsign)
+    callsign_end = keying[-1][1] if keying else START_DELAY
+    result = [("callsign", START_DELAY, callsign_end)]
+
+    # Word space between the callsign and the dashes, element space between dashes
+    t = callsign_end + 6 * DIT
+    for step in POWER_STEPS:
+        result.append((step, t, t + DASH_SECONDS))
+        t += DASH_SECONDS + DIT
+    return result
+
+
+# -----------------------------------------------------------------------------
+#
+# -----------------------------------------------------------------------------
+def carrier(callsign: str, t: float) -> int:
+    """Get the power step of the carrier at a moment in the transmission
+
+    :param callsign: The callsign of the beacon
+    :param t: Time in seconds after the slot boundary
+    :returns: Index in POWER_STEPS (the callsign counts as 100 W), -1 if the carrier is off
+
+    >>> carrier("VK6RBP", 0.01), carrier("VK6RBP", 4.0), carrier("VK6RBP", 8.0)
+    (0, -1, 3)
+    """
+
+    for start, end in callsign_keying(callsign):
+        if start <= t < end:
+            return 0
+    for n, (_name, start, end) in enumerate(segments(callsign)[1:]):
+        if start <= t < end:
+            return n
+    return -1
@@ -0,0 +1,61 @@
+"""Serial port stand-in which answers CAT queries from a table"""
+
+# Global imports
+import threading
+import time
+
+
+class FakePort:
+    """Answers each query command with a fixed reply."""
+
+    def __init__(self, replies: dict[str, str] | None = None, late: bool = False) -> None:
+        """Initialize the port
+
+        :param replies: Reply per command, like {"FA;": "FA014100000;"}
+        :param late: Make the replies arrive only while the reader waits for them,
+            not yet when write() returns, like on a real serial link
+        """
+
+        self.replies = replies or {}
+        self.late = late
+        self.baudrate = 38400
+        self.timeout = 0.01
+        self.written: list[bytes] = []
+        self.pending = b""
+        self.arriving = b""
+        self.lock = threading.Lock()  # For the reader thread of cat_async
+
+    def answer(self, command: str) -> str:
+        """Reply to one command
+
+        :param command: The command, with the ';'
+        :returns: The reply, "" for none
+        """
+
+        return self.replies.get(command, "")
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self.pending)
+
+    def read(self, size: int = 1) -> bytes:
+        with self.lock:
+            if not self.pending:  # The replies arrive during the wait of a blocking read
+                self.pending, self.arriving = self.arriving, b""
+            data, self.pending = self.pending[:size], self.pending[size:]
+        if not data:
+            time.sleep(self.timeout)
+        return data
+
+    def write(self, data: bytes) -> int:
+        self.written.append(data)
+        replies = "".join(self.answer(command + ";") for command in data.decode().split(";")[:-1])
+        with self.lock:
+            if self.late:
+                self.arriving += replies.encode()
+            else:
+                self.pending += replies.encode()
+        return len(data)
+
+    def close(self) -> None:
+        pass
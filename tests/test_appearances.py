@@ -0,0 +1,24 @@
+"""Tests of the future appearances of the beacons"""
+
+# 3rd party imports
+import pytest
+from click.testing import CliRunner
+
+# Local imports
+import appearances
+import beacons
+
+
+def test_upcoming_without_beacon_information(monkeypatch):
+    monkeypatch.setattr(beacons, "load_beacons", lambda: {})
+    with pytest.raises(ValueError, match="beacons.ini"):
+        next(appearances.upcoming(start=0.0))
+
+
+def test_window_from_the_epoch():
+    result = CliRunner().invoke(
+        appearances.next_transmissions,
+        ["--start", "1970-01-01T00:00", "--hours", "0.01", "--count", "100"],
+    )
+    assert result.exit_code == 0
+    assert len(result.output.splitlines()) == 4 * 5  # Slots at 0, 10, 20 and 30 s
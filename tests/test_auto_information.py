@@ -0,0 +1,39 @@
+"""Tests of the auto information subscriber"""
+
+# Global imports
+import asyncio
+
+# Local imports
+import auto_information
+import cat_async
+import monitor_engine
+from fake_port import FakePort
+
+
+async def pushed(port, auto, frames):
+    """Let the transceiver push frames, and wait until they are handled"""
+
+    with port.lock:
+        port.pending += frames
+    for _ in range(100):
+        if auto.queue.qsize() == frames.count(b";"):
+            return
+        await asyncio.sleep(0.01)
+
+
+def test_pushed_frames_update_state():
+    port = FakePort({"IF;": "IF001014100000+000000300000;"}, late=True)
+
+    async def monitor():
+        async with cat_async.AsyncCat(port) as driver:
+            auto = auto_information.AutoInformation(driver)
+            await auto.start()
+            await pushed(port, auto, b"FA021150000;MD02;")
+            tuner = monitor_engine.async_cat_tuner(driver, auto)
+            await tuner(21.15)  # The operator already tuned there
+            return auto.rig_state
+
+    state = asyncio.run(monitor())
+    assert state.valid
+    assert (state.frequency, state.mode) == (21_150_000, "2")
+    assert port.written == [b"AI1;", b"IF;"]
@@ -0,0 +1,50 @@
+"""Tests of the asyncio CAT driver"""
+
+# Global imports
+import asyncio
+import time
+
+# Local imports
+import cat_async
+from fake_port import FakePort
+
+
+def run(port, *cmds):
+    async def query():
+        async with cat_async.AsyncCat(port) as driver:
+            started = time.monotonic()
+            replies = await driver.query(*cmds)
+            return replies, time.monotonic() - started, driver
+
+    return asyncio.run(query())
+
+
+def test_rejected_query():
+    port = FakePort({"AG0;": "?;", "FA;": "FA014100000;"}, late=True)
+
+    replies, elapsed, driver = run(port, "AG0;", "FA;")
+    assert replies == ["?;", "FA014100000;"]
+    assert elapsed < 0.5  # Not the timeout
+    assert driver.errors == 1
+
+
+def test_rejected_set_before_query():
+    port = FakePort({"FA999999999;": "?;", "FA;": "FA014100000;"}, late=True)
+
+    replies, _elapsed, driver = run(port, "FA999999999;", "FA;")
+    assert replies == ["", "FA014100000;"]
+    assert driver.errors == 1
+    assert not driver.outstanding
+
+
+def test_later_reply_is_not_taken_by_rejected_query():
+    port = FakePort({"AG0;": "?;"}, late=True)
+
+    async def query():
+        async with cat_async.AsyncCat(port) as driver:
+            first = await driver.query("AG0;")
+            port.replies["AG0;"] = "AG0100;"
+            second = await driver.query("AG0;")
+            return first, second
+
+    assert asyncio.run(query()) == (["?;"], ["AG0100;"])
@@ -0,0 +1,22 @@
+"""Tests of the CAT traffic recorder"""
+
+# Local imports
+import cat
+import cat_recorder
+import param
+from fake_port import FakePort
+
+
+def test_tap_records_shared_session(tmp_path, monkeypatch):
+    port = FakePort({"FA;": "FA014100000;"})
+    monkeypatch.setattr(param, "port", port)
+    monkeypatch.setattr(cat, "session", None)
+    filename = tmp_path / "traffic.catrec"
+
+    recording = cat_recorder.tap(cat.get_session(), filename)
+    assert cat.write("FA;") == "FA014100000;"
+    assert cat.get_session().port is recording
+    recording.close()
+
+    records = [(direction, data) for _t, direction, data in cat_recorder.read_recording(filename)]
+    assert records == [(cat_recorder.WRITE, b"FA;"), (cat_recorder.READ, b"FA014100000;")]
@@ -0,0 +1,42 @@
+"""Tests of the batched CAT session"""
+
+# Local imports
+import cat
+from fake_port import FakePort
+
+
+def test_rejected_query():
+    port = FakePort({"AG0;": "?;", "FA;": "FA014100000;"})
+    session = cat.CatSession(port)
+
+    assert session.execute("AG0;", "FA;") == ["?;", "FA014100000;"]
+    assert session.errors == 1
+    assert not session.unsolicited
+
+
+def test_rejected_set_before_query():
+    port = FakePort({"FA999999999;": "?;", "FA;": "FA014100000;"})
+    session = cat.CatSession(port)
+
+    assert session.execute("FA999999999;", "FA;") == ["?;", "FA014100000;"]
+    assert not session.unsolicited
+
+
+def test_rejected_set_in_front_of_queries():
+    port = FakePort(
+        {"MD0X;": "?;", "SM0;": "SM0123;", "IF;": "IF001014100000+000000300000;"}
+    )
+    session = cat.CatSession(port)
+
+    replies = session.execute("MD0X;", "SM0;", "IF;")
+    assert replies == ["?;", "SM0123;", "IF001014100000+000000300000;"]
+    assert not session.unsolicited
+
+
+def test_frames_before_exchange_are_kept():
+    port = FakePort({"FA;": "FA014100000;"})
+    session = cat.CatSession(port)
+    port.pending = b"MD02;"
+
+    assert session.execute("FA;") == ["FA014100000;"]
+    assert list(session.unsolicited) == ["MD02;"]
@@ -0,0 +1,28 @@
+"""Tests of the monitor engine"""
+
+# Global imports
+import asyncio
+
+# Local imports
+import monitor_engine
+
+
+def test_tune_error_does_not_stop_engine(monkeypatch):
+    tunes = []
+    events = []
+
+    async def tuner(freq):
+        tunes.append(freq)
+        raise OSError("CAT port gone")
+
+    async def no_wait(_utc):
+        pass
+
+    engine = monitor_engine.MonitorEngine(monitor_engine.plan_band(14), tuner)
+    monkeypatch.setattr(engine, "sleep_until", no_wait)
+    engine.register(events.append)
+
+    asyncio.run(engine.run(count=2))
+    assert tunes == [14.1, 14.1]
+    assert len(events) == 2
+    assert engine.current_freq is None
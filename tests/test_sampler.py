@@ -0,0 +1,20 @@
+"""Tests of the background S-meter sampler"""
+
+# Local imports
+import cat
+import sampler
+from fake_port import FakePort
+
+
+def test_sampler_shares_session_with_other_threads():
+    session = cat.CatSession(FakePort({"SM0;": "SM0123;", "FA;": "FA014100000;"}))
+    meter = sampler.Sampler(session)
+    meter.start()
+    try:
+        replies = [session.execute("FA;")[0] for _ in range(200)]
+    finally:
+        meter.stop()
+
+    assert replies == ["FA014100000;"] * 200
+    assert meter.reads > 0 and meter.failures == 0
+    assert set(meter.ring.snapshot().raw.tolist()) == {123}
@@ -0,0 +1,81 @@
+"""Tests of the cached transceiver state"""
+
+# Global imports
+import time
+
+# 3rd party imports
+import pytest
+
+# Local imports
+import cat
+import param
+import transceiver
+from fake_port import FakePort
+
+
+class Rig(FakePort):
+    """Transceiver with VFO A, which rejects some set commands."""
+
+    def __init__(self, rejected: tuple[str, ...] = (), late: bool = True) -> None:
+        super().__init__(late=late)
+        self.rejected = rejected
+        self.frequency = 14_100_000
+
+    def answer(self, command: str) -> str:
+        if command in self.rejected:
+            return "?;"
+        if command.startswith("FA") and len(command) == 12:
+            self.frequency = int(command[2:11])
+            return ""
+        if command == "IF;":
+            return f"IF001{self.frequency:09}+000000300000;"
+        return super().answer(command)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+def connect(monkeypatch, port):
+    monkeypatch.setattr(param, "port", port)
+    monkeypatch.setattr(cat, "session", None)
+    monkeypatch.setattr(transceiver, "rig_state", transceiver.RigState(ttl=30.0))
+    return port
+
+
+def fa_writes(port):
+    return sum(data.count(b"FA014200000;") for data in port.written)
+
+
+def test_set_renews_cache(monkeypatch, clock):
+    port = connect(monkeypatch, Rig())
+    transceiver.refresh_state()
+    clock[0] += 20
+    assert transceiver.set_vfo(14.2)
+    clock[0] += 20  # Past the ttl of the first IF; reply, not of the set command
+    assert transceiver.set_vfo(14.2)
+    assert fa_writes(port) == 1
+    assert transceiver.get_frequency() == 14_200_000
+
+
+def test_rejected_set_keeps_radio_state(monkeypatch, clock):
+    port = connect(monkeypatch, Rig(rejected=("FA014200000;",)))
+    transceiver.refresh_state()
+    assert not transceiver.set_vfo(14.2)
+    assert port.arriving == b"" and port.pending == b""  # The '?;' was handled in the exchange
+    assert transceiver.get_frequency() == 14_100_000
+    assert not transceiver.set_vfo(14.2)
+    assert fa_writes(port) == 2
+
+
+def test_restore_keeps_tx_clarifier(monkeypatch, clock):
+    port = connect(monkeypatch, FakePort({"IF;": "IF001014100000+000001300000;"}))
+    saved = transceiver.save_state()
+    assert saved == (14_100_000, "3", "+0000", "0", "1")
+
+    transceiver.rig_state.invalidate()
+    assert transceiver.restore_state(saved)
+    assert b"CF00001000;" in port.written[-1]